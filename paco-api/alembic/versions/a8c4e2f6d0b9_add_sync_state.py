@@ -0,0 +1,31 @@
+"""Add sync state table for background job high-water marks
+
+Revision ID: a8c4e2f6d0b9
+Revises: f2b6d8a4c1e7
+Create Date: 2025-03-05 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8c4e2f6d0b9'
+down_revision = 'f2b6d8a4c1e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # One row per background job (e.g. 'elevenlabs_reconcile')
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS paco_sync_state (
+            name VARCHAR(100) PRIMARY KEY,
+            high_water_mark BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def downgrade() -> None:
+    # Drop table
+    op.execute("DROP TABLE IF EXISTS paco_sync_state")
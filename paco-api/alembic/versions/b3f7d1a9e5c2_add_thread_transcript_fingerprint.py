@@ -0,0 +1,34 @@
+"""Add transcript fingerprint columns to conversation threads
+
+Revision ID: b3f7d1a9e5c2
+Revises: a8c4e2f6d0b9
+Create Date: 2025-03-06 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f7d1a9e5c2'
+down_revision = 'a8c4e2f6d0b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Filled on the next sync of each ElevenLabs conversation
+    op.execute("""
+        ALTER TABLE paco_conversation_threads
+        ADD COLUMN IF NOT EXISTS transcript_entries INTEGER,
+        ADD COLUMN IF NOT EXISTS transcript_last_message_id VARCHAR(255),
+        ADD COLUMN IF NOT EXISTS transcript_hash VARCHAR(64)
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        ALTER TABLE paco_conversation_threads
+        DROP COLUMN IF EXISTS transcript_hash,
+        DROP COLUMN IF EXISTS transcript_last_message_id,
+        DROP COLUMN IF EXISTS transcript_entries
+    """)
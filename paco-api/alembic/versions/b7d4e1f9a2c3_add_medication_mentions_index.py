@@ -0,0 +1,192 @@
+"""Add medication mentions cohort index
+
+Revision ID: b7d4e1f9a2c3
+Revises: a5bc8d3e4f2g
+Create Date: 2025-02-10 12:00:00.000000
+
+"""
+import json
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d4e1f9a2c3'
+down_revision = 'a5bc8d3e4f2g'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of the normalization in app/services/medication_index.py as of
+# this revision, so later edits to the app never change what this backfill does
+_MEDICATIONS = (
+    "aspirin", "baby aspirin", "clopidogrel", "plavix", "cilostazol", "pletal",
+    "pentoxifylline", "trental", "ticagrelor", "brilinta", "prasugrel",
+    "rivaroxaban", "xarelto", "apixaban", "eliquis", "warfarin", "coumadin",
+    "blood thinner", "statin", "atorvastatin", "lipitor", "simvastatin", "zocor",
+    "rosuvastatin", "crestor", "pravastatin", "ezetimibe", "zetia",
+    "cholesterol medicine", "cholesterol pill", "lisinopril", "enalapril",
+    "ramipril", "losartan", "valsartan", "amlodipine", "norvasc", "metoprolol",
+    "carvedilol", "atenolol", "hydrochlorothiazide", "furosemide", "lasix",
+    "water pill", "blood pressure medicine", "blood pressure pill",
+    "nitroglycerin", "metformin", "insulin", "glipizide", "januvia", "jardiance",
+    "ozempic", "sugar pill", "diabetes medicine", "nicotine patch", "nicotine gum",
+    "varenicline", "chantix", "bupropion", "ibuprofen", "advil", "tylenol",
+    "acetaminophen", "gabapentin",
+)
+_SIDE_EFFECTS = (
+    "side effect", "dizzy", "dizziness", "lightheaded", "nausea", "nauseous",
+    "vomiting", "bleeding", "bleed", "bruise", "bruising", "headache",
+    "stomach ache", "upset stomach", "heartburn", "diarrhea", "constipation",
+    "muscle pain", "muscle ache", "cramp", "cough", "rash", "itching", "swelling",
+    "swollen", "tired", "fatigue", "sleepy", "weak", "makes me feel sick",
+    "feel sick", "allergic",
+)
+_SYNONYMS = {
+    "baby aspirin": "aspirin", "plavix": "clopidogrel", "pletal": "cilostazol",
+    "trental": "pentoxifylline", "brilinta": "ticagrelor", "xarelto": "rivaroxaban",
+    "eliquis": "apixaban", "coumadin": "warfarin", "lipitor": "atorvastatin",
+    "zocor": "simvastatin", "crestor": "rosuvastatin", "zetia": "ezetimibe",
+    "norvasc": "amlodipine", "lasix": "furosemide", "chantix": "varenicline",
+    "advil": "ibuprofen", "tylenol": "acetaminophen", "dizziness": "dizzy",
+    "lightheaded": "dizzy", "nauseous": "nausea", "feel sick": "nausea",
+    "makes me feel sick": "nausea", "vomiting": "nausea", "bleed": "bleeding",
+    "bruising": "bruise", "muscle ache": "muscle pain", "cramp": "muscle pain",
+    "tired": "fatigue", "sleepy": "fatigue", "weak": "fatigue",
+    "swollen": "swelling", "upset stomach": "stomach ache", "itching": "rash",
+}
+_LEXICON = {"medication": _MEDICATIONS, "side_effect": _SIDE_EFFECTS}
+_TERM_PATTERN = {
+    kind: re.compile(
+        r"\b(" + "|".join(
+            re.escape(term).replace(r"\ ", r"\s+") for term in sorted(terms, key=len, reverse=True)
+        ) + r")(?:e?s)?\b",
+        re.IGNORECASE
+    )
+    for kind, terms in _LEXICON.items()
+}
+_DOSAGE = re.compile(r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|units?|iu)\b", re.IGNORECASE)
+_NON_WORD = re.compile(r"[^a-z0-9 \-]+")
+_SPACES = re.compile(r"\s+")
+_UNCLEAR = frozenset({"", "unclear", "unknown", "not discussed", "none", "n/a"})
+
+
+def _normalize_terms(kind, text):
+    if not isinstance(text, str):
+        return []
+    cleaned = _SPACES.sub(" ", _NON_WORD.sub(" ", _DOSAGE.sub(" ", text.lower()))).strip()[:255]
+    if cleaned in _UNCLEAR:
+        return []
+    pattern = _TERM_PATTERN.get(kind)
+    if pattern:
+        found = {_SPACES.sub(" ", match.group(1).lower()) for match in pattern.finditer(text)}
+        if found:
+            return sorted({_SYNONYMS.get(term, term) for term in found})
+    return [_SYNONYMS.get(cleaned, cleaned)]
+
+
+def _load(value):
+    if not value:
+        return []
+    try:
+        items = json.loads(value)
+    except (TypeError, ValueError):
+        return []
+    return items if isinstance(items, list) else []
+
+
+def _field(item, key):
+    if isinstance(item, dict):
+        value = item.get(key)
+        return value if isinstance(value, str) else None
+    return item if isinstance(item, str) else None
+
+
+def _mentions_for(analysis):
+    rows = {}
+
+    def add(kind, term, detail, medication=None):
+        rows.setdefault((kind, term, medication), {
+            "analysis_id": analysis.id,
+            "research_id_fk": analysis.research_id_fk,
+            "kind": kind,
+            "term": term,
+            "medication": medication,
+            "detail": detail
+        })
+
+    for item in _load(analysis.medication_list):
+        name = _field(item, "name")
+        for term in _normalize_terms("medication", name):
+            add("medication", term, name)
+
+    for item in _load(analysis.side_effects):
+        effect = _field(item, "effect")
+        medications = _normalize_terms("medication", _field(item, "medication")) or [None]
+        for term in _normalize_terms("side_effect", effect):
+            for medication in medications:
+                add("side_effect", term, effect, medication)
+
+    for kind, column in (("barrier", analysis.adherence_barriers), ("strategy", analysis.adherence_strategies)):
+        for item in _load(column):
+            description = _field(item, "description")
+            for term in _normalize_terms(kind, _field(item, "type")):
+                add(kind, term, description)
+
+    return list(rows.values())
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    # Create normalized mentions table (portable DDL: works on SQLite and Postgres)
+    if "paco_medication_mentions" not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            "paco_medication_mentions",
+            sa.Column("id", sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column(
+                "analysis_id", sa.Integer,
+                sa.ForeignKey("paco_medication_adherence.id", ondelete="CASCADE"), nullable=False
+            ),
+            sa.Column("research_id_fk", sa.Integer, sa.ForeignKey("paco_research_ids.id"), nullable=False),
+            sa.Column("kind", sa.String(20), nullable=False),
+            sa.Column("term", sa.String(255), nullable=False),
+            sa.Column("medication", sa.String(255), nullable=True),
+            sa.Column("detail", sa.Text, nullable=True),
+        )
+
+        # Create indexes
+        op.create_index("ix_mention_kind_term", "paco_medication_mentions", ["kind", "term", "analysis_id"])
+        op.create_index("ix_mention_kind_medication", "paco_medication_mentions", ["kind", "medication"])
+        op.create_index("ix_paco_medication_mentions_analysis_id", "paco_medication_mentions", ["analysis_id"])
+        op.create_index("ix_paco_medication_mentions_research_id_fk", "paco_medication_mentions", ["research_id_fk"])
+
+    # Backfill from existing analyses (same normalization as write time)
+    analyses = bind.execute(sa.text("""
+        SELECT a.id, a.research_id_fk, a.medication_list, a.side_effects,
+               a.adherence_barriers, a.adherence_strategies
+        FROM paco_medication_adherence a
+        WHERE NOT EXISTS (
+            SELECT 1 FROM paco_medication_mentions m WHERE m.analysis_id = a.id
+        )
+    """)).fetchall()
+
+    mentions = sa.table(
+        "paco_medication_mentions",
+        sa.column("analysis_id", sa.Integer),
+        sa.column("research_id_fk", sa.Integer),
+        sa.column("kind", sa.String),
+        sa.column("term", sa.String),
+        sa.column("medication", sa.String),
+        sa.column("detail", sa.Text),
+    )
+    rows = [row for analysis in analyses for row in _mentions_for(analysis)]
+    if rows:
+        op.bulk_insert(mentions, rows)
+
+
+def downgrade() -> None:
+    # Drop table and indexes
+    op.execute("DROP TABLE IF EXISTS paco_medication_mentions")
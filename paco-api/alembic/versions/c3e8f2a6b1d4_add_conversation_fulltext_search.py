@@ -0,0 +1,79 @@
+"""Add full-text search index on conversation content
+
+Revision ID: c3e8f2a6b1d4
+Revises: b7d4e1f9a2c3
+Create Date: 2025-02-17 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8f2a6b1d4'
+down_revision = 'b7d4e1f9a2c3'
+branch_labels = None
+depends_on = None
+
+
+def _create_sqlite_fts() -> None:
+    """
+    FTS5 table plus sync triggers. Frozen copy of ensure_sqlite_fts in
+    app/services/conversation_search.py as of this revision.
+    """
+    op.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS paco_conversations_fts USING fts5(
+            content, content='paco_conversations', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS paco_conversations_fts_ai AFTER INSERT ON paco_conversations BEGIN
+            INSERT INTO paco_conversations_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS paco_conversations_fts_ad AFTER DELETE ON paco_conversations BEGIN
+            INSERT INTO paco_conversations_fts(paco_conversations_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS paco_conversations_fts_au AFTER UPDATE OF content ON paco_conversations BEGIN
+            INSERT INTO paco_conversations_fts(paco_conversations_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+            INSERT INTO paco_conversations_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    # Index rows that existed before the table
+    op.execute("INSERT INTO paco_conversations_fts(paco_conversations_fts) VALUES ('rebuild')")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == "sqlite":
+        # Local runs: FTS5 table kept in sync by triggers
+        _create_sqlite_fts()
+        return
+
+    # Expression index: Postgres maintains it on insert/update, no extra column.
+    # CONCURRENTLY so building it on a large table does not block chat writes.
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_conversation_content_fts
+            ON paco_conversations USING GIN (to_tsvector('english', content))
+        """)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS paco_conversations_fts_ai")
+        op.execute("DROP TRIGGER IF EXISTS paco_conversations_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS paco_conversations_fts_au")
+        op.execute("DROP TABLE IF EXISTS paco_conversations_fts")
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_conversation_content_fts")
@@ -0,0 +1,62 @@
+"""Enforce one stored copy of each ElevenLabs message
+
+Revision ID: c9f1a3e7d5b8
+Revises: b3f7d1a9e5c2
+Create Date: 2025-03-13 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f1a3e7d5b8'
+down_revision = 'b3f7d1a9e5c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Drop copies written by overlapping transcript writers (keep the first)
+    op.execute("""
+        DELETE FROM paco_conversations
+        WHERE elevenlabs_message_id IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id) FROM paco_conversations
+              WHERE elevenlabs_message_id IS NOT NULL
+              GROUP BY elevenlabs_conversation_id, elevenlabs_message_id
+          )
+          AND elevenlabs_conversation_id IS NOT NULL
+    """)
+    op.execute("""
+        UPDATE paco_conversation_threads
+        SET message_count = (
+            SELECT COUNT(*) FROM paco_conversations c
+            WHERE c.thread_id = paco_conversation_threads.id
+        )
+        WHERE elevenlabs_conversation_id IS NOT NULL
+    """)
+
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_conversation_elevenlabs_message
+            ON paco_conversations(elevenlabs_conversation_id, elevenlabs_message_id)
+            WHERE elevenlabs_message_id IS NOT NULL
+        """)
+        return
+
+    # CONCURRENTLY so building it on a large table does not block chat writes
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_conversation_elevenlabs_message
+            ON paco_conversations(elevenlabs_conversation_id, elevenlabs_message_id)
+            WHERE elevenlabs_message_id IS NOT NULL
+        """)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP INDEX IF EXISTS ux_conversation_elevenlabs_message")
+        return
+
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ux_conversation_elevenlabs_message")
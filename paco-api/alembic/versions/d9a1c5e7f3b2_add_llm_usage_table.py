@@ -0,0 +1,49 @@
+"""Add LLM usage accounting table
+
+Revision ID: d9a1c5e7f3b2
+Revises: c3e8f2a6b1d4
+Create Date: 2025-02-24 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a1c5e7f3b2'
+down_revision = 'c3e8f2a6b1d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create LLM usage table (one compact row per call)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS paco_llm_usage (
+            id SERIAL PRIMARY KEY,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            research_id_fk INTEGER REFERENCES paco_research_ids(id),
+            caller VARCHAR(50) NOT NULL,
+            model VARCHAR(100) NOT NULL,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            latency_ms INTEGER NOT NULL DEFAULT 0,
+            status VARCHAR(20) NOT NULL DEFAULT 'ok'
+        )
+    """)
+
+    # Create indexes
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_llm_usage_created
+        ON paco_llm_usage(created_at)
+    """)
+
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_llm_usage_research_created
+        ON paco_llm_usage(research_id_fk, created_at)
+    """)
+
+
+def downgrade() -> None:
+    # Drop table and indexes
+    op.execute("DROP TABLE IF EXISTS paco_llm_usage")
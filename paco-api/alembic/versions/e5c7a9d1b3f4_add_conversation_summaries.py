@@ -0,0 +1,35 @@
+"""Add rolling conversation summaries table
+
+Revision ID: e5c7a9d1b3f4
+Revises: d9a1c5e7f3b2
+Create Date: 2025-03-03 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c7a9d1b3f4'
+down_revision = 'd9a1c5e7f3b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create conversation summaries table (one row per conversation_id)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS paco_conversation_summaries (
+            id SERIAL PRIMARY KEY,
+            conversation_id VARCHAR(255) NOT NULL UNIQUE,
+            research_id_fk INTEGER NOT NULL REFERENCES paco_research_ids(id),
+            summary TEXT NOT NULL,
+            summarized_through_id INTEGER NOT NULL,
+            summarized_messages INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def downgrade() -> None:
+    # Drop table
+    op.execute("DROP TABLE IF EXISTS paco_conversation_summaries")
@@ -0,0 +1,83 @@
+"""Add conversation threads table with message counters
+
+Revision ID: f2b6d8a4c1e7
+Revises: e5c7a9d1b3f4
+Create Date: 2025-03-04 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b6d8a4c1e7'
+down_revision = 'e5c7a9d1b3f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create threads table (one row per research ID + conversation_id)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS paco_conversation_threads (
+            id SERIAL PRIMARY KEY,
+            research_id_fk INTEGER NOT NULL REFERENCES paco_research_ids(id),
+            conversation_id VARCHAR(255) NOT NULL,
+            provider VARCHAR(20),
+            elevenlabs_conversation_id VARCHAR(255),
+            message_count INTEGER NOT NULL DEFAULT 0,
+            first_at TIMESTAMP WITH TIME ZONE,
+            last_at TIMESTAMP WITH TIME ZONE,
+            CONSTRAINT uq_conversation_thread UNIQUE (research_id_fk, conversation_id)
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_conversation_thread_research_last_at
+        ON paco_conversation_threads (research_id_fk, last_at)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_paco_conversation_threads_elevenlabs_conversation_id
+        ON paco_conversation_threads (elevenlabs_conversation_id)
+    """)
+
+    # Messages reference their thread by integer FK
+    op.execute("""
+        ALTER TABLE paco_conversations
+        ADD COLUMN IF NOT EXISTS thread_id INTEGER REFERENCES paco_conversation_threads(id)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_paco_conversations_thread_id
+        ON paco_conversations (thread_id)
+    """)
+
+    # Backfill threads and counters from existing messages
+    op.execute("""
+        INSERT INTO paco_conversation_threads (
+            research_id_fk, conversation_id, provider, elevenlabs_conversation_id,
+            message_count, first_at, last_at
+        )
+        SELECT
+            research_id_fk,
+            conversation_id,
+            (ARRAY_AGG(provider ORDER BY timestamp, id))[1],
+            MAX(elevenlabs_conversation_id),
+            COUNT(*),
+            MIN(timestamp),
+            MAX(timestamp)
+        FROM paco_conversations
+        GROUP BY research_id_fk, conversation_id
+        ON CONFLICT (research_id_fk, conversation_id) DO NOTHING
+    """)
+    op.execute("""
+        UPDATE paco_conversations AS c
+        SET thread_id = t.id
+        FROM paco_conversation_threads AS t
+        WHERE c.thread_id IS NULL
+          AND t.research_id_fk = c.research_id_fk
+          AND t.conversation_id = c.conversation_id
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_paco_conversations_thread_id")
+    op.execute("ALTER TABLE paco_conversations DROP COLUMN IF EXISTS thread_id")
+    op.execute("DROP TABLE IF EXISTS paco_conversation_threads")
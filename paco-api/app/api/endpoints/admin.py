@@ -5,20 +5,25 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta
-from typing import List
+from typing import Dict, List, Tuple
 import os
 
 from app.db.base import get_db
-from app.models.database import ResearchID, UserSession, Conversation, DisclaimerAcknowledgment
+from app.models.database import ResearchID, UserSession, Conversation, ConversationThread, DisclaimerAcknowledgment
 from app.schemas.admin import (
     AdminAuth,
     ResearchIDCreate,
     ResearchIDUpdate,
     ResearchIDDetail,
-    AdminStatsResponse
+    AdminStatsResponse,
+    LLMUsageRequest,
+    LLMUsageResponse
 )
 from app.core.security import verify_admin_password
 from app.core.config import get_settings
+from app.core.query_budget import query_budget
+from app.services.research_id_resolver import research_id_resolver
+from app.services.llm_usage import llm_usage_service
 
 router = APIRouter()
 
@@ -33,7 +38,48 @@ def verify_admin(auth: AdminAuth):
     return True
 
 
+def get_research_id_stats(
+    db: Session,
+    research_id_fks: List[int]
+) -> Dict[int, Tuple[int, int, datetime]]:
+    """
+    Get (total_sessions, total_messages, last_activity) for many research IDs
+    with one grouped query per table instead of three queries per ID
+    """
+    if not research_id_fks:
+        return {}
+
+    session_counts = dict(
+        db.query(UserSession.research_id_fk, func.count(UserSession.id))
+        .filter(UserSession.research_id_fk.in_(research_id_fks))
+        .group_by(UserSession.research_id_fk)
+        .all()
+    )
+
+    message_stats = {
+        fk: (count, last)
+        for fk, count, last in db.query(
+            ConversationThread.research_id_fk,
+            func.sum(ConversationThread.message_count),
+            func.max(ConversationThread.last_at)
+        )
+        .filter(ConversationThread.research_id_fk.in_(research_id_fks))
+        .group_by(ConversationThread.research_id_fk)
+        .all()
+    }
+
+    return {
+        fk: (
+            session_counts.get(fk, 0),
+            message_stats.get(fk, (0, None))[0],
+            message_stats.get(fk, (0, None))[1]
+        )
+        for fk in research_id_fks
+    }
+
+
 @router.post("/research-ids", response_model=ResearchIDDetail)
+@query_budget(4)
 async def create_research_id(
     data: ResearchIDCreate,
     auth: AdminAuth,
@@ -63,6 +109,7 @@ async def create_research_id(
     db.add(research_id)
     db.commit()
     db.refresh(research_id)
+    research_id_resolver.invalidate(research_id.research_id)
 
     return ResearchIDDetail(
         id=research_id.id,
@@ -77,6 +124,7 @@ async def create_research_id(
 
 
 @router.get("/research-ids", response_model=List[ResearchIDDetail])
+@query_budget(3)
 async def list_research_ids(
     auth: AdminAuth,
     db: Session = Depends(get_db),
@@ -91,20 +139,12 @@ async def list_research_ids(
 
     research_ids = query.all()
 
+    # Get statistics
+    stats = get_research_id_stats(db, [rid.id for rid in research_ids])
+
     result = []
     for rid in research_ids:
-        # Get statistics
-        total_sessions = db.query(UserSession).filter(
-            UserSession.research_id_fk == rid.id
-        ).count()
-
-        total_messages = db.query(Conversation).filter(
-            Conversation.research_id_fk == rid.id
-        ).count()
-
-        last_activity = db.query(func.max(Conversation.timestamp)).filter(
-            Conversation.research_id_fk == rid.id
-        ).scalar()
+        total_sessions, total_messages, last_activity = stats[rid.id]
 
         result.append(ResearchIDDetail(
             id=rid.id,
@@ -121,6 +161,7 @@ async def list_research_ids(
 
 
 @router.patch("/research-ids/{research_id_str}", response_model=ResearchIDDetail)
+@query_budget(5)
 async def update_research_id(
     research_id_str: str,
     data: ResearchIDUpdate,
@@ -147,19 +188,12 @@ async def update_research_id(
 
     db.commit()
     db.refresh(research_id)
+    research_id_resolver.invalidate(research_id_str)
 
     # Get statistics
-    total_sessions = db.query(UserSession).filter(
-        UserSession.research_id_fk == research_id.id
-    ).count()
-
-    total_messages = db.query(Conversation).filter(
-        Conversation.research_id_fk == research_id.id
-    ).count()
-
-    last_activity = db.query(func.max(Conversation.timestamp)).filter(
-        Conversation.research_id_fk == research_id.id
-    ).scalar()
+    total_sessions, total_messages, last_activity = (
+        get_research_id_stats(db, [research_id.id])[research_id.id]
+    )
 
     return ResearchIDDetail(
         id=research_id.id,
@@ -174,6 +208,7 @@ async def update_research_id(
 
 
 @router.delete("/research-ids/{research_id_str}")
+@query_budget(2)
 async def delete_research_id(
     research_id_str: str,
     auth: AdminAuth,
@@ -195,11 +230,13 @@ async def delete_research_id(
     # Set to inactive instead of deleting
     research_id.is_active = False
     db.commit()
+    research_id_resolver.invalidate(research_id_str)
 
     return {"message": f"Research ID {research_id_str} deactivated"}
 
 
 @router.post("/stats", response_model=AdminStatsResponse)
+@query_budget(7)
 async def get_system_stats(
     auth: AdminAuth,
     db: Session = Depends(get_db)
@@ -217,8 +254,8 @@ async def get_system_stats(
         active_sessions_24h=db.query(UserSession).filter(
             UserSession.last_active >= twenty_four_hours_ago
         ).count(),
-        total_conversations=db.query(Conversation.conversation_id).distinct().count(),
-        total_messages=db.query(Conversation).count(),
+        total_conversations=db.query(ConversationThread).count(),
+        total_messages=db.query(func.coalesce(func.sum(ConversationThread.message_count), 0)).scalar(),
         messages_last_24h=db.query(Conversation).filter(
             Conversation.timestamp >= twenty_four_hours_ago
         ).count()
@@ -227,6 +264,30 @@ async def get_system_stats(
     return stats
 
 
+@router.post("/llm-usage", response_model=LLMUsageResponse)
+@query_budget(1)
+async def get_llm_usage(
+    request: LLMUsageRequest,
+    db: Session = Depends(get_db)
+):
+    """LLM token usage, latency and estimated cost per day, research ID, model or caller (admin only)"""
+    verify_admin(request)
+
+    rows = llm_usage_service.aggregate(
+        db,
+        group_by=request.group_by,
+        start_date=request.start_date,
+        end_date=request.end_date
+    )
+
+    return LLMUsageResponse(
+        group_by=request.group_by,
+        rows=rows,
+        total_tokens=sum(row["total_tokens"] for row in rows),
+        estimated_cost_usd=round(sum(row["estimated_cost_usd"] for row in rows), 6)
+    )
+
+
 @router.post("/seed-research-ids")
 async def seed_research_ids(
     auth: AdminAuth,
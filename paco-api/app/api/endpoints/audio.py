@@ -0,0 +1,19 @@
+"""
+Audio file endpoints (cached TTS output)
+"""
+from fastapi import APIRouter, Request, Response
+
+from app.core.audio_delivery import audio_file_response
+from app.core.config import get_settings
+
+router = APIRouter()
+settings = get_settings()
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_audio(path: str, request: Request) -> Response:
+    """
+    Serve an audio file with Range, ETag/Last-Modified and long-lived caching
+    for content-addressed names (see app.core.audio_delivery)
+    """
+    return audio_file_response(request, settings.AUDIO_CACHE_DIR, path)
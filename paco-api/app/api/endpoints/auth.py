@@ -17,12 +17,14 @@ from app.schemas.auth import (
 )
 from app.core.security import create_access_token, get_current_user
 from app.core.config import get_settings
+from app.core.query_budget import query_budget
 
 router = APIRouter()
 settings = get_settings()
 
 
 @router.post("/validate-research-id", response_model=ResearchIDResponse)
+@query_budget(1)
 async def validate_research_id(
     data: ResearchIDValidate,
     db: Session = Depends(get_db)
@@ -48,6 +50,7 @@ async def validate_research_id(
 
 
 @router.post("/acknowledge-disclaimer", response_model=DisclaimerResponse)
+@query_budget(3)
 async def acknowledge_disclaimer(
     data: DisclaimerAcknowledge,
     request: Request,
@@ -87,6 +90,7 @@ async def acknowledge_disclaimer(
 
 
 @router.post("/login", response_model=Token)
+@query_budget(6)
 async def login(
     data: SessionCreate,
     request: Request,
@@ -161,6 +165,7 @@ async def login(
 
 
 @router.get("/me")
+@query_budget(2)
 async def get_current_user_info(
     current_user: ResearchID = Depends(get_current_user)
 ):
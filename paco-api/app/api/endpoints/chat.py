@@ -1,14 +1,19 @@
 """
 Chat and conversation endpoints - ElevenLabs focused
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Optional
+import asyncio
 import httpx
-from datetime import datetime
+import json
+import logging
+from datetime import datetime, timezone
 
-from app.db.base import get_db
-from app.models.database import ResearchID, Conversation
+from app.db.base import SessionLocal, get_db
+from app.models.database import ResearchID, Conversation, ConversationThread
 from app.schemas.conversation import (
     ConversationHistoryRequest,
     ConversationHistoryResponse,
@@ -16,16 +21,99 @@ from app.schemas.conversation import (
     MessageSaveRequest,
     MessageSaveResponse,
     ElevenLabsConversationSyncRequest,
-    ElevenLabsConversationSyncResponse
+    ElevenLabsConversationSyncResponse,
+    IngestTurn,
+    StreamChatRequest,
+    TTSRequest,
+    TTSResponse
 )
-from app.core.security import get_current_user
+from app.core.security import authenticate_token, get_current_user
+from app.services.context_window import ContextWindow, context_window_service
 from app.services.conversation_service import conversation_service
+from app.services.elevenlabs_client import elevenlabs_client
+from app.services.llm_service import llm_service
+from app.services.llm_usage import BudgetReservation, LLMBudgetExceeded, llm_usage_service
+from app.services.research_id_resolver import research_id_resolver
+from app.services.tts import get_tts_service
+from app.services.turn_ingest import (
+    INGEST_CONNECTIONS,
+    INGEST_TURNS,
+    TurnBatcher,
+    sync_transcript
+)
 from app.core.config import get_settings
+from app.core.query_budget import query_budget
+from app.core.responses import fast_json_response
+from app.prompts import master_prompt
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+def _sse(event: str, data: Dict) -> str:
+    """One server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _chat_event_stream(
+    research_id_fk: int,
+    conversation_id: str,
+    user_content: str,
+    user_timestamp: datetime,
+    window: ContextWindow,
+    model: str,
+    reservation: BudgetReservation
+) -> AsyncIterator[str]:
+    """
+    Relay LLM deltas as `token` events, save both turns and send `done`;
+    folding older turns into the conversation summary, if enough are due,
+    is left to a background task
+    """
+    parts = []
+    try:
+        async for delta in llm_service.stream_chat_completion(
+            messages=window.messages,
+            model=model,
+            max_tokens=get_settings().CHAT_MAX_TOKENS,
+            caller="chat",
+            research_id_fk=research_id_fk,
+            reservation=reservation
+        ):
+            parts.append(delta)
+            yield _sse("token", {"delta": delta})
+    except Exception:
+        logger.exception("Chat stream failed", extra={"conversation_id": conversation_id})
+        yield _sse("error", {"detail": "The assistant is unavailable, please try again"})
+        return
+    finally:
+        reservation.settle()  # Already released if the stream was recorded
+
+    # The request's session is gone once streaming starts; write with our own
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        user_message, assistant_message = conversation_service.save_exchange(
+            db, research_id_fk, conversation_id, user_content, "".join(parts), model, user_timestamp
+        )
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to save chat exchange", extra={"conversation_id": conversation_id})
+        yield _sse("error", {"detail": "Reply could not be saved"})
+        return
+    finally:
+        db.close()
+
+    context_window_service.schedule_refresh(research_id_fk, conversation_id, window, model)
+    yield _sse("done", {
+        "conversation_id": conversation_id,
+        "user_message_id": user_message.id,
+        "message_id": assistant_message.id,
+        "timestamp": assistant_message.timestamp.isoformat()
+    })
+
+
 @router.post("/save-message", response_model=MessageSaveResponse)
+@query_budget(5)
 async def save_message_from_frontend(
     data: MessageSaveRequest,
     current_user: ResearchID = Depends(get_current_user),
@@ -50,18 +138,21 @@ async def save_message_from_frontend(
     # Generate conversation_id if using ElevenLabs
     conversation_id = data.elevenlabs_conversation_id or f"conv_{datetime.now().strftime('%Y%m%d%H%M%S')}_{data.research_id}"
 
-    # Get the research_id_fk
-    research_user = db.query(ResearchID).filter(ResearchID.research_id == data.research_id).first()
-    if not research_user:
+    # Get the research_id_fk (already resolved during authentication)
+    research_id_fk = research_id_resolver.resolve(db, data.research_id)
+    if research_id_fk is None:
         raise HTTPException(status_code=404, detail="Research ID not found")
 
-    # Check for duplicate message (for ElevenLabs messages)
-    if data.elevenlabs_message_id and data.elevenlabs_conversation_id:
-        existing = db.query(Conversation).filter(
+    def stored_copy() -> Optional[Conversation]:
+        return db.query(Conversation).filter(
             Conversation.elevenlabs_message_id == data.elevenlabs_message_id,
             Conversation.elevenlabs_conversation_id == data.elevenlabs_conversation_id
         ).first()
 
+    # Check for duplicate message (for ElevenLabs messages)
+    if data.elevenlabs_message_id and data.elevenlabs_conversation_id:
+        existing = stored_copy()
+
         if existing:
             # Message already exists, return success without creating duplicate
             return MessageSaveResponse(
@@ -70,30 +161,190 @@ async def save_message_from_frontend(
                 timestamp=existing.timestamp
             )
 
-    # Create conversation record
-    message = Conversation(
-        research_id_fk=research_user.id,
+    # Create conversation record (and update its thread)
+    message, = conversation_service.append_messages(
+        db,
+        research_id_fk=research_id_fk,
         conversation_id=conversation_id,
-        role=data.role,
-        content=data.content,
-        timestamp=timestamp,
+        messages=[{
+            "role": data.role,
+            "content": data.content,
+            "timestamp": timestamp,
+            "elevenlabs_message_id": data.elevenlabs_message_id
+        }],
         provider=data.provider,
-        elevenlabs_conversation_id=data.elevenlabs_conversation_id,
-        elevenlabs_message_id=data.elevenlabs_message_id
+        elevenlabs_conversation_id=data.elevenlabs_conversation_id
     )
-
-    db.add(message)
-    db.commit()
-    db.refresh(message)
-
-    return MessageSaveResponse(
+    if message is None:
+        # Stored by a concurrent writer (transcript sync) since the check above
+        message = stored_copy()
+    response = MessageSaveResponse(
         success=True,
         message_id=message.id,
         timestamp=message.timestamp
     )
+    db.commit()
+
+    return response
+
+
+@router.websocket("/ws/ingest")
+async def ingest_turns(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Stream conversation turns over one authenticated connection.
+
+    Authenticate once with `?token=<JWT>` (or an Authorization header), then
+    send turns as JSON ({"client_id", "role", "content", "timestamp",
+    "provider", "elevenlabs_conversation_id", "elevenlabs_message_id"}).
+    They are saved in batches (INGEST_BATCH_SIZE / INGEST_FLUSH_INTERVAL_MS)
+    and acknowledged with {"type": "ack", "acks": [{"client_id",
+    "message_id", "conversation_id", "timestamp", "duplicate"}]}. Invalid
+    turns get {"type": "error", "client_id", "detail"} straight away, and a
+    failed batch {"type": "error", "client_ids", "detail"} so it can be resent.
+    """
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else ""
+
+    db = SessionLocal()
+    try:
+        research_user = authenticate_token(db, token)
+        research_id_fk, research_id = research_user.id, research_user.research_id
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        db.close()
+
+    await websocket.accept()
+    INGEST_CONNECTIONS.inc()
+    send_lock = asyncio.Lock()
+
+    async def send(message: Dict[str, Any]) -> None:
+        # Acks come from the flush timer too; a closed socket just drops them
+        async with send_lock:
+            try:
+                await websocket.send_json(message)
+            except (WebSocketDisconnect, RuntimeError):
+                pass
+
+    settings = get_settings()
+    batcher = TurnBatcher(
+        research_id_fk=research_id_fk,
+        conversation_id=conversation_service.create_conversation_id(research_id),
+        send=send,
+        batch_size=settings.INGEST_BATCH_SIZE,
+        flush_interval=settings.INGEST_FLUSH_INTERVAL_MS / 1000
+    )
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                turn = IngestTurn.model_validate_json(text)
+            except ValidationError as e:
+                INGEST_TURNS.inc(result="rejected")
+                try:
+                    client_id = json.loads(text).get("client_id")
+                except (ValueError, AttributeError):
+                    client_id = None
+                await send({"type": "error", "client_id": client_id, "detail": e.errors(include_url=False)})
+                continue
+            await batcher.add(turn)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Persist what was received even if the client left before the ack
+        await batcher.close()
+        INGEST_CONNECTIONS.dec()
+
+
+@router.post("/stream")
+@query_budget(7)
+async def stream_chat(
+    data: StreamChatRequest,
+    current_user: ResearchID = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Chat with PaCo server-side, streamed as server-sent events.
+
+    Sends `token` events ({"delta"}) as Groq generates the reply, then one
+    `done` event ({"conversation_id", "user_message_id", "message_id",
+    "timestamp"}) once both turns are saved, or an `error` event. Nothing is
+    saved if the stream fails or the client disconnects, so it can be retried.
+    """
+    # Verify user matches research_id in request
+    if current_user.research_id != data.research_id:
+        raise HTTPException(status_code=403, detail="Research ID mismatch")
+
+    research_id_fk = research_id_resolver.resolve(db, data.research_id)
+    if research_id_fk is None:
+        raise HTTPException(status_code=404, detail="Research ID not found")
+
+    settings = get_settings()
+    conversation_id = data.conversation_id or conversation_service.create_conversation_id(data.research_id)
+    window = context_window_service.build(db, research_id_fk, conversation_id, master_prompt, data.message)
+
+    try:
+        reservation = llm_usage_service.check_budget(
+            db,
+            estimated_tokens=window.prompt_tokens + settings.CHAT_MAX_TOKENS,
+            research_id_fk=research_id_fk
+        )
+    except LLMBudgetExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    return StreamingResponse(
+        _chat_event_stream(
+            research_id_fk, conversation_id, data.message, datetime.now(timezone.utc), window, data.model,
+            reservation
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/tts", response_model=TTSResponse)
+@query_budget(4)
+async def text_to_speech(
+    data: TTSRequest,
+    current_user: ResearchID = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Synthesize speech for `text`, served from the content-addressed audio
+    cache when the same (text, voice, model) was synthesized before.
+
+    With `message_id`, the audio URL is also stored on that message.
+    """
+    try:
+        audio = await get_tts_service().synthesize(data.text, data.voice_id, data.model_id)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Speech synthesis failed: {str(e)}")
+
+    if data.message_id is not None:
+        updated = db.query(Conversation).filter(
+            Conversation.id == data.message_id,
+            Conversation.research_id_fk == current_user.id
+        ).update({Conversation.audio_url: audio.url}, synchronize_session=False)
+        if not updated:
+            raise HTTPException(status_code=404, detail="Message not found")
+        db.commit()
+
+    return TTSResponse(
+        audio_url=audio.url,
+        duration_seconds=audio.duration_seconds,
+        text_length=len(data.text),
+        cached=audio.cached
+    )
 
 
 @router.post("/history", response_model=ConversationHistoryResponse)
+@query_budget(4)
 async def get_conversation_history(
     data: ConversationHistoryRequest,
     current_user: ResearchID = Depends(get_current_user),
@@ -112,6 +363,14 @@ async def get_conversation_history(
         offset=data.offset
     )
 
+    if get_settings().FAST_JSON_RESPONSES:
+        # Validate ORM rows once and dump straight to JSON bytes
+        return fast_json_response(ConversationHistoryResponse, {
+            "messages": messages,
+            "total": total,
+            "research_id": data.research_id
+        })
+
     message_responses = [
         MessageResponse(
             id=msg.id,
@@ -133,6 +392,7 @@ async def get_conversation_history(
 
 
 @router.get("/conversations")
+@query_budget(3)
 async def get_recent_conversations(
     current_user: ResearchID = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -152,6 +412,7 @@ async def get_recent_conversations(
 
 
 @router.get("/conversations/elevenlabs")
+@query_budget(3)
 async def get_elevenlabs_conversations(
     current_user: ResearchID = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -169,6 +430,7 @@ async def get_elevenlabs_conversations(
 
 
 @router.post("/sync-elevenlabs-conversation", response_model=ElevenLabsConversationSyncResponse)
+@query_budget(10)  # +1 on Postgres: the per-conversation transcript lock
 async def sync_elevenlabs_conversation(
     data: ElevenLabsConversationSyncRequest,
     current_user: ResearchID = Depends(get_current_user),
@@ -184,90 +446,44 @@ async def sync_elevenlabs_conversation(
     if current_user.research_id != data.research_id:
         raise HTTPException(status_code=403, detail="Research ID mismatch")
 
-    settings = get_settings()
-
     try:
         # Fetch conversation from ElevenLabs API
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.elevenlabs.io/v1/convai/conversations/{data.elevenlabs_conversation_id}",
-                headers={
-                    "xi-api-key": settings.ELEVENLABS_API_KEY
-                }
+        response = await elevenlabs_client.get_conversation(data.elevenlabs_conversation_id)
+
+        if response["status_code"] != 200:
+            raise HTTPException(
+                status_code=response["status_code"],
+                detail=f"Failed to fetch conversation from ElevenLabs: {response['text']}"
             )
 
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to fetch conversation from ElevenLabs: {response.text}"
-                )
+        conversation_data = json.loads(response["text"])
 
-            conversation_data = response.json()
+        # Get the research_id_fk (already resolved during authentication)
+        research_id_fk = research_id_resolver.resolve(db, data.research_id)
 
-        # Get the research_id_fk
-        research_user = db.query(ResearchID).filter(
-            ResearchID.research_id == data.research_id
-        ).first()
-
-        if not research_user:
+        if research_id_fk is None:
             raise HTTPException(status_code=404, detail="Research ID not found")
 
         # Use ElevenLabs conversation_id as our conversation_id
         conversation_id = data.elevenlabs_conversation_id
 
-        # Process and save messages
-        messages_synced = 0
-
-        if conversation_data.get("transcript") and isinstance(conversation_data["transcript"], list):
-            for message in conversation_data["transcript"]:
-                # Parse message fields (ElevenLabs format may vary)
-                role = "user" if message.get("role") == "user" else "assistant"
-                content = message.get("message") or message.get("text") or ""
-
-                # Skip empty messages
-                if not content.strip():
-                    continue
-
-                # Parse timestamp
-                timestamp_str = message.get("timestamp")
-                if timestamp_str:
-                    try:
-                        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    except (ValueError, AttributeError):
-                        timestamp = datetime.now()
-                else:
-                    timestamp = datetime.now()
-
-                # Check if message already exists (avoid duplicates)
-                elevenlabs_message_id = message.get("id")
-                existing_message = None
-
-                if elevenlabs_message_id:
-                    existing_message = db.query(Conversation).filter(
-                        Conversation.elevenlabs_message_id == elevenlabs_message_id
-                    ).first()
-
-                # Only save if not already in database
-                if not existing_message:
-                    db_message = Conversation(
-                        research_id_fk=research_user.id,
-                        conversation_id=conversation_id,
-                        role=role,
-                        content=content,
-                        timestamp=timestamp,
-                        provider="elevenlabs",
-                        elevenlabs_conversation_id=data.elevenlabs_conversation_id,
-                        elevenlabs_message_id=elevenlabs_message_id
-                    )
-                    db.add(db_message)
-                    messages_synced += 1
-
-        db.commit()
+        # Compare with the fingerprint of the last sync: unchanged transcripts
+        # stop here, grown ones only process their new tail
+        thread = db.query(ConversationThread).filter(
+            ConversationThread.research_id_fk == research_id_fk,
+            ConversationThread.conversation_id == conversation_id
+        ).first()
+        result = sync_transcript(db, research_id_fk, conversation_id, conversation_data, thread)
+        if result.mode != "unchanged":
+            db.commit()
 
         return ElevenLabsConversationSyncResponse(
             success=True,
-            messages_synced=messages_synced,
-            conversation_id=conversation_id
+            messages_synced=sum(not ack.duplicate for ack in result.acks),
+            conversation_id=conversation_id,
+            sync_mode=result.mode,
+            transcript_messages=result.entries,
+            messages_checked=result.checked
         )
 
     except httpx.HTTPError as e:
@@ -1,19 +1,24 @@
 """
 Medication adherence analysis endpoints for medical providers
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 import json
 
 from app.db.base import get_db
-from app.models.database import ResearchID
+from app.models.database import MedicationAdherenceAnalysis, ResearchID
 from app.schemas.medication_analysis import (
     AnalysisRequest,
     AnalysisResponse,
     AnalysisResult,
     AnalysisHistoryResponse,
     AnalysisHistoryItem,
+    CohortQueryResponse,
+    SearchResponse,
+    SimilarityResponse,
     MedicationInfo,
     TimingSchedule,
     SideEffect,
@@ -22,11 +27,61 @@ from app.schemas.medication_analysis import (
     QuestionConcern,
     OverallAdherence
 )
+from app.services.analysis_cache import (
+    ANALYSIS_CACHE_REQUESTS,
+    analysis_etag,
+    analysis_response_cache
+)
 from app.services.medication_analysis_service import medication_analysis_service
+from app.services.medication_index import medication_index_service
+from app.services.conversation_search import (
+    InvalidCursor,
+    SearchFilters,
+    conversation_search_service
+)
+from app.services.research_id_resolver import research_id_resolver
+from app.services.similarity_index import analysis_text, get_similarity_index
+from app.services.llm_usage import LLMBudgetExceeded
 from app.core.security import verify_admin_password
+from app.core.query_budget import query_budget
+from app.core.responses import etag_matches, serialize_model
 
 router = APIRouter()
 
+# Browsers keep the body but always revalidate; unchanged analyses cost a 304
+ANALYSIS_CACHE_CONTROL = "private, no-cache"
+
+
+def _cached_analysis_response(
+    request: Request,
+    endpoint: str,
+    research_id: str,
+    variant: str,
+    etag: str
+) -> Optional[Response]:
+    """304 or a cached body for this ETag, or None if the response must be built"""
+    headers = {"ETag": etag, "Cache-Control": ANALYSIS_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        ANALYSIS_CACHE_REQUESTS.inc(endpoint=endpoint, result="not_modified")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body = analysis_response_cache.get(research_id, variant, etag)
+    if body is not None:
+        ANALYSIS_CACHE_REQUESTS.inc(endpoint=endpoint, result="hit")
+        return Response(content=body, media_type="application/json", headers=headers)
+    ANALYSIS_CACHE_REQUESTS.inc(endpoint=endpoint, result="miss")
+    return None
+
+
+def _store_analysis_response(research_id: str, variant: str, etag: str, model, data) -> Response:
+    body = serialize_model(model, data)
+    analysis_response_cache.put(research_id, variant, etag, body)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": ANALYSIS_CACHE_CONTROL}
+    )
+
 
 def parse_analysis_result(detailed_analysis: str) -> AnalysisResult:
     """Parse the detailed analysis JSON into structured format"""
@@ -70,6 +125,7 @@ def parse_analysis_result(detailed_analysis: str) -> AnalysisResult:
 
 
 @router.post("/analyze", response_model=AnalysisResponse)
+@query_budget(7)
 async def analyze_medication_adherence(
     request: AnalysisRequest,
     admin_password: str = Depends(verify_admin_password),
@@ -95,7 +151,8 @@ async def analyze_medication_adherence(
             research_id=request.research_id,
             start_date=request.start_date,
             end_date=request.end_date,
-            model=request.model
+            model=request.model,
+            priority=request.priority
         )
 
         # Parse detailed analysis
@@ -119,6 +176,12 @@ async def analyze_medication_adherence(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
+    except LLMBudgetExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -127,8 +190,10 @@ async def analyze_medication_adherence(
 
 
 @router.get("/history/{research_id}", response_model=AnalysisHistoryResponse)
+@query_budget(3)
 async def get_analysis_history(
     research_id: str,
+    request: Request,
     limit: int = 10,
     admin_password: str = Depends(verify_admin_password),
     db: Session = Depends(get_db)
@@ -136,20 +201,24 @@ async def get_analysis_history(
     """
     Get historical medication adherence analyses for a patient.
     
-    Returns up to `limit` most recent analyses.
+    Returns up to `limit` most recent analyses. Send the returned ETag as
+    If-None-Match to get 304 Not Modified until a new analysis is written.
     Requires admin authentication.
     """
     # Verify research ID exists
-    research_user = db.query(ResearchID).filter(
-        ResearchID.research_id == research_id
-    ).first()
-
-    if not research_user:
+    research_id_fk = research_id_resolver.resolve(db, research_id)
+    if research_id_fk is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Research ID {research_id} not found"
         )
 
+    variant = f"history-{limit}"
+    etag = analysis_etag(variant, medication_analysis_service.get_latest_version(db, research_id_fk))
+    cached = _cached_analysis_response(request, "history", research_id, variant, etag)
+    if cached is not None:
+        return cached
+
     # Get analysis history
     analyses = medication_analysis_service.get_analysis_history(
         db=db,
@@ -173,30 +242,45 @@ async def get_analysis_history(
         for analysis in analyses
     ]
 
-    return AnalysisHistoryResponse(
+    return _store_analysis_response(research_id, variant, etag, AnalysisHistoryResponse, AnalysisHistoryResponse(
         research_id=research_id,
         analyses=history_items,
         total_count=len(history_items)
-    )
+    ))
 
 
 @router.get("/latest/{research_id}", response_model=AnalysisResponse)
+@query_budget(3)
 async def get_latest_analysis(
     research_id: str,
+    request: Request,
     admin_password: str = Depends(verify_admin_password),
     db: Session = Depends(get_db)
 ):
     """
     Get the most recent medication adherence analysis for a patient.
     
-    Requires admin authentication.
+    Send the returned ETag as If-None-Match to get 304 Not Modified until a
+    new analysis is written. Requires admin authentication.
     """
-    # Get latest analysis
-    analysis = medication_analysis_service.get_latest_analysis(
-        db=db,
-        research_id=research_id
+    research_id_fk = research_id_resolver.resolve(db, research_id)
+    version = (
+        medication_analysis_service.get_latest_version(db, research_id_fk)
+        if research_id_fk is not None else None
     )
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No analyses found for research ID {research_id}"
+        )
+
+    etag = analysis_etag("latest", version)
+    cached = _cached_analysis_response(request, "latest", research_id, "latest", etag)
+    if cached is not None:
+        return cached
 
+    # Load and parse the analysis only when it is not cached
+    analysis = db.get(MedicationAdherenceAnalysis, version[0])
     if not analysis:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -206,7 +290,7 @@ async def get_latest_analysis(
     # Parse detailed analysis
     result = parse_analysis_result(analysis.detailed_analysis)
 
-    return AnalysisResponse(
+    return _store_analysis_response(research_id, "latest", etag, AnalysisResponse, AnalysisResponse(
         analysis_id=analysis.id,
         research_id=research_id,
         analysis_date=analysis.analysis_date,
@@ -217,10 +301,11 @@ async def get_latest_analysis(
         summary=analysis.summary,
         model_used=analysis.model_used,
         result=result
-    )
+    ))
 
 
 @router.get("/transcript/{research_id}")
+@query_budget(2)
 async def get_conversation_transcript(
     research_id: str,
     admin_password: str = Depends(verify_admin_password),
@@ -253,3 +338,157 @@ async def get_conversation_transcript(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
+
+
+@router.get("/cohort", response_model=CohortQueryResponse)
+@query_budget(2)
+async def query_cohort(
+    medication: Optional[str] = None,
+    side_effect: Optional[str] = None,
+    barrier: Optional[str] = None,
+    strategy: Optional[str] = None,
+    latest_only: bool = True,
+    limit: int = Query(100, ge=1, le=1000),
+    admin_password: str = Depends(verify_admin_password),
+    db: Session = Depends(get_db)
+):
+    """
+    Find participants by reported medications, side effects, adherence
+    barriers or strategies, e.g. `?medication=lisinopril&side_effect=dizziness`.
+
+    Terms are normalized like the index (brand names to generics, symptom
+    variants to one term). All given filters must match; by default only each
+    participant's latest analysis is considered.
+    Requires admin authentication.
+    """
+    if not any((medication, side_effect, barrier, strategy)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide at least one of medication, side_effect, barrier or strategy"
+        )
+
+    matches = medication_index_service.query_cohort(
+        db=db,
+        medication=medication,
+        side_effect=side_effect,
+        barrier=barrier,
+        strategy=strategy,
+        latest_only=latest_only,
+        limit=limit
+    )
+
+    return CohortQueryResponse(matches=matches, total_count=len(matches))
+
+
+@router.get("/search", response_model=SearchResponse)
+@query_budget(3)
+async def search_conversations(
+    q: str = Query(..., min_length=1, max_length=200),
+    research_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    role: Optional[str] = Query(None, pattern="^(user|assistant|system)$"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    admin_password: str = Depends(verify_admin_password),
+    db: Session = Depends(get_db)
+):
+    """
+    Full-text search over conversation messages.
+
+    Results are ranked by relevance with highlighted snippets. Pass the
+    returned `next_cursor` as `cursor` to fetch the next page.
+    Requires admin authentication.
+    """
+    filters = SearchFilters(start_date=start_date, end_date=end_date, role=role)
+    if research_id:
+        filters.research_id_fk = research_id_resolver.resolve(db, research_id)
+        if filters.research_id_fk is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Research ID {research_id} not found"
+            )
+
+    try:
+        results, next_cursor = conversation_search_service.search(
+            db=db,
+            query=q,
+            filters=filters,
+            limit=limit,
+            cursor=cursor
+        )
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return SearchResponse(results=results, next_cursor=next_cursor)
+
+
+@router.get("/similar", response_model=SimilarityResponse)
+@query_budget(3)
+async def find_similar_participants(
+    research_id: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=2000),
+    k: int = Query(10, ge=1, le=100),
+    admin_password: str = Depends(verify_admin_password),
+    db: Session = Depends(get_db)
+):
+    """
+    Find participants with similar adherence barriers, side effects and
+    strategies, using the local vector index of analyses.
+
+    Pass `research_id` to compare against that participant's latest analysis,
+    or `q` for a free-text description (e.g. "cannot afford copay, forgets
+    evening doses"). Only each participant's latest analysis is ranked.
+    Requires admin authentication.
+    """
+    if bool(research_id) == bool(q):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide exactly one of research_id or q"
+        )
+
+    latest = None
+    if research_id:
+        latest = medication_analysis_service.get_latest_analysis(db=db, research_id=research_id)
+        if not latest:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"No analyses found for research ID {research_id}"
+            )
+
+    def search_index():
+        index = get_similarity_index()
+        if latest is None:
+            return index.search(index.embed_query(q), k=k)
+        vector = index.vector_for(latest.id)
+        if vector is None:
+            vector = index.embed_query(analysis_text(latest))
+        return index.search(vector, k=k, exclude_research_id_fk=latest.research_id_fk)
+
+    # Embedding, the index lock and remapping after writes are blocking work
+    matches = await asyncio.to_thread(search_index)
+    if not matches:
+        return SimilarityResponse(results=[], total_count=0)
+
+    rows = {
+        analysis.id: (analysis, rid)
+        for analysis, rid in db.query(MedicationAdherenceAnalysis, ResearchID.research_id).join(
+            ResearchID, ResearchID.id == MedicationAdherenceAnalysis.research_id_fk
+        ).filter(MedicationAdherenceAnalysis.id.in_([analysis_id for analysis_id, _, _ in matches]))
+    }
+
+    results = [
+        {
+            "research_id": rows[analysis_id][1],
+            "analysis_id": analysis_id,
+            "analysis_date": rows[analysis_id][0].analysis_date,
+            "score": round(score, 4),
+            "summary": rows[analysis_id][0].summary
+        }
+        for analysis_id, _, score in matches
+        if analysis_id in rows  # Skip vectors whose analysis row no longer exists
+    ]
+    return SimilarityResponse(results=results, total_count=len(results))
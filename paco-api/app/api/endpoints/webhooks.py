@@ -0,0 +1,64 @@
+"""
+Inbound webhooks (ElevenLabs post-call transcripts)
+"""
+import json
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.core.config import get_settings
+from app.core.query_budget import query_budget
+from app.services.elevenlabs_webhook import (
+    SIGNATURE_HEADER,
+    TRANSCRIPT_EVENT,
+    WEBHOOK_REQUESTS,
+    get_webhook_queue,
+    verify_signature
+)
+
+router = APIRouter()
+settings = get_settings()
+
+
+@router.post("/elevenlabs")
+@query_budget(0)
+async def elevenlabs_webhook(request: Request):
+    """
+    Receive an ElevenLabs post-call webhook.
+
+    The HMAC signature is checked against the raw body; transcripts are queued
+    and written in batches in the background (see app.services.elevenlabs_webhook),
+    so ElevenLabs gets its 200 without waiting on the database.
+    """
+    if not settings.ELEVENLABS_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="ElevenLabs webhook not configured")
+
+    body = await request.body()
+    if not verify_signature(
+        body,
+        request.headers.get(SIGNATURE_HEADER),
+        settings.ELEVENLABS_WEBHOOK_SECRET,
+        settings.ELEVENLABS_WEBHOOK_TOLERANCE_SECONDS
+    ):
+        WEBHOOK_REQUESTS.inc(result="bad_signature")
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        WEBHOOK_REQUESTS.inc(result="invalid")
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
+    if payload.get("type") != TRANSCRIPT_EVENT or not isinstance(payload.get("data"), dict):
+        WEBHOOK_REQUESTS.inc(result="ignored")
+        return {"status": "ignored"}
+
+    if not get_webhook_queue().enqueue(payload["data"]):
+        WEBHOOK_REQUESTS.inc(result="queue_full")
+        raise HTTPException(
+            status_code=503,
+            detail="Webhook queue full, retry later",
+            headers={"Retry-After": "5"}
+        )
+
+    WEBHOOK_REQUESTS.inc(result="queued")
+    return {"status": "queued"}
@@ -0,0 +1,226 @@
+"""
+Admission control and load shedding
+
+Every API request takes a slot for its route class before it runs, so a spike
+of heavy admin/analysis calls cannot take all of the database pool (10 + 20
+connections per process) away from patients:
+
+- "patient_write": turns being saved (/chat/save-message, transcript sync,
+  webhooks) and login
+- "interactive": patient-facing chat and reads (/chat/stream, /chat/history, ...)
+- "analytics": /admin and /medication-analysis
+
+Each class has its own concurrency limit (ADMISSION_LIMITS) and all classes
+together at most ADMISSION_MAX_CONCURRENCY. When a slot frees up, waiting
+requests are admitted strictly by class priority (patient writes first), FIFO
+within a class. A request that cannot get a slot within its class's queue
+timeout (ADMISSION_QUEUE_TIMEOUT_MS), or finds ADMISSION_MAX_QUEUE requests
+already waiting, is shed with 503 + Retry-After before touching the database.
+
+Health, metrics, audio and CORS preflight requests are never queued. Limits
+are per process.
+"""
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.core.metrics import registry
+
+ROUTE_CLASSES = ("patient_write", "interactive", "analytics")  # Priority order
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+READ_ONLY_POSTS = {"/chat/history"}  # POSTs that only read
+INTERACTIVE_POSTS = {"/chat/message", "/chat/stream", "/chat/tts"}  # Long-running (LLM / TTS)
+
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "paco_admission_in_flight",
+    "Requests holding an admission slot",
+    ["route_class"]
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    "paco_admission_queue_depth",
+    "Requests waiting for an admission slot",
+    ["route_class"]
+)
+ADMISSION_SHED = registry.counter(
+    "paco_admission_shed_total",
+    "Requests rejected with 503 by admission control",
+    ["route_class", "reason"]
+)
+ADMISSION_WAIT = registry.histogram(
+    "paco_admission_wait_seconds",
+    "Time admitted requests waited for a slot",
+    ["route_class"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+)
+
+
+def parse_class_values(spec: str) -> Dict[str, float]:
+    """Parse "route_class=value,..." (unknown classes and bad values are ignored)"""
+    values = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() not in ROUTE_CLASSES:
+            continue
+        try:
+            values[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return values
+
+
+def route_class(method: str, path: str, api_prefix: str) -> Optional[str]:
+    """Admission class of a request, or None for requests that are never queued"""
+    if method == "OPTIONS":
+        return None
+    if path.startswith("/webhooks/"):
+        return "patient_write"
+    if not path.startswith(api_prefix + "/"):
+        return None  # /health, /metrics, /audio, docs
+    path = path[len(api_prefix):]
+    if path.startswith(("/admin", "/medication-analysis")):
+        return "analytics"
+    if path.startswith("/auth"):
+        return "patient_write"
+    if path.startswith("/chat"):
+        if method not in WRITE_METHODS or path in READ_ONLY_POSTS or path in INTERACTIVE_POSTS:
+            return "interactive"
+        return "patient_write"
+    return "interactive"
+
+
+class AdmissionController:
+    """Per-class and global concurrency limits with priority-ordered waiting"""
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        queue_timeouts: Dict[str, float],
+        max_concurrency: int,
+        max_queue: int
+    ):
+        self.limits = limits
+        self.queue_timeouts = queue_timeouts  # Seconds
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.in_flight: Dict[str, int] = {name: 0 for name in ROUTE_CLASSES}
+        self.total = 0
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {name: deque() for name in ROUTE_CLASSES}
+
+    def _can_admit(self, name: str) -> bool:
+        return self.in_flight[name] < self.limits[name] and self.total < self.max_concurrency
+
+    def _take(self, name: str) -> None:
+        self.in_flight[name] += 1
+        self.total += 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight[name], route_class=name)
+
+    def _wake(self) -> None:
+        for name in ROUTE_CLASSES:
+            waiters = self.waiters[name]
+            while waiters and self._can_admit(name):
+                future = waiters.popleft()
+                if not future.done():
+                    self._take(name)
+                    future.set_result(True)
+            ADMISSION_QUEUE_DEPTH.set(len(waiters), route_class=name)
+
+    def release(self, name: str) -> None:
+        self.in_flight[name] -= 1
+        self.total -= 1
+        ADMISSION_IN_FLIGHT.set(self.in_flight[name], route_class=name)
+        self._wake()
+
+    async def acquire(self, name: str) -> Optional[str]:
+        """Take a slot; returns None once admitted or the reason the request is shed"""
+        waiters = self.waiters[name]
+        if not waiters and self._can_admit(name):
+            self._take(name)
+            ADMISSION_WAIT.observe(0.0, route_class=name)
+            return None
+        if len(waiters) >= self.max_queue:
+            return "queue_full"
+
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        ADMISSION_QUEUE_DEPTH.set(len(waiters), route_class=name)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeouts[name])
+        except asyncio.TimeoutError:
+            if future.done():  # Admitted just as the wait ran out
+                ADMISSION_WAIT.observe(time.perf_counter() - start, route_class=name)
+                return None
+            future.cancel()
+            waiters.remove(future)
+            ADMISSION_QUEUE_DEPTH.set(len(waiters), route_class=name)
+            return "timeout"
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(name)
+            else:
+                future.cancel()
+                if future in waiters:
+                    waiters.remove(future)
+                ADMISSION_QUEUE_DEPTH.set(len(waiters), route_class=name)
+            raise
+        ADMISSION_WAIT.observe(time.perf_counter() - start, route_class=name)
+        return None
+
+
+class AdmissionMiddleware:
+    """Queue API requests per route class and shed what cannot be served in time"""
+
+    def __init__(
+        self,
+        app,
+        api_prefix: str,
+        limits: str,
+        queue_timeouts_ms: str,
+        max_concurrency: int = 24,
+        max_queue: int = 200
+    ):
+        self.app = app
+        self.api_prefix = api_prefix
+        class_limits = parse_class_values(limits)
+        class_timeouts = parse_class_values(queue_timeouts_ms)
+        self.controller = AdmissionController(
+            limits={name: int(class_limits.get(name, max_concurrency)) for name in ROUTE_CLASSES},
+            queue_timeouts={name: class_timeouts.get(name, 1000) / 1000 for name in ROUTE_CLASSES},
+            max_concurrency=max_concurrency,
+            max_queue=max_queue
+        )
+
+    async def __call__(self, scope, receive, send):
+        name = None
+        if scope["type"] == "http":
+            name = route_class(scope["method"], scope["path"], self.api_prefix)
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await self.controller.acquire(name)
+        if reason is not None:
+            ADMISSION_SHED.inc(route_class=name, reason=reason)
+            await self._shed(name, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name)
+
+    async def _shed(self, name: str, send) -> None:
+        retry_after = max(1, math.ceil(self.controller.queue_timeouts[name]))
+        body = json.dumps({"detail": "Server busy, please retry", "route_class": name}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
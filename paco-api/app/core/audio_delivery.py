@@ -0,0 +1,230 @@
+"""
+Audio file delivery for /audio
+
+Serves cached TTS audio with what media players need when scrubbing:
+
+- Single byte-range requests (206 with Content-Range, 416 when unsatisfiable,
+  If-Range honoured). Multi-range requests are coalesced when they overlap or
+  touch, otherwise the whole file is sent, which RFC 9110 allows.
+- Strong ETag and Last-Modified validators, with 304 for If-None-Match /
+  If-Modified-Since.
+- `Cache-Control: immutable` for content-addressed files (<2 hex>/<sha256>.<ext>),
+  whose URL never points at different audio.
+- Zero-copy bodies: the ASGI "http.response.zerocopysend" extension (sendfile)
+  or "http.response.pathsend" when the server offers them, otherwise positional
+  reads off the event loop in AUDIO_CHUNK_BYTES chunks.
+"""
+import asyncio
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.metrics import registry
+from app.core.responses import etag_matches
+
+AUDIO_RESPONSES = registry.counter(
+    "paco_audio_responses_total",
+    "Audio file responses by status (200 full, 206 range, 304 not modified)",
+    ["status"]
+)
+AUDIO_BYTES_SENT = registry.counter(
+    "paco_audio_bytes_sent_total",
+    "Audio body bytes sent, by delivery method",
+    ["method"]
+)
+
+AUDIO_CHUNK_BYTES = 256 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$")
+MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "ogg": "audio/ogg",
+    "opus": "audio/ogg",
+    "m4a": "audio/mp4",
+    "aac": "audio/aac",
+    "flac": "audio/flac",
+    "webm": "audio/webm",
+}
+
+
+class RangeNotSatisfiable(ValueError):
+    """No requested range overlaps the file"""
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (first, last) byte positions for a Range header, or None to send
+    the whole file (malformed header, other unit, or disjoint ranges).
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+
+    ranges: List[Tuple[int, int]] = []
+    for spec in specs.split(","):
+        first, dash, last = spec.strip().partition("-")
+        if not dash or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+            return None
+        if not first:  # Suffix: the last N bytes
+            if int(last) and size:
+                ranges.append((max(size - int(last), 0), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < size:
+            ranges.append((start, min(int(last), size - 1) if last else size - 1))
+
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+    ranges.sort()
+    first, last = ranges[0]
+    for start, end in ranges[1:]:
+        if start > last + 1:
+            return None
+        last = max(last, end)
+    return first, last
+
+
+def _etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _not_modified(request: Request, etag: str, mtime: int) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _range_applies(request: Request, etag: str, last_modified: str) -> bool:
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    # Strong comparison: a weak tag or a different date means the file changed
+    return if_range.strip() in (etag, last_modified)
+
+
+class AudioFileResponse(Response):
+    """A file (or one byte range of it) sent by the cheapest means the server offers"""
+
+    def __init__(
+        self,
+        path: str,
+        status_code: int,
+        headers: dict,
+        offset: int = 0,
+        length: int = 0,
+        send_body: bool = True
+    ):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.send_body = send_body and length > 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        AUDIO_RESPONSES.inc(status=str(self.status_code))
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        extensions = scope.get("extensions") or {}
+        whole_file = self.status_code == 200
+        if "http.response.pathsend" in extensions and whole_file:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            AUDIO_BYTES_SENT.inc(self.length, method="pathsend")
+            return
+
+        # The open descriptor keeps the bytes readable even if eviction unlinks the file now
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in extensions:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.offset,
+                    "count": self.length
+                })
+                AUDIO_BYTES_SENT.inc(self.length, method="sendfile")
+                return
+
+            position, end = self.offset, self.offset + self.length
+            while position < end:
+                chunk = await asyncio.to_thread(
+                    os.pread, f.fileno(), min(AUDIO_CHUNK_BYTES, end - position), position
+                )
+                if not chunk:  # Truncated underneath us; nothing more to send
+                    break
+                position += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": position < end})
+            if position < end:
+                await send({"type": "http.response.body", "body": b""})
+            AUDIO_BYTES_SENT.inc(position - self.offset, method="read")
+
+
+def audio_file_response(request: Request, directory: str, relative_path: str) -> Response:
+    """Response for `relative_path` under `directory`: 200, 206, 304, 404 or 416"""
+    normalized = os.path.normpath(relative_path)
+    if normalized.startswith(("..", "/")) or os.path.isabs(normalized):
+        return Response(status_code=404)
+    path = os.path.join(directory, normalized)
+    try:
+        st = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return Response(status_code=404)
+    if not stat.S_ISREG(st.st_mode):
+        return Response(status_code=404)
+
+    etag = _etag(st)
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    extension = normalized.rpartition(".")[2].lower()
+    headers = {
+        "accept-ranges": "bytes",
+        "etag": etag,
+        "last-modified": last_modified,
+        "cache-control": (
+            IMMUTABLE_CACHE_CONTROL if CONTENT_ADDRESSED.match(normalized.replace(os.sep, "/"))
+            else REVALIDATE_CACHE_CONTROL
+        ),
+    }
+
+    if _not_modified(request, etag, int(st.st_mtime)):
+        AUDIO_RESPONSES.inc(status="304")
+        return Response(status_code=304, headers=headers)
+
+    headers["content-type"] = MEDIA_TYPES.get(extension, "application/octet-stream")
+    send_body = request.method != "HEAD"
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and _range_applies(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, st.st_size)
+        except RangeNotSatisfiable:
+            AUDIO_RESPONSES.inc(status="416")
+            return Response(status_code=416, headers={
+                **headers, "content-range": f"bytes */{st.st_size}"
+            })
+
+    if byte_range is None:
+        headers["content-length"] = str(st.st_size)
+        return AudioFileResponse(path, 200, headers, 0, st.st_size, send_body)
+
+    first, last = byte_range
+    headers["content-length"] = str(last - first + 1)
+    headers["content-range"] = f"bytes {first}-{last}/{st.st_size}"
+    return AudioFileResponse(path, 206, headers, first, last - first + 1, send_body)
@@ -0,0 +1,191 @@
+"""
+Record/replay cassettes for external API calls (Groq, ElevenLabs)
+
+CASSETTE_MODE=record passes calls through and saves each request/response
+pair under CASSETTE_DIR/<service>/<sha256 of the request>.json.
+CASSETTE_MODE=replay serves them from disk without network or API keys,
+sleeping for the recorded latency (or a fixed CASSETTE_LATENCY) so load tests
+see realistic timing. With CASSETTE_STRICT=false, a request that was never
+recorded is answered by a deterministic pick from that service's cassettes,
+so synthetic participants can be load-tested from a handful of recordings.
+
+Requests are stored without headers, so API keys never reach the cassettes.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "record", "replay")
+
+
+class CassetteMiss(LookupError):
+    """Replay mode found no cassette for a request"""
+
+
+class CassetteStore:
+    """Directory of recorded request/response pairs"""
+
+    def __init__(self, directory: str, mode: str = "off", latency: str = "recorded", strict: bool = True):
+        if mode not in MODES:
+            raise ValueError(f"CASSETTE_MODE must be one of {', '.join(MODES)}")
+        self.directory = directory
+        self.mode = mode
+        self.latency = latency
+        self.strict = strict
+        self._listing: Dict[str, List[str]] = {}
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(request: Dict[str, Any]) -> str:
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, service: str, key: str) -> str:
+        return os.path.join(self.directory, service, f"{key}.json")
+
+    def _load(self, service: str, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(service, key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _fallback(self, service: str, key: str) -> Optional[Dict[str, Any]]:
+        """Deterministic stand-in for an unrecorded request (non-strict replay)"""
+        if service not in self._listing:
+            try:
+                names = sorted(n[:-5] for n in os.listdir(os.path.join(self.directory, service)) if n.endswith(".json"))
+            except FileNotFoundError:
+                names = []
+            self._listing[service] = names
+        names = self._listing[service]
+        if not names:
+            return None
+        return self._load(service, names[int(key, 16) % len(names)])
+
+    def _save(self, service: str, key: str, request: Dict[str, Any], response: Dict[str, Any], latency: float) -> None:
+        path = self._path(service, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "service": service,
+                "request": request,
+                "response": response,
+                "latency_seconds": round(latency, 4),
+                "recorded_at": time.time()
+            }, f, indent=2, default=str)
+        os.replace(tmp_path, path)
+        self._listing.pop(service, None)
+
+    def _fixed_delay(self) -> Optional[float]:
+        """Configured replay delay in seconds, or None to use the recorded timing"""
+        if self.latency == "recorded":
+            return None
+        try:
+            return float(self.latency)
+        except ValueError:
+            return 0.0
+
+    def _replay_entry(self, service: str, key: str) -> Dict[str, Any]:
+        entry = self._load(service, key)
+        if entry is None and not self.strict:
+            entry = self._fallback(service, key)
+        if entry is None:
+            raise CassetteMiss(f"No {service} cassette for request {key[:12]} in {self.directory}")
+        return entry
+
+    async def call(
+        self,
+        service: str,
+        request: Dict[str, Any],
+        fetch: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        Run `fetch` (which returns a JSON-serializable dict) according to the
+        mode. `request` must identify the call and must not contain secrets.
+        """
+        if self.mode == "off":
+            return await fetch()
+
+        key = self.key(request)
+        if self.mode == "replay":
+            entry = self._replay_entry(service, key)
+            delay = self._fixed_delay()
+            if delay is None:
+                delay = float(entry.get("latency_seconds", 0.0))
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return entry["response"]
+
+        start = time.perf_counter()
+        response = await fetch()
+        try:
+            self._save(service, key, request, response, time.perf_counter() - start)
+        except OSError:
+            logger.exception("Failed to write cassette", extra={"service": service})
+        return response
+
+    async def stream(
+        self,
+        service: str,
+        request: Dict[str, Any],
+        open_stream: Callable[[], AsyncIterator[Dict[str, Any]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of call(): events from `open_stream` are recorded
+        with their time offsets and replayed at the same pace (or, with a fixed
+        CASSETTE_LATENCY, all at once after that delay).
+        """
+        if self.mode == "off":
+            async for event in open_stream():
+                yield event
+            return
+
+        key = self.key(request)
+        if self.mode == "replay":
+            entry = self._replay_entry(service, key)
+            fixed = self._fixed_delay()
+            if fixed:
+                await asyncio.sleep(fixed)
+            elapsed = 0.0
+            for offset, event in entry["response"]["events"]:
+                if fixed is None and offset > elapsed:
+                    await asyncio.sleep(offset - elapsed)
+                    elapsed = offset
+                yield event
+            return
+
+        start = time.perf_counter()
+        events = []
+        async for event in open_stream():
+            events.append([round(time.perf_counter() - start, 4), event])
+            yield event
+        try:
+            self._save(service, key, request, {"events": events}, time.perf_counter() - start)
+        except OSError:
+            logger.exception("Failed to write cassette", extra={"service": service})
+
+
+@lru_cache()
+def get_cassette_store() -> CassetteStore:
+    """Process-wide store configured from settings"""
+    settings = get_settings()
+    return CassetteStore(
+        settings.CASSETTE_DIR,
+        mode=settings.CASSETTE_MODE,
+        latency=settings.CASSETTE_LATENCY,
+        strict=settings.CASSETTE_STRICT
+    )
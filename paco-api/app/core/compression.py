@@ -0,0 +1,264 @@
+"""
+Negotiated response compression
+
+A pure ASGI middleware that compresses response bodies with the best encoding
+the client accepts, in COMPRESSION_ENCODINGS preference order: zstd (needs the
+`zstandard` package), br (needs `brotli`) and gzip (standard library).
+Encodings whose package is not installed are skipped.
+
+- Bodies smaller than COMPRESSION_MIN_BYTES go out as-is; so do responses that
+  are already encoded, partial (206), bodiless (HEAD, 204, 304) or of an
+  incompressible type (audio, images, video, archives).
+- Streamed responses are compressed chunk by chunk, each chunk flushed so the
+  client sees data as soon as it is produced. Server-sent events are left
+  alone: proxies buffer compressed event streams.
+- Large single bodies are compressed in a worker thread to keep the event
+  loop free.
+- A strong ETag on a compressed response is made weak (W/"..."): the encoded
+  bytes differ from the identity representation, so per RFC 9110 they must
+  not share a strong validator (If-Range, caches). If-None-Match still
+  matches, being a weak comparison.
+"""
+import asyncio
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core.metrics import registry
+
+try:
+    import brotli
+except ImportError:  # Optional: br is offered only when installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd is offered only when installed
+    zstandard = None
+
+COMPRESSION_BYTES = registry.counter(
+    "paco_compression_bytes_total",
+    "Response body bytes before (in) and after (out) compression",
+    ["encoding", "stage"]
+)
+COMPRESSION_SECONDS = registry.counter(
+    "paco_compression_cpu_seconds_total",
+    "Time spent compressing response bodies",
+    ["encoding"]
+)
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+THREAD_THRESHOLD_BYTES = 256 * 1024  # Compress bodies at least this large off the event loop
+
+INCOMPRESSIBLE_PREFIXES = ("audio/", "video/", "image/")
+INCOMPRESSIBLE_TYPES = {
+    "text/event-stream",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/octet-stream",
+}
+
+
+class GzipCompressor:
+    encoding = "gzip"
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    encoding = "br"
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    encoding = "zstd"
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_compressors() -> Dict[str, Callable]:
+    """Encoding name -> compressor class, for codecs usable in this environment"""
+    compressors = {"gzip": GzipCompressor}
+    if brotli is not None:
+        compressors["br"] = BrotliCompressor
+    if zstandard is not None:
+        compressors["zstd"] = ZstdCompressor
+    return compressors
+
+
+def negotiate(accept_encoding: str, preference: List[str]) -> Optional[str]:
+    """First encoding in `preference` the client accepts (q > 0), or None"""
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    for encoding in preference:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0:
+            return encoding
+    return None
+
+
+def compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in INCOMPRESSIBLE_TYPES:
+        return False
+    return content_type == "image/svg+xml" or not content_type.startswith(INCOMPRESSIBLE_PREFIXES)
+
+
+def compress_body(compressor, body: bytes) -> Tuple[bytes, float]:
+    """Compress a complete body; returns (compressed, seconds spent)"""
+    start = time.perf_counter()
+    compressed = compressor.compress(body) + compressor.finish()
+    return compressed, time.perf_counter() - start
+
+
+class CompressionMiddleware:
+    """Compress eligible HTTP responses with the negotiated Content-Encoding"""
+
+    def __init__(self, app, minimum_size: int = 1024, encodings: str = "zstd,br,gzip"):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressors = available_compressors()
+        self.preference = [
+            e.strip() for e in encodings.split(",") if e.strip() in self.compressors
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.preference)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(self, encoding, send).run(scope, receive)
+
+
+class _CompressedResponse:
+    """Per-request state: decide on the first body message, then pass through or compress"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.app = middleware.app
+        self.minimum_size = middleware.minimum_size
+        self.encoding = encoding
+        self.compressor_class = middleware.compressors[encoding]
+        self.send = send
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def run(self, scope, receive) -> None:
+        await self.app(scope, receive, self.wrapped_send)
+
+    async def wrapped_send(self, message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.start_message = message
+            self.passthrough = (
+                message["status"] in (204, 206, 304) or message["status"] < 200
+                or not compressible(headers)
+            )
+            if not self.passthrough and "content-length" in headers:
+                self.passthrough = int(headers["content-length"]) < self.minimum_size
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if self.passthrough or message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            self.compressor = self.compressor_class()
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag is not None and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            if "content-length" in headers:
+                del headers["content-length"]
+            self.start_message["headers"] = headers.raw
+            if not more_body:
+                # Whole body at once: compress in one go (off the loop if large)
+                if len(body) >= THREAD_THRESHOLD_BYTES:
+                    compressed, seconds = await asyncio.to_thread(compress_body, self.compressor, body)
+                else:
+                    compressed, seconds = compress_body(self.compressor, body)
+                headers["Content-Length"] = str(len(compressed))
+                self._record(len(body), len(compressed), seconds)
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            await self.send(self.start_message)
+
+        start = time.perf_counter()
+        if more_body:
+            compressed = self.compressor.compress(body) + self.compressor.flush()
+        else:
+            compressed = self.compressor.compress(body) + self.compressor.finish()
+        self._record(len(body), len(compressed), time.perf_counter() - start)
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    def _record(self, raw: int, compressed: int, seconds: float) -> None:
+        COMPRESSION_BYTES.inc(raw, encoding=self.encoding, stage="in")
+        COMPRESSION_BYTES.inc(compressed, encoding=self.encoding, stage="out")
+        COMPRESSION_SECONDS.inc(seconds, encoding=self.encoding)
@@ -24,13 +24,63 @@ class Settings(BaseSettings):
     DATABASE_URL: str
 
     # LLM API Keys
-    GROQ_API_KEY: str  # Primary LLM provider
+    GROQ_API_KEY: str = ""  # Primary LLM provider (not needed when CASSETTE_MODE=replay)
     OPENROUTER_API_KEY: str = ""  # Optional alternative
 
+    # LLM usage accounting
+    LLM_PRICING: str = "llama-3.3-70b-versatile=0.59:0.79"  # USD per 1M tokens, "model=input:output,..."
+    LLM_DAILY_TOKEN_BUDGET: int = 0  # Tokens per UTC day across all callers (0 = unlimited)
+    LLM_RESEARCH_ID_DAILY_TOKEN_BUDGET: int = 0  # Tokens per UTC day per research ID (0 = unlimited)
+
+    # LLM scheduling (per process; 0 = unlimited)
+    LLM_REQUESTS_PER_MINUTE: int = 30  # Keep under the provider's requests/min limit
+    LLM_TOKENS_PER_MINUTE: int = 0  # Prompt + completion tokens/min
+    LLM_MAX_CONCURRENCY: int = 4  # Calls in flight at once
+
     # ElevenLabs
-    ELEVENLABS_API_KEY: str
+    ELEVENLABS_API_KEY: str = ""  # Not needed when CASSETTE_MODE=replay
     ELEVENLABS_VOICE_ID: str = "9BWtsMINqrJLrRacOk9x"  # Aria voice
     ELEVENLABS_MODEL_ID: str = "eleven_multilingual_v2"
+    ELEVENLABS_WEBHOOK_SECRET: str = ""  # Post-call webhook HMAC secret (empty = /webhooks/elevenlabs disabled)
+    ELEVENLABS_WEBHOOK_TOLERANCE_SECONDS: int = 1800  # Reject signatures older than this (replay protection)
+    ELEVENLABS_WEBHOOK_QUEUE_SIZE: int = 1000  # Payloads waiting to be written; beyond this the webhook answers 503
+    ELEVENLABS_WEBHOOK_BATCH_SIZE: int = 50  # Payloads written per commit
+    ELEVENLABS_AGENT_ID: str = ""  # Conversational AI agent the widget talks to (needed by the reconciler)
+
+    # Background reconciliation of ElevenLabs conversations (run in one process only)
+    RECONCILE_INTERVAL_SECONDS: int = 0  # Seconds between runs (0 = off; scripts/reconcile_elevenlabs.py runs once)
+    RECONCILE_CONCURRENCY: int = 4  # Transcripts fetched from ElevenLabs at once
+    RECONCILE_LOOKBACK_SECONDS: int = 3600  # Re-list this far behind the high-water mark (late-finishing calls)
+
+    # Text-to-speech
+    TTS_BACKEND: str = "elevenlabs"  # "elevenlabs", "stub" (silent WAV, no network) or "package.module:factory"
+    AUDIO_CACHE_DIR: str = "audio_files"  # Content-addressed audio, served at /audio
+    AUDIO_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # LRU eviction beyond this (1 GiB)
+
+    # Record/replay of Groq and ElevenLabs calls (offline benchmarking)
+    CASSETTE_MODE: str = "off"  # "off", "record" (call APIs and save) or "replay" (serve from disk, no keys)
+    CASSETTE_DIR: str = "cassettes"  # One JSON file per recorded request, per service
+    CASSETTE_LATENCY: str = "recorded"  # Replay delay: "recorded" or fixed seconds, e.g. "0.8" ("0" = none)
+    CASSETTE_STRICT: bool = True  # False: unrecorded requests replay a deterministic pick of recorded ones
+
+    # Turn ingestion over WebSocket (/chat/ws/ingest)
+    INGEST_BATCH_SIZE: int = 20  # Commit once this many turns are waiting
+    INGEST_FLUSH_INTERVAL_MS: int = 50  # ... or this long after the first one arrived
+
+    # Server-side chat (/chat/stream)
+    CHAT_MODELS: str = "llama-3.3-70b-versatile"  # Models a request may choose (comma-separated); first is the default
+    CHAT_HISTORY_MESSAGES: int = 20  # Most recent turns sent verbatim; older ones go into a rolling summary
+    CHAT_CONTEXT_TOKENS: int = 6000  # Prompt budget (system prompt + summary + turns + new message)
+    CHAT_SUMMARY_BATCH: int = 6  # Fold older turns into the summary once this many are waiting
+    CHAT_SUMMARY_MAX_TOKENS: int = 400  # Summary length cap
+    CHAT_MAX_TOKENS: int = 1000  # Reply length cap
+
+    # Admission control (per process): patient writes, then interactive chat, then analytics
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_CONCURRENCY: int = 24  # API requests running at once, all classes (DB pool is 10 + 20)
+    ADMISSION_LIMITS: str = "patient_write=20,interactive=12,analytics=4"  # Per-class concurrency
+    ADMISSION_QUEUE_TIMEOUT_MS: str = "patient_write=5000,interactive=2000,analytics=500"  # Then 503 + Retry-After
+    ADMISSION_MAX_QUEUE: int = 200  # Waiting requests per class beyond which new ones are shed at once
 
     # CORS - accepts comma-separated string or list
     CORS_ORIGINS: Union[str, List[str]] = "http://localhost:3000,http://localhost:5173,https://paco.vercel.app"
@@ -41,6 +91,38 @@ class Settings(BaseSettings):
     # Research IDs (used by seed script only)
     RESEARCH_IDS: str = ""
 
+    # Observability
+    METRICS_ENABLED: bool = True  # Request timing middleware, /metrics and Server-Timing
+    QUERY_DEBUG: bool = False  # Dev/test: flag repeated SQL shapes and check endpoint query budgets
+    QUERY_BUDGET_STRICT: bool = False  # Raise QueryBudgetExceeded instead of only logging
+    QUERY_REPEAT_THRESHOLD: int = 3  # Same statement shape this many times in one request = likely N+1
+
+    # Medication analysis
+    ANALYSIS_PREFILTER_ENABLED: bool = True  # Send only medication-relevant turns to the LLM
+    ANALYSIS_CONTEXT_TURNS: int = 1  # Neighbouring turns kept around each relevant turn
+    ANALYSIS_COMPACTION_ENABLED: bool = True  # Drop near-duplicate assistant turns, keep only their questions
+    ANALYSIS_DEDUP_THRESHOLD: float = 0.8  # MinHash Jaccard estimate at which assistant turns count as duplicates
+    ANALYSIS_RESPONSE_CACHE_SIZE: int = 1024  # Research IDs whose /latest and /history bodies stay in memory (0 = off)
+    SIMILARITY_ENABLED: bool = True  # Embed analyses into the local vector index as they are written
+    SIMILARITY_INDEX_DIR: str = "vector_index"  # Memory-mapped vectors + metadata
+    SIMILARITY_EMBEDDER: str = "hashing"  # "hashing" or "package.module:factory" for a local model
+    SIMILARITY_DIM: int = 1024  # Vector dimension (changing it requires a rebuild)
+
+    # Serialization
+    FAST_JSON_RESPONSES: bool = True  # Opted-in endpoints serialize ORM rows straight to JSON bytes
+    COMPRESSION_ENABLED: bool = True  # Negotiated Content-Encoding for responses
+    COMPRESSION_MIN_BYTES: int = 1024  # Smaller bodies are sent uncompressed
+    COMPRESSION_ENCODINGS: str = "zstd,br,gzip"  # Preference order; zstd/br need the zstandard/brotli packages
+
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = ""  # Per-module overrides, e.g. "app.core.query_budget=WARNING,uvicorn.access=WARNING"
+    LOG_FORMAT: str = "json"  # "json" or "text"
+    LOG_QUEUE_SIZE: int = 10000  # Records beyond this are dropped (and counted) rather than blocking
+    LOG_RATE_LIMIT_BURST: int = 20  # Identical warnings/errors allowed per window before sampling
+    LOG_RATE_LIMIT_WINDOW_SECONDS: float = 60.0
+    LOG_SAMPLE_EVERY: int = 100  # After the burst, emit 1 in N identical records
+
     @field_validator('CORS_ORIGINS', mode='before')
     @classmethod
     def parse_cors_origins(cls, v):
@@ -0,0 +1,190 @@
+"""
+Per-request timing and database query instrumentation
+
+A pure ASGI middleware opens a RequestContext for every HTTP request. SQLAlchemy
+cursor events and track_timing() blocks add to that context, and the totals are
+exported as Prometheus metrics and a Server-Timing response header.
+"""
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Counter, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from app.core.metrics import registry
+
+REQUEST_DURATION = registry.histogram(
+    "paco_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"]
+)
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    "paco_db_queries_per_request",
+    "Number of SQL statements executed per HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250)
+)
+DB_QUERY_DURATION = registry.histogram(
+    "paco_db_query_duration_seconds",
+    "SQL statement execution time",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+SEGMENT_DURATION = registry.histogram(
+    "paco_request_segment_duration_seconds",
+    "Time spent in named request segments (auth, outbound LLM/HTTP calls)",
+    ["segment"]
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+@dataclass
+class RequestContext:
+    """Mutable per-request state shared by middleware, DB hooks and services"""
+    request_id: str
+    method: str
+    path: str
+    start: float = field(default_factory=perf_counter)
+    route: Optional[str] = None
+    research_id: Optional[str] = None
+    db_query_count: int = 0
+    db_query_seconds: float = 0.0
+    segments: Dict[str, float] = field(default_factory=dict)
+    # Raw statement counts, only collected when QUERY_DEBUG is enabled
+    statement_shapes: Optional[Counter[str]] = None
+
+    def add_segment(self, name: str, seconds: float) -> None:
+        self.segments[name] = self.segments.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Render the Server-Timing header value (durations in ms)"""
+        total = (perf_counter() - self.start) * 1000
+        entries = [f"app;dur={total:.1f}"]
+        if self.db_query_count:
+            entries.append(
+                f'db;dur={self.db_query_seconds * 1000:.1f};desc="{self.db_query_count} queries"'
+            )
+        for name, seconds in self.segments.items():
+            entries.append(f"{name};dur={seconds * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_request_context: ContextVar[Optional[RequestContext]] = ContextVar(
+    "paco_request_context", default=None
+)
+
+
+def get_request_context() -> Optional[RequestContext]:
+    """Return the context of the request being served, if any"""
+    return _request_context.get()
+
+
+@contextmanager
+def track_timing(segment: str):
+    """Time a block and attribute it to the current request under `segment`"""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        SEGMENT_DURATION.observe(elapsed, segment=segment)
+        ctx = _request_context.get()
+        if ctx is not None:
+            ctx.add_segment(segment, elapsed)
+
+
+def route_template(scope) -> str:
+    """Return the matched route path template (e.g. /history/{research_id})"""
+    path = getattr(scope.get("route"), "path", None)
+    return path or UNMATCHED_ROUTE
+
+
+class RequestTimingMiddleware:
+    """Record latency and DB usage per request and emit a Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+
+        ctx = RequestContext(
+            request_id=request_id or uuid.uuid4().hex,
+            method=scope["method"],
+            path=scope["path"]
+        )
+        token = _request_context.set(ctx)
+        # Also reachable from the outer error handler, which runs after the reset below
+        scope["paco.request_context"] = ctx
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                ctx.route = route_template(scope)
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", ctx.server_timing())
+                headers.append("X-Request-ID", ctx.request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = ctx.route or route_template(scope)
+            REQUEST_DURATION.observe(
+                perf_counter() - ctx.start,
+                method=ctx.method,
+                route=route,
+                status=str(status_code)
+            )
+            DB_QUERIES_PER_REQUEST.observe(ctx.db_query_count, route=route)
+            _request_context.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("paco_query_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("paco_query_start")
+    if not starts:
+        return
+    elapsed = perf_counter() - starts.pop()
+    DB_QUERY_DURATION.observe(elapsed)
+    ctx = _request_context.get()
+    if ctx is not None:
+        ctx.db_query_count += 1
+        ctx.db_query_seconds += elapsed
+        if ctx.statement_shapes is not None:
+            ctx.statement_shapes[statement] += 1
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None:
+        starts = conn.info.get("paco_query_start")
+        if starts:
+            starts.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach query timing hooks to an engine (idempotent)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,203 @@
+"""
+Structured logging configuration
+
+Application code logs through the standard `logging` module. configure_logging()
+routes every record through a bounded, non-blocking queue to a background
+listener thread that writes JSON lines to stdout, so request handlers never block
+on stdout I/O. Records are stamped with the request id, route and research id of
+the request being served, and bursts of identical warnings/errors are rate
+limited and then sampled, with the number of suppressed records reported on the
+next record that gets through.
+"""
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+from app.core.instrumentation import get_request_context
+from app.core.metrics import registry
+
+LOG_RECORDS_DROPPED = registry.counter(
+    "paco_log_records_dropped_total",
+    "Log records dropped because the queue was full or sampling suppressed them",
+    ["reason"]
+)
+
+# Attributes present on every LogRecord; anything else was passed via `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "request_id", "route", "research_id", "suppressed"
+}
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Copy request id, route and research id from the current request onto records"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        ctx = get_request_context()
+        if ctx is not None:
+            record.request_id = ctx.request_id
+            record.route = ctx.route or ctx.path
+            record.research_id = ctx.research_id
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Rate limit identical WARNING+ records, then sample them
+
+    The first `burst` records per (logger, message template) in each `window`
+    seconds pass; after that only one in `sample_every` passes. Suppressed
+    records are counted and reported on the next record that passes.
+    """
+
+    def __init__(self, burst: int = 20, window: float = 60.0, sample_every: int = 100):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.sample_every = max(1, sample_every)
+        self._state: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            # [window_start, seen_in_window, suppressed_since_last_emit]
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                state = [now, 0, suppressed]
+                self._state[key] = state
+                if len(self._state) > 10000:
+                    self._state.clear()
+                    self._state[key] = state
+            state[1] += 1
+            seen = state[1]
+            allowed = seen <= self.burst or (seen - self.burst) % self.sample_every == 0
+            if not allowed:
+                state[2] += 1
+                LOG_RECORDS_DROPPED.inc(reason="sampled")
+                return False
+            if state[2]:
+                record.suppressed = state[2]
+                state[2] = 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for attr in ("request_id", "route", "research_id", "suppressed"):
+            value = getattr(record, attr, None)
+            if value is not None:
+                payload[attr] = value
+        for attr, value in record.__dict__.items():
+            if attr not in _RESERVED_ATTRS and not attr.startswith("_"):
+                payload[attr] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(reason="queue_full")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback here (the listener thread has no
+        # access to the request context or live exception objects)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_log_levels(spec: str) -> Dict[str, str]:
+    """Parse "app.services=DEBUG,uvicorn.access=WARNING" into a dict"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(settings) -> None:
+    """Install the queue handler on the root logger and start the listener (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s",
+            defaults={"request_id": "-"}
+        ))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(RateLimitFilter(
+        burst=settings.LOG_RATE_LIMIT_BURST,
+        window=settings.LOG_RATE_LIMIT_WINDOW_SECONDS,
+        sample_every=settings.LOG_SAMPLE_EVERY
+    ))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    # Route uvicorn's loggers through the same pipeline
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    for name, level in parse_log_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
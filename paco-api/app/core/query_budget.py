@@ -0,0 +1,157 @@
+"""
+N+1 query detection and per-endpoint query budgets (development/test mode)
+
+Endpoints declare how many SQL statements they may issue with @query_budget(n).
+When QUERY_DEBUG is enabled, QueryBudgetMiddleware records the shape of every
+statement executed during a request, warns about statement shapes that repeat
+(the usual N+1 signature) and about budget overruns. With QUERY_BUDGET_STRICT
+the overrun is raised as QueryBudgetExceeded so test clients fail loudly.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from app.core.instrumentation import get_request_context, route_template
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\bIN\s*\((?:[^()]*)\)", re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a request exceeds its declared query budget"""
+
+
+def normalize_statement(statement: str) -> str:
+    """Reduce a SQL statement to its shape so repeats can be grouped"""
+    shape = _IN_LIST.sub("IN (...)", statement)
+    shape = _LITERAL.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def query_budget(max_queries: int) -> Callable:
+    """Declare the maximum number of SQL statements an endpoint may execute"""
+    def decorator(func):
+        func.__query_budget__ = max_queries
+        return func
+    return decorator
+
+
+@dataclass
+class QueryReport:
+    """Statements observed for one request or block"""
+    route: str
+    shapes: Dict[str, int]
+    budget: Optional[int] = None
+    repeat_threshold: int = 3
+
+    @property
+    def count(self) -> int:
+        return sum(self.shapes.values())
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+    def repeated(self) -> Dict[str, int]:
+        """Statement shapes executed at least `repeat_threshold` times"""
+        return {
+            shape: n for shape, n in self.shapes.items()
+            if n >= self.repeat_threshold
+        }
+
+    def describe(self) -> str:
+        lines = [f"{self.route}: {self.count} queries (budget {self.budget})"]
+        for shape, n in sorted(self.repeated().items(), key=lambda item: -item[1]):
+            lines.append(f"  {n}x {shape[:200]}")
+        return "\n".join(lines)
+
+
+def _endpoint_budget(scope) -> Optional[int]:
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__query_budget__", None)
+
+
+class QueryBudgetMiddleware:
+    """Collect statement shapes per request and enforce endpoint budgets"""
+
+    def __init__(self, app, strict: bool = False, repeat_threshold: int = 3):
+        self.app = app
+        self.strict = strict
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        ctx = get_request_context()
+        if scope["type"] != "http" or ctx is None:
+            await self.app(scope, receive, send)
+            return
+
+        ctx.statement_shapes = Counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Query-Count", str(ctx.db_query_count))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        shapes = Counter()
+        for statement, n in ctx.statement_shapes.items():
+            shapes[normalize_statement(statement)] += n
+        report = QueryReport(
+            route=route_template(scope),
+            shapes=dict(shapes),
+            budget=_endpoint_budget(scope),
+            repeat_threshold=self.repeat_threshold
+        )
+        if report.repeated():
+            logger.warning("Repeated SQL statements (possible N+1)\n%s", report.describe())
+        if report.over_budget:
+            logger.warning("Query budget exceeded\n%s", report.describe())
+            if self.strict:
+                raise QueryBudgetExceeded(report.describe())
+
+
+@dataclass
+class QueryCounter:
+    """Statements captured by count_queries()"""
+    statements: List[str] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def report(self, label: str = "block", repeat_threshold: int = 3) -> QueryReport:
+        shapes = Counter(normalize_statement(s) for s in self.statements)
+        return QueryReport(route=label, shapes=dict(shapes), repeat_threshold=repeat_threshold)
+
+    def assert_max(self, max_queries: int, label: str = "block") -> None:
+        if self.count > max_queries:
+            report = self.report(label)
+            report.budget = max_queries
+            raise QueryBudgetExceeded(report.describe())
+
+
+@contextmanager
+def count_queries(engine: Engine):
+    """Capture every statement executed on `engine` inside the block (for tests/scripts)"""
+    counter = QueryCounter()
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
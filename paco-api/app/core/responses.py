@@ -0,0 +1,43 @@
+"""
+Fast JSON responses for high-volume endpoints
+
+FastAPI's default path builds Pydantic models, re-validates them against the
+route's response_model and serializes through jsonable_encoder + json.dumps.
+Endpoints can opt into this fast path instead: ORM rows are validated once with
+from_attributes and dumped straight to JSON bytes by pydantic-core. The route's
+response_model is still used for the OpenAPI schema.
+"""
+from functools import lru_cache
+from typing import Any, Optional, Type
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def get_adapter(model: Type) -> TypeAdapter:
+    """Cached TypeAdapter per response type (building one compiles a validator)"""
+    return TypeAdapter(model)
+
+
+def serialize_model(model: Type, data: Any) -> bytes:
+    """Validate `data` (dicts and ORM objects allowed) as `model` and dump to JSON bytes"""
+    adapter = get_adapter(model)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+
+def fast_json_response(model: Type, data: Any, status_code: int = 200) -> Response:
+    """Return `data` serialized as `model` without FastAPI's re-validation pass"""
+    return Response(
+        content=serialize_model(model, data),
+        status_code=status_code,
+        media_type="application/json"
+    )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag` (weak comparison, RFC 9110 13.1.2)"""
+    if if_none_match is None:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
@@ -8,11 +8,14 @@ from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from sqlalchemy import select, update
 
 from app.core.config import get_settings
+from app.core.instrumentation import track_timing
 from app.db.base import get_db
 from app.models.database import ResearchID, UserSession
 from app.schemas.auth import TokenData
+from app.services.research_id_resolver import research_id_resolver
 
 settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -53,13 +56,29 @@ def verify_token(token: str) -> TokenData:
         raise credentials_exception
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> ResearchID:
-    """Get current authenticated user from JWT token"""
-    token = credentials.credentials
-    token_data = verify_token(token)
+def authenticate_token(db: Session, token: str) -> ResearchID:
+    """Validate a JWT, touch its session and return the active research ID (401 otherwise)"""
+    with track_timing("auth"):
+        token_data = verify_token(token)
+
+    # Update session last_active time (single UPDATE, no row fetch), only if
+    # the research ID is active: inactive participants' sessions are left
+    # untouched. Committed before loading the user so the returned row is not
+    # expired by the commit.
+    db.execute(
+        update(UserSession)
+        .where(
+            UserSession.id == token_data.session_id,
+            UserSession.research_id_fk.in_(
+                select(ResearchID.id).where(
+                    ResearchID.research_id == token_data.research_id,
+                    ResearchID.is_active == True
+                )
+            )
+        )
+        .values(last_active=datetime.utcnow())
+    )
+    db.commit()
 
     # Verify research ID exists and is active
     research_user = db.query(ResearchID).filter(
@@ -73,18 +92,20 @@ async def get_current_user(
             detail="Research ID not found or inactive"
         )
 
-    # Update session last_active time
-    session = db.query(UserSession).filter(
-        UserSession.id == token_data.session_id
-    ).first()
-
-    if session:
-        session.last_active = datetime.utcnow()
-        db.commit()
+    # Share the resolved primary key with services used later in this request
+    research_id_resolver.prime(db, research_user)
 
     return research_user
 
 
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> ResearchID:
+    """Get current authenticated user from JWT token"""
+    return authenticate_token(db, credentials.credentials)
+
+
 def verify_admin_password(password: str) -> bool:
     """Verify admin password"""
     if not settings.ADMIN_PASSWORD:
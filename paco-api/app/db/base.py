@@ -5,6 +5,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings
+from app.core.instrumentation import instrument_engine
 
 settings = get_settings()
 
@@ -16,6 +17,9 @@ engine = create_engine(
     max_overflow=20
 )
 
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
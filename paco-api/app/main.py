@@ -3,19 +3,27 @@ Main FastAPI application
 """
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+import logging
 import os
-import traceback
 
 from app.core.config import get_settings
-from app.api.endpoints import auth, chat, admin, medication_analysis
+from app.core.logging_config import configure_logging
+from app.core.admission import AdmissionMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.instrumentation import RequestTimingMiddleware
+from app.core.metrics import registry, PROMETHEUS_CONTENT_TYPE
+from app.core.query_budget import QueryBudgetMiddleware
+from app.api.endpoints import auth, chat, admin, medication_analysis, audio, webhooks
+from app.services.elevenlabs_reconciler import start_reconciler, stop_reconciler
+from app.services.elevenlabs_webhook import get_webhook_queue
+from app.services.llm_usage import llm_usage_service
 
 settings = get_settings()
+configure_logging(settings)
+logger = logging.getLogger(__name__)
 
-# Debug: Print CORS origins on startup
-print(f"🔧 CORS_ORIGINS configured: {settings.CORS_ORIGINS}")
-print(f"🔧 CORS_ORIGINS type: {type(settings.CORS_ORIGINS)}")
+logger.info("CORS origins configured", extra={"cors_origins": settings.CORS_ORIGINS})
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -23,6 +31,26 @@ app = FastAPI(
     description="Multi-user FastAPI backend for PaCo - P.A.D. Educational Chatbot"
 )
 
+# Response compression - innermost, so CORS and timing see the encoded response
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_BYTES,
+        encodings=settings.COMPRESSION_ENCODINGS
+    )
+
+# Admission control - inside CORS so 503s carry CORS headers, outside everything
+# that does work, so shed requests cost almost nothing
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        api_prefix=settings.API_V1_PREFIX,
+        limits=settings.ADMISSION_LIMITS,
+        queue_timeouts_ms=settings.ADMISSION_QUEUE_TIMEOUT_MS,
+        max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+        max_queue=settings.ADMISSION_MAX_QUEUE
+    )
+
 # CORS middleware - must be before routes
 app.add_middleware(
     CORSMiddleware,
@@ -34,14 +62,32 @@ app.add_middleware(
     max_age=3600,  # Cache preflight requests for 1 hour
 )
 
-print(f"✅ CORS middleware added with origins: {settings.CORS_ORIGINS}")
+# Request timing - outermost so it sees the full request including CORS handling
+if settings.METRICS_ENABLED:
+    if settings.QUERY_DEBUG:
+        # N+1 detection and query budgets (needs the timing middleware's request context)
+        app.add_middleware(
+            QueryBudgetMiddleware,
+            strict=settings.QUERY_BUDGET_STRICT,
+            repeat_threshold=settings.QUERY_REPEAT_THRESHOLD
+        )
+    app.add_middleware(RequestTimingMiddleware)
 
 # Global exception handler to ensure CORS headers on errors
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Catch all unhandled exceptions and return with CORS headers"""
-    print(f"❌ Unhandled exception: {exc}")
-    print(f"❌ Traceback: {traceback.format_exc()}")
+    ctx = request.scope.get("paco.request_context")
+    logger.error(
+        "Unhandled exception: %s",
+        type(exc).__name__,
+        exc_info=exc,
+        extra={
+            "request_id": ctx.request_id,
+            "route": ctx.route or ctx.path,
+            "research_id": ctx.research_id
+        } if ctx else None
+    )
 
     return JSONResponse(
         status_code=500,
@@ -53,6 +99,7 @@ async def global_exception_handler(request: Request, exc: Exception):
         headers={
             "Access-Control-Allow-Origin": request.headers.get("origin", "*"),
             "Access-Control-Allow-Credentials": "true",
+            **({"X-Request-ID": ctx.request_id} if ctx else {}),
         }
     )
 
@@ -67,10 +114,28 @@ app.include_router(auth.router, prefix=f"{settings.API_V1_PREFIX}/auth", tags=["
 app.include_router(chat.router, prefix=f"{settings.API_V1_PREFIX}/chat", tags=["chat"])
 app.include_router(admin.router, prefix=f"{settings.API_V1_PREFIX}/admin", tags=["admin"])
 app.include_router(medication_analysis.router, prefix=f"{settings.API_V1_PREFIX}/medication-analysis", tags=["medication-analysis"])
+app.include_router(webhooks.router, prefix="/webhooks", tags=["webhooks"])
+
+# Audio files (TTS cache writes here): Range, ETag/304 and zero-copy delivery
+os.makedirs(settings.AUDIO_CACHE_DIR, exist_ok=True)
+app.include_router(audio.router, prefix="/audio", tags=["audio"])
 
-# Mount audio files directory
-if os.path.exists("audio_files"):
-    app.mount("/audio", StaticFiles(directory="audio_files"), name="audio")
+
+@app.on_event("startup")
+async def start_background_jobs():
+    """ElevenLabs reconciliation loop (RECONCILE_INTERVAL_SECONDS > 0)"""
+    start_reconciler()
+
+
+@app.on_event("shutdown")
+async def drain_webhook_queue():
+    """
+    Stop reconciling and write webhook transcripts and LLM usage rows that
+    were accepted but not yet stored
+    """
+    stop_reconciler()
+    await get_webhook_queue().drain()
+    await llm_usage_service.flush()
 
 
 @app.get("/")
@@ -89,6 +154,13 @@ async def health_check():
     return {"status": "healthy"}
 
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Prometheus metrics endpoint"""
+        return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
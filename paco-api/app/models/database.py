@@ -1,9 +1,9 @@
 """
 SQLAlchemy models for database tables
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy import BigInteger, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from app.db.base import Base
 
 
@@ -53,6 +53,32 @@ class DisclaimerAcknowledgment(Base):
     research_user = relationship("ResearchID", back_populates="disclaimers")
 
 
+class ConversationThread(Base):
+    """One row per conversation, with counters kept current on every message insert"""
+    __tablename__ = "paco_conversation_threads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    research_id_fk = Column(Integer, ForeignKey("paco_research_ids.id"), nullable=False)
+    conversation_id = Column(String(255), nullable=False)  # Same string as paco_conversations.conversation_id
+    provider = Column(String(20), nullable=True)  # Provider of the first message
+    elevenlabs_conversation_id = Column(String(255), nullable=True, index=True)
+    message_count = Column(Integer, default=0, nullable=False)
+    first_at = Column(DateTime(timezone=True), nullable=True)
+    last_at = Column(DateTime(timezone=True), nullable=True)
+    # Fingerprint of the ElevenLabs transcript last synced into this thread
+    transcript_entries = Column(Integer, nullable=True)  # Entries processed, empty ones included
+    transcript_last_message_id = Column(String(255), nullable=True)
+    transcript_hash = Column(String(64), nullable=True)  # sha256 hex over the entries
+
+    # Relationships
+    messages = relationship("Conversation", back_populates="thread")
+
+    __table_args__ = (
+        UniqueConstraint('research_id_fk', 'conversation_id', name='uq_conversation_thread'),
+        Index('ix_conversation_thread_research_last_at', 'research_id_fk', 'last_at'),
+    )
+
+
 class Conversation(Base):
     """Chat messages for all users"""
     __tablename__ = "paco_conversations"
@@ -67,19 +93,30 @@ class Conversation(Base):
     audio_url = Column(String(500), nullable=True)  # Path to TTS audio file if generated
 
     # Provider tracking
-    provider = Column(String(20), default="openai", nullable=True)  # 'elevenlabs' or 'openai'
+    provider = Column(String(20), default="openai", nullable=True)  # 'elevenlabs', 'groq' (server-side chat) or 'openai'
 
     # ElevenLabs-specific fields
     elevenlabs_conversation_id = Column(String(255), nullable=True)
     elevenlabs_message_id = Column(String(255), nullable=True)
 
+    # Thread this message belongs to (set by ConversationService.append_messages)
+    thread_id = Column(Integer, ForeignKey("paco_conversation_threads.id"), nullable=True, index=True)
+
     # Relationships
     research_user = relationship("ResearchID", back_populates="conversations")
+    thread = relationship("ConversationThread", back_populates="messages")
 
     # Indexes for efficient queries
     __table_args__ = (
         Index('ix_conversation_research_timestamp', 'conversation_id', 'timestamp'),
         Index('ix_research_timestamp', 'research_id_fk', 'timestamp'),
+        # One stored copy per ElevenLabs message, whichever writer gets there first
+        Index(
+            'ux_conversation_elevenlabs_message', 'elevenlabs_conversation_id', 'elevenlabs_message_id',
+            unique=True,
+            postgresql_where=text('elevenlabs_message_id IS NOT NULL'),
+            sqlite_where=text('elevenlabs_message_id IS NOT NULL')
+        ),
     )
 
 
@@ -122,3 +159,68 @@ class MedicationAdherenceAnalysis(Base):
     __table_args__ = (
         Index('ix_adherence_research_date', 'research_id_fk', 'analysis_date'),
     )
+
+
+class MedicationMention(Base):
+    """Normalized medication / side-effect / barrier / strategy mentions per analysis (cohort index)"""
+    __tablename__ = "paco_medication_mentions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    analysis_id = Column(Integer, ForeignKey("paco_medication_adherence.id", ondelete="CASCADE"), nullable=False, index=True)
+    research_id_fk = Column(Integer, ForeignKey("paco_research_ids.id"), nullable=False, index=True)
+    kind = Column(String(20), nullable=False)  # 'medication', 'side_effect', 'barrier', 'strategy'
+    term = Column(String(255), nullable=False)  # Normalized term (generic drug name, canonical symptom, barrier type)
+    medication = Column(String(255), nullable=True)  # Normalized medication a side effect is attributed to
+    detail = Column(Text, nullable=True)  # Original text from the analysis
+
+    # Relationships
+    analysis = relationship("MedicationAdherenceAnalysis", backref="mentions")
+
+    # Indexes for cohort lookups
+    __table_args__ = (
+        Index('ix_mention_kind_term', 'kind', 'term', 'analysis_id'),
+        Index('ix_mention_kind_medication', 'kind', 'medication'),
+    )
+
+
+class LLMUsage(Base):
+    """One row per LLM call: tokens, latency and who made it (cost accounting)"""
+    __tablename__ = "paco_llm_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    research_id_fk = Column(Integer, ForeignKey("paco_research_ids.id"), nullable=True)  # Null = not tied to a participant
+    caller = Column(String(50), nullable=False)  # e.g. 'medication_analysis'
+    model = Column(String(100), nullable=False)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    latency_ms = Column(Integer, default=0, nullable=False)
+    status = Column(String(20), default="ok", nullable=False)  # 'ok' or 'error'
+
+    # Indexes for daily budgets and aggregates
+    __table_args__ = (
+        Index('ix_llm_usage_created', 'created_at'),
+        Index('ix_llm_usage_research_created', 'research_id_fk', 'created_at'),
+    )
+
+
+class ConversationSummary(Base):
+    """Rolling summary of a conversation's older turns (server-side chat context)"""
+    __tablename__ = "paco_conversation_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    conversation_id = Column(String(255), unique=True, nullable=False)
+    research_id_fk = Column(Integer, ForeignKey("paco_research_ids.id"), nullable=False)
+    summary = Column(Text, nullable=False)
+    summarized_through_id = Column(Integer, nullable=False)  # Last paco_conversations.id folded in
+    summarized_messages = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class SyncState(Base):
+    """Progress marker for a background job (e.g. ElevenLabs reconciliation high-water mark)"""
+    __tablename__ = "paco_sync_state"
+
+    name = Column(String(100), primary_key=True)
+    high_water_mark = Column(BigInteger, default=0, nullable=False)  # Job-defined, e.g. unix seconds
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -182,4 +182,14 @@ When you're ready, I'll ask you a few questions. Take your time, and feel free t
 **There's no pressure—just an open conversation between us.**
 
 Would you like to begin?
-"""
\ No newline at end of file
+"""
+conversation_summary_prompt = """You keep a running summary of a conversation between a patient and PaCo, a medication adherence guide.
+
+Update the existing summary with the new turns below. Keep every medication (name, dose, schedule), side effect, barrier, strategy the patient agreed to try, question still open, and anything personal the patient shared that PaCo should remember. Drop greetings and small talk. Write plain sentences in the third person ("The patient..."), at most 200 words, and output only the summary.
+
+Existing summary:
+{summary}
+
+New turns:
+{turns}
+"""
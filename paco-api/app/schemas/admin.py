@@ -48,3 +48,30 @@ class AdminStatsResponse(BaseModel):
     total_conversations: int
     total_messages: int
     messages_last_24h: int
+
+
+class LLMUsageRequest(AdminAuth):
+    """LLM usage aggregate query"""
+    group_by: str = Field("day", pattern="^(day|research_id|model|caller)$")
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+
+class LLMUsageAggregate(BaseModel):
+    """LLM usage totals for one group"""
+    key: Optional[str]  # Day (YYYY-MM-DD), research ID, model or caller; null = no research ID
+    calls: int
+    errors: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    avg_latency_ms: float
+    estimated_cost_usd: float
+
+
+class LLMUsageResponse(BaseModel):
+    """Grouped LLM usage with overall totals"""
+    group_by: str
+    rows: List[LLMUsageAggregate]
+    total_tokens: int
+    estimated_cost_usd: float
@@ -1,10 +1,12 @@
 """
 Pydantic schemas for conversation/chat functionality
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 from typing import Optional, List, Literal
 
+from app.core.config import get_settings
+
 
 class MessageCreate(BaseModel):
     """Request to send a chat message"""
@@ -44,11 +46,21 @@ class ConversationHistoryResponse(BaseModel):
 
 
 class StreamChatRequest(BaseModel):
-    """WebSocket chat streaming request"""
+    """Streaming chat request (/chat/stream)"""
     research_id: str
-    conversation_id: str
-    message: str
-    model: str = "gpt-4o"
+    conversation_id: Optional[str] = None  # New conversation if omitted
+    message: str = Field(..., min_length=1, max_length=10000)
+    model: Optional[str] = Field(None, validate_default=True)  # One of CHAT_MODELS (default: the first)
+
+    @field_validator("model")
+    @classmethod
+    def model_allowed(cls, value: Optional[str]) -> str:
+        allowed = [model.strip() for model in get_settings().CHAT_MODELS.split(",") if model.strip()]
+        if value is None:
+            return allowed[0]
+        if value not in allowed:
+            raise ValueError(f"model must be one of: {', '.join(allowed)}")
+        return value
 
 
 class TTSRequest(BaseModel):
@@ -56,6 +68,7 @@ class TTSRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=5000)
     voice_id: Optional[str] = None
     model_id: Optional[str] = None
+    message_id: Optional[int] = None  # Store the audio URL on this message (must be the caller's)
 
 
 class TTSResponse(BaseModel):
@@ -63,6 +76,7 @@ class TTSResponse(BaseModel):
     audio_url: str
     duration_seconds: Optional[float] = None
     text_length: int
+    cached: bool = False  # Served from the audio cache without synthesis
 
 
 class MessageSaveRequest(BaseModel):
@@ -83,6 +97,26 @@ class MessageSaveResponse(BaseModel):
     timestamp: datetime
 
 
+class IngestTurn(BaseModel):
+    """One turn sent over the /chat/ws/ingest WebSocket"""
+    client_id: str = Field(..., min_length=1, max_length=100)  # Echoed in the ack
+    role: Literal["user", "assistant"]
+    content: str = Field(..., min_length=1, max_length=10000)
+    timestamp: datetime
+    provider: Literal["elevenlabs", "openai"] = "elevenlabs"
+    elevenlabs_conversation_id: Optional[str] = None
+    elevenlabs_message_id: Optional[str] = None
+
+
+class IngestAck(BaseModel):
+    """Persisted turn, acknowledged over the /chat/ws/ingest WebSocket"""
+    client_id: str
+    message_id: int
+    conversation_id: str
+    timestamp: datetime
+    duplicate: bool = False  # Already stored (same ElevenLabs message ID)
+
+
 class ElevenLabsConversationSyncRequest(BaseModel):
     """Request to sync an ElevenLabs conversation"""
     research_id: str
@@ -94,3 +128,6 @@ class ElevenLabsConversationSyncResponse(BaseModel):
     success: bool
     messages_synced: int
     conversation_id: str
+    sync_mode: Literal["unchanged", "tail", "full"] = "full"  # Per the stored transcript fingerprint
+    transcript_messages: int = 0  # Entries in the ElevenLabs transcript
+    messages_checked: int = 0  # Entries processed this time (0 when unchanged, the new tail otherwise)
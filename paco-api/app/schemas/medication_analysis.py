@@ -2,7 +2,7 @@
 Pydantic schemas for medication adherence analysis
 """
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 
@@ -62,6 +62,7 @@ class AnalysisRequest(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     model: str = "llama-3.3-70b-versatile"
+    priority: Literal["interactive", "default", "bulk"] = "interactive"  # "bulk" for cohort runs
 
     class Config:
         json_schema_extra = {
@@ -127,3 +128,57 @@ class AnalysisHistoryResponse(BaseModel):
     research_id: str
     analyses: List[AnalysisHistoryItem]
     total_count: int
+
+
+class CohortMention(BaseModel):
+    """One indexed mention that matched a cohort query"""
+    kind: str
+    term: str
+    medication: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class CohortMatch(BaseModel):
+    """A participant analysis matching a cohort query"""
+    research_id: str
+    analysis_id: int
+    analysis_date: datetime
+    mentions: List[CohortMention]
+
+
+class CohortQueryResponse(BaseModel):
+    """Participants matching medication / side-effect / barrier filters"""
+    matches: List[CohortMatch]
+    total_count: int
+
+
+class SearchHit(BaseModel):
+    """A message matching a full-text search"""
+    message_id: int
+    research_id: str
+    conversation_id: str
+    role: str
+    timestamp: datetime
+    rank: float
+    snippet: Optional[str] = None
+
+
+class SearchResponse(BaseModel):
+    """One page of search results; pass next_cursor to get the next page"""
+    results: List[SearchHit]
+    next_cursor: Optional[str] = None
+
+
+class SimilarParticipant(BaseModel):
+    """A participant whose latest analysis is similar to the query"""
+    research_id: str
+    analysis_id: int
+    analysis_date: datetime
+    score: float
+    summary: str
+
+
+class SimilarityResponse(BaseModel):
+    """Most similar participants, best first"""
+    results: List[SimilarParticipant]
+    total_count: int
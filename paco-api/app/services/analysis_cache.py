@@ -0,0 +1,77 @@
+"""
+Response cache for medication analysis reads
+
+/medication-analysis/latest and /history responses only change when a new
+analysis is written, so they are versioned by the participant's latest
+analysis (id, analysis_date). Each request looks that version up with one
+narrow query and uses it as the ETag: a matching If-None-Match gets a 304, and
+otherwise the serialized body cached for that version is returned without
+loading or re-parsing detailed_analysis.
+
+The cache is per process. analyze_medication_adherence invalidates a research
+ID as soon as it commits; other workers notice the new version on their next
+lookup, so no response is ever served stale.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+
+ANALYSIS_CACHE_REQUESTS = registry.counter(
+    "paco_analysis_cache_requests_total",
+    "Analysis read requests by result (not_modified = 304, hit = cached body, miss = rebuilt)",
+    ["endpoint", "result"]
+)
+
+
+def analysis_etag(variant: str, version: Optional[Tuple[int, datetime]]) -> str:
+    """Strong ETag for one representation (e.g. "latest", "history-10") of a version"""
+    if version is None:
+        return f'"{variant}-none"'
+    analysis_id, analysis_date = version
+    return f'"{variant}-{analysis_id}-{int(analysis_date.timestamp() * 1000):x}"'
+
+
+class AnalysisResponseCache:
+    """Serialized responses per research ID and variant, LRU by research ID"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Dict[str, Tuple[str, bytes]]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, research_id: str, variant: str, etag: str) -> Optional[bytes]:
+        """Cached body if it was stored for this ETag"""
+        with self._lock:
+            variants = self._entries.get(research_id)
+            if variants is None:
+                return None
+            cached = variants.get(variant)
+            if cached is None or cached[0] != etag:
+                return None
+            self._entries.move_to_end(research_id)
+            return cached[1]
+
+    def put(self, research_id: str, variant: str, etag: str, body: bytes) -> None:
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries.setdefault(research_id, {})[variant] = (etag, body)
+            self._entries.move_to_end(research_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, research_id: Optional[str] = None) -> None:
+        """Drop one research ID (or everything)"""
+        with self._lock:
+            if research_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(research_id, None)
+
+
+# Singleton instance
+analysis_response_cache = AnalysisResponseCache(get_settings().ANALYSIS_RESPONSE_CACHE_SIZE)
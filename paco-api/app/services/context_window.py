@@ -0,0 +1,215 @@
+"""
+Context-window management for server-side chat
+
+Each /chat/stream turn sends master_prompt, a rolling summary of the
+conversation's older turns, and as many recent turns verbatim as fit in
+CHAT_CONTEXT_TOKENS (at most CHAT_HISTORY_MESSAGES). The summary lives in
+paco_conversation_summaries, one row per conversation_id, and is extended
+incrementally: once CHAT_SUMMARY_BATCH turns have fallen out of the verbatim
+window they are folded into it with one short LLM call in a background task
+started after the reply has been saved, so the stream, its database session
+and its admission slot are released without waiting for it. Prompt size
+therefore stays flat as a conversation grows, and no turn pays for
+re-summarizing the whole history.
+
+A refresh that fails (or is cut short by shutdown) leaves the turns
+unsummarized; the next turn sends what still fits and tries again.
+"""
+import asyncio
+import contextvars
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import desc
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.base import SessionLocal
+from app.models.database import Conversation, ConversationSummary
+from app.prompts import conversation_summary_prompt
+from app.services.llm_service import llm_service
+from app.services.medication_extraction import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators per chat message
+MAX_UNSUMMARIZED = 200  # Unsummarized turns loaded per request
+MAX_FOLD = 50  # Turns folded into the summary per refresh (long backlogs catch up over turns)
+
+_refresh_tasks: Set[asyncio.Task] = set()  # Held so running refreshes are not garbage collected
+
+
+@dataclass
+class ContextWindow:
+    """Prompt for one chat turn plus what the summary refresh needs afterwards"""
+    messages: List[Dict[str, str]]
+    prompt_tokens: int
+    summary_id: Optional[int] = None
+    summary: Optional[str] = None
+    summarized_through_id: int = 0
+    summarized_messages: int = 0
+    overflow: List[Dict[str, Any]] = field(default_factory=list)  # Unsummarized turns older than the window
+    omitted: int = 0  # Turns neither summarized nor sent (over the token budget)
+
+
+def _message_tokens(content: str) -> int:
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindowService:
+    """Build token-bounded chat prompts and maintain rolling summaries"""
+
+    @staticmethod
+    def build(
+        db: Session,
+        research_id_fk: int,
+        conversation_id: str,
+        system_prompt: str,
+        new_message: str
+    ) -> ContextWindow:
+        """System prompt + summary + recent turns (newest kept first) + the new message"""
+        settings = get_settings()
+
+        summary = db.query(ConversationSummary).filter(
+            ConversationSummary.conversation_id == conversation_id,
+            ConversationSummary.research_id_fk == research_id_fk
+        ).first()
+
+        query = db.query(Conversation.id, Conversation.role, Conversation.content).filter(
+            Conversation.research_id_fk == research_id_fk,
+            Conversation.conversation_id == conversation_id
+        )
+        if summary:
+            query = query.filter(Conversation.id > summary.summarized_through_id)
+        unsummarized = [
+            {"id": row.id, "role": "user" if row.role == "user" else "assistant", "content": row.content}
+            for row in reversed(query.order_by(desc(Conversation.id)).limit(MAX_UNSUMMARIZED).all())
+        ]
+        overflow_count = max(len(unsummarized) - settings.CHAT_HISTORY_MESSAGES, 0)
+        overflow, recent = unsummarized[:overflow_count], unsummarized[overflow_count:]
+
+        head = [{"role": "system", "content": system_prompt}]
+        if summary:
+            head.append({"role": "system", "content": f"Summary of the conversation so far:\n{summary.summary}"})
+        tail = [{"role": "user", "content": new_message}]
+        tokens = sum(_message_tokens(m["content"]) for m in head + tail)
+
+        # Newest first: recent turns, then not-yet-summarized older ones, while they fit
+        history = []
+        for turn in reversed(overflow + recent):
+            cost = _message_tokens(turn["content"])
+            if tokens + cost > settings.CHAT_CONTEXT_TOKENS:
+                break
+            tokens += cost
+            history.append({"role": turn["role"], "content": turn["content"]})
+
+        return ContextWindow(
+            messages=head + history[::-1] + tail,
+            prompt_tokens=tokens,
+            summary_id=summary.id if summary else None,
+            summary=summary.summary if summary else None,
+            summarized_through_id=summary.summarized_through_id if summary else 0,
+            summarized_messages=summary.summarized_messages if summary else 0,
+            overflow=overflow,
+            omitted=len(unsummarized) - len(history)
+        )
+
+    @staticmethod
+    async def refresh_summary(
+        db: Session,
+        research_id_fk: int,
+        conversation_id: str,
+        window: ContextWindow,
+        model: str
+    ) -> bool:
+        """
+        Fold the window's overflow turns into the stored summary once there
+        are CHAT_SUMMARY_BATCH of them. Returns True if the summary advanced;
+        a concurrent refresh of the same conversation wins and this one is
+        discarded.
+        """
+        settings = get_settings()
+        batch = window.overflow[:MAX_FOLD]
+        if len(batch) < settings.CHAT_SUMMARY_BATCH:
+            return False
+
+        turns = "\n".join(
+            f"{'Patient' if turn['role'] == 'user' else 'PaCo'}: {turn['content']}" for turn in batch
+        )
+        summary = await llm_service.get_chat_completion(
+            messages=[{"role": "user", "content": conversation_summary_prompt.format(
+                summary=window.summary or "(none yet)",
+                turns=turns
+            )}],
+            model=model,
+            temperature=0.2,
+            max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+            caller="chat_summary",
+            research_id_fk=research_id_fk,
+            priority="default"
+        )
+        values = {
+            "summary": summary.strip(),
+            "summarized_through_id": batch[-1]["id"],
+            "summarized_messages": window.summarized_messages + len(batch)
+        }
+
+        if window.summary_id is None:
+            db.add(ConversationSummary(conversation_id=conversation_id, research_id_fk=research_id_fk, **values))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                return False
+            return True
+
+        # Compare-and-set on the high-water mark so concurrent turns cannot regress it
+        updated = db.query(ConversationSummary).filter(
+            ConversationSummary.id == window.summary_id,
+            ConversationSummary.summarized_through_id == window.summarized_through_id
+        ).update(values, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+
+    @staticmethod
+    def schedule_refresh(
+        research_id_fk: int,
+        conversation_id: str,
+        window: ContextWindow,
+        model: str
+    ) -> None:
+        """
+        Run refresh_summary in the background with its own session, detached
+        from the request (a client disconnect does not cancel it). No-op
+        until CHAT_SUMMARY_BATCH turns are due.
+        """
+        if len(window.overflow) < get_settings().CHAT_SUMMARY_BATCH:
+            return
+        task = asyncio.create_task(
+            _refresh_in_background(research_id_fk, conversation_id, window, model),
+            context=contextvars.Context()  # Not attributed to the request's metrics or logs
+        )
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+
+
+async def _refresh_in_background(
+    research_id_fk: int,
+    conversation_id: str,
+    window: ContextWindow,
+    model: str
+) -> None:
+    db = SessionLocal()
+    try:
+        await ContextWindowService.refresh_summary(db, research_id_fk, conversation_id, window, model)
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to refresh conversation summary", extra={"conversation_id": conversation_id})
+    finally:
+        db.close()
+
+
+# Singleton instance
+context_window_service = ContextWindowService()
@@ -0,0 +1,270 @@
+"""
+Full-text search over conversation content
+
+Postgres uses an expression GIN index on to_tsvector('english', content), so
+the index is maintained by Postgres itself on every insert/update. SQLite
+(local runs) uses an external-content FTS5 table kept in sync by triggers.
+Results are ranked (ts_rank_cd / bm25), come with highlighted snippets and
+are paged with a keyset cursor on (rank, id) instead of OFFSET.
+
+Snippets are safe to render as HTML: the database marks matches with
+private-use sentinel characters, the text is HTML-escaped, and only then are
+the sentinels replaced with <mark> tags.
+"""
+import base64
+import html
+import json
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+TS_CONFIG = "english"
+SNIPPET_START = "<mark>"
+SNIPPET_STOP = "</mark>"
+MATCH_START = "\ue000"  # Sentinels the database wraps matches in (Unicode private use)
+MATCH_STOP = "\ue001"
+MAX_LIMIT = 100
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(rank: float, message_id: int) -> str:
+    raw = json.dumps([rank, message_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rank, message_id = json.loads(raw)
+        return float(rank), int(message_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def render_snippet(raw: Optional[str]) -> Optional[str]:
+    """HTML-escape a snippet, then turn its match sentinels into <mark> tags"""
+    if raw is None:
+        return None
+    return html.escape(raw).replace(MATCH_START, SNIPPET_START).replace(MATCH_STOP, SNIPPET_STOP)
+
+
+def fts5_query(query: str) -> str:
+    """Quote each word so user input cannot inject FTS5 syntax (implicit AND)"""
+    return " ".join(f'"{token}"' for token in _TOKEN.findall(query))
+
+
+def ensure_sqlite_fts(connection: Connection) -> None:
+    """Create the FTS5 table and sync triggers (idempotent; SQLite only)"""
+    exists = connection.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'paco_conversations_fts'"
+    )).first()
+    if exists:
+        return
+
+    connection.execute(text("""
+        CREATE VIRTUAL TABLE paco_conversations_fts USING fts5(
+            content, content='paco_conversations', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS paco_conversations_fts_ai AFTER INSERT ON paco_conversations BEGIN
+            INSERT INTO paco_conversations_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS paco_conversations_fts_ad AFTER DELETE ON paco_conversations BEGIN
+            INSERT INTO paco_conversations_fts(paco_conversations_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+    """))
+    connection.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS paco_conversations_fts_au AFTER UPDATE OF content ON paco_conversations BEGIN
+            INSERT INTO paco_conversations_fts(paco_conversations_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+            INSERT INTO paco_conversations_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """))
+    # Index rows that existed before the table
+    connection.execute(text(
+        "INSERT INTO paco_conversations_fts(paco_conversations_fts) VALUES ('rebuild')"
+    ))
+
+
+@dataclass
+class SearchFilters:
+    research_id_fk: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    role: Optional[str] = None
+
+    def sql(self, alias: str) -> Tuple[str, Dict[str, Any]]:
+        clauses = []
+        params: Dict[str, Any] = {}
+        if self.research_id_fk is not None:
+            clauses.append(f"{alias}.research_id_fk = :research_id_fk")
+            params["research_id_fk"] = self.research_id_fk
+        if self.start_date is not None:
+            clauses.append(f"{alias}.timestamp >= :start_date")
+            params["start_date"] = self.start_date
+        if self.end_date is not None:
+            clauses.append(f"{alias}.timestamp <= :end_date")
+            params["end_date"] = self.end_date
+        if self.role is not None:
+            clauses.append(f"{alias}.role = :role")
+            params["role"] = self.role
+        return "".join(f" AND {clause}" for clause in clauses), params
+
+
+class ConversationSearchService:
+    """Ranked full-text search with keyset pagination"""
+
+    @staticmethod
+    def search(
+        db: Session,
+        query: str,
+        filters: Optional[SearchFilters] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Search message content. Returns (hits, next_cursor); hits are ordered
+        by rank (higher = better) then message id, and next_cursor is None on
+        the last page. Raises InvalidCursor for a malformed cursor.
+        """
+        filters = filters or SearchFilters()
+        limit = max(1, min(limit, MAX_LIMIT))
+        after = decode_cursor(cursor) if cursor else None
+
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            match = fts5_query(query)
+            if not match:
+                return [], None
+            sql, params = ConversationSearchService._sqlite_sql(match, filters, after)
+        else:
+            if not query.strip():
+                return [], None
+            sql, params = ConversationSearchService._postgres_sql(query, filters, after)
+        params["limit"] = limit + 1
+
+        rows = db.execute(text(sql), params).mappings().all()
+        page = rows[:limit]
+        if dialect == "sqlite" and page:
+            snippets = ConversationSearchService._sqlite_snippets(db, match, [row["id"] for row in page])
+            page = [dict(row, snippet=snippets.get(row["id"])) for row in page]
+
+        hits = [
+            {
+                "message_id": row["id"],
+                "research_id": row["research_id"],
+                "conversation_id": row["conversation_id"],
+                "role": row["role"],
+                "timestamp": row["timestamp"],
+                "rank": float(row["rank"]),
+                "snippet": render_snippet(row["snippet"])
+            }
+            for row in page
+        ]
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = hits[-1]
+            next_cursor = encode_cursor(last["rank"], last["message_id"])
+        return hits, next_cursor
+
+    @staticmethod
+    def _keyset(after: Optional[Tuple[float, int]], params: Dict[str, Any]) -> str:
+        if after is None:
+            return ""
+        params["after_rank"], params["after_id"] = after
+        return " AND (rank < :after_rank OR (rank = :after_rank AND id < :after_id))"
+
+    @staticmethod
+    def _postgres_sql(
+        query: str,
+        filters: SearchFilters,
+        after: Optional[Tuple[float, int]]
+    ) -> Tuple[str, Dict[str, Any]]:
+        where, params = filters.sql("c")
+        params["query"] = query
+        keyset = ConversationSearchService._keyset(after, params)
+        # Rank every match but only build headlines for the page
+        sql = f"""
+            WITH q AS (SELECT websearch_to_tsquery('{TS_CONFIG}', :query) AS query),
+            matches AS (
+                SELECT c.id, ts_rank_cd(to_tsvector('{TS_CONFIG}', c.content), q.query) AS rank
+                FROM paco_conversations c, q
+                WHERE to_tsvector('{TS_CONFIG}', c.content) @@ q.query{where}
+            ),
+            page AS (
+                SELECT id, rank FROM matches
+                WHERE TRUE{keyset}
+                ORDER BY rank DESC, id DESC
+                LIMIT :limit
+            )
+            SELECT c.id, r.research_id, c.conversation_id, c.role, c.timestamp, page.rank,
+                   ts_headline('{TS_CONFIG}', c.content, q.query,
+                               'StartSel={MATCH_START}, StopSel={MATCH_STOP}, MaxWords=24, MinWords=8, MaxFragments=2')
+                       AS snippet
+            FROM page
+            JOIN paco_conversations c ON c.id = page.id
+            JOIN paco_research_ids r ON r.id = c.research_id_fk
+            CROSS JOIN q
+            ORDER BY page.rank DESC, page.id DESC
+        """
+        return sql, params
+
+    @staticmethod
+    def _sqlite_sql(
+        match: str,
+        filters: SearchFilters,
+        after: Optional[Tuple[float, int]]
+    ) -> Tuple[str, Dict[str, Any]]:
+        where, params = filters.sql("c")
+        params["match"] = match
+        keyset = ConversationSearchService._keyset(after, params)
+        # bm25() is lower-is-better; negate so both backends sort rank DESC.
+        # Snippets are built afterwards for the page only (see _sqlite_snippets).
+        sql = f"""
+            SELECT * FROM (
+                SELECT c.id, r.research_id, c.conversation_id, c.role, c.timestamp,
+                       -bm25(paco_conversations_fts) AS rank
+                FROM paco_conversations_fts
+                JOIN paco_conversations c ON c.id = paco_conversations_fts.rowid
+                JOIN paco_research_ids r ON r.id = c.research_id_fk
+                WHERE paco_conversations_fts MATCH :match{where}
+            )
+            WHERE 1 = 1{keyset}
+            ORDER BY rank DESC, id DESC
+            LIMIT :limit
+        """
+        return sql, params
+
+    @staticmethod
+    def _sqlite_snippets(db: Session, match: str, ids: List[int]) -> Dict[int, str]:
+        params: Dict[str, Any] = {"match": match}
+        placeholders = []
+        for i, message_id in enumerate(ids):
+            params[f"id_{i}"] = message_id
+            placeholders.append(f":id_{i}")
+        rows = db.execute(text(f"""
+            SELECT rowid, snippet(paco_conversations_fts, 0, '{MATCH_START}', '{MATCH_STOP}', '…', 16)
+            FROM paco_conversations_fts
+            WHERE paco_conversations_fts MATCH :match AND rowid IN ({", ".join(placeholders)})
+        """), params).all()
+        return {rowid: snippet for rowid, snippet in rows}
+
+
+# Singleton instance
+conversation_search_service = ConversationSearchService()
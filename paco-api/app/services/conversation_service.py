@@ -1,13 +1,16 @@
 """
 Conversation management service
 """
-from datetime import datetime
-from typing import List, Optional
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import case, desc, func
+from sqlalchemy.dialects import postgresql, sqlite
 
-from app.models.database import Conversation, ResearchID
+from app.models.database import Conversation, ConversationThread
 from app.schemas.conversation import MessageResponse
+from app.services.research_id_resolver import research_id_resolver
 
 
 class ConversationService:
@@ -31,23 +34,17 @@ class ConversationService:
     ) -> Conversation:
         """Save a message to the database"""
         # Get research ID foreign key
-        research_user = db.query(ResearchID).filter(
-            ResearchID.research_id == research_id
-        ).first()
+        research_id_fk = research_id_resolver.resolve(db, research_id)
 
-        if not research_user:
+        if research_id_fk is None:
             raise ValueError(f"Research ID {research_id} not found")
 
-        message = Conversation(
-            research_id_fk=research_user.id,
+        message, = ConversationService.append_messages(
+            db,
+            research_id_fk=research_id_fk,
             conversation_id=conversation_id,
-            role=role,
-            content=content,
-            model_used=model_used,
-            audio_url=audio_url
+            messages=[{"role": role, "content": content, "model_used": model_used, "audio_url": audio_url}]
         )
-
-        db.add(message)
         db.commit()
         db.refresh(message)
         return message
@@ -65,15 +62,13 @@ class ConversationService:
         Returns (messages, total_count)
         """
         # Get research ID foreign key
-        research_user = db.query(ResearchID).filter(
-            ResearchID.research_id == research_id
-        ).first()
+        research_id_fk = research_id_resolver.resolve(db, research_id)
 
-        if not research_user:
+        if research_id_fk is None:
             return [], 0
 
         query = db.query(Conversation).filter(
-            Conversation.research_id_fk == research_user.id
+            Conversation.research_id_fk == research_id_fk
         )
 
         if conversation_id:
@@ -94,41 +89,173 @@ class ConversationService:
         limit: int = 10
     ) -> List[str]:
         """Get list of recent conversation IDs for a research ID"""
-        research_user = db.query(ResearchID).filter(
-            ResearchID.research_id == research_id
-        ).first()
+        research_id_fk = research_id_resolver.resolve(db, research_id)
 
-        if not research_user:
+        if research_id_fk is None:
             return []
 
-        conversations = db.query(Conversation.conversation_id).filter(
-            Conversation.research_id_fk == research_user.id
-        ).distinct().order_by(
-            desc(Conversation.timestamp)
+        conversations = db.query(ConversationThread.conversation_id).filter(
+            ConversationThread.research_id_fk == research_id_fk
+        ).order_by(
+            desc(ConversationThread.last_at)
         ).limit(limit).all()
 
         return [conv[0] for conv in conversations]
 
+    @staticmethod
     def get_existing_elevenlabs_conversations(
         db: Session,
         research_id: str
     ) -> List[str]:
         """Get list of existing ElevenLabs conversation IDs for a research ID"""
-        research_user = db.query(ResearchID).filter(
-            ResearchID.research_id == research_id
-        ).first()
+        research_id_fk = research_id_resolver.resolve(db, research_id)
 
-        if not research_user:
+        if research_id_fk is None:
             return []
 
-        # Get distinct elevenlabs_conversation_id values that are not null
-        conversations = db.query(Conversation.elevenlabs_conversation_id).filter(
-            Conversation.research_id_fk == research_user.id,
-            Conversation.elevenlabs_conversation_id.isnot(None)
+        conversations = db.query(ConversationThread.elevenlabs_conversation_id).filter(
+            ConversationThread.research_id_fk == research_id_fk,
+            ConversationThread.elevenlabs_conversation_id.isnot(None)
         ).distinct().all()
 
         return [conv[0] for conv in conversations if conv[0]]
 
+    @staticmethod
+    def _upsert_thread(
+        db: Session,
+        research_id_fk: int,
+        conversation_id: str,
+        provider: Optional[str],
+        elevenlabs_conversation_id: Optional[str],
+        message_count: int,
+        first_at: datetime,
+        last_at: datetime
+    ) -> int:
+        """Create the thread or bump its counters in one statement; returns its id"""
+        dialect_insert = sqlite.insert if db.get_bind().dialect.name == "sqlite" else postgresql.insert
+        threads = ConversationThread.__table__
+        statement = dialect_insert(threads).values(
+            research_id_fk=research_id_fk,
+            conversation_id=conversation_id,
+            provider=provider,
+            elevenlabs_conversation_id=elevenlabs_conversation_id,
+            message_count=message_count,
+            first_at=first_at,
+            last_at=last_at
+        )
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[threads.c.research_id_fk, threads.c.conversation_id],
+            set_={
+                "message_count": threads.c.message_count + excluded.message_count,
+                "first_at": case((excluded.first_at < threads.c.first_at, excluded.first_at), else_=threads.c.first_at),
+                "last_at": case((excluded.last_at > threads.c.last_at, excluded.last_at), else_=threads.c.last_at),
+                "elevenlabs_conversation_id": func.coalesce(
+                    threads.c.elevenlabs_conversation_id, excluded.elevenlabs_conversation_id
+                )
+            }
+        ).returning(threads.c.id)
+        return db.execute(statement).scalar_one()
+
+    @staticmethod
+    def append_messages(
+        db: Session,
+        research_id_fk: int,
+        conversation_id: str,
+        messages: List[Dict[str, Any]],
+        provider: Optional[str] = "openai",
+        elevenlabs_conversation_id: Optional[str] = None
+    ) -> List[Optional[Conversation]]:
+        """
+        Insert messages into one conversation and keep its thread row current.
+
+        Every insert into paco_conversations goes through here. Each message is
+        a dict with role and content, and optionally timestamp (default now),
+        model_used, audio_url and elevenlabs_message_id. Two statements
+        regardless of batch size (thread upsert, multi-row INSERT .. RETURNING);
+        the caller commits. Returns the new rows in input order.
+
+        A message whose (elevenlabs_conversation_id, elevenlabs_message_id) is
+        already stored - written by another session since the caller's duplicate
+        lookup - is skipped (ON CONFLICT DO NOTHING) and returned as None.
+        """
+        if not messages:
+            return []
+
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "timestamp": now,
+                "model_used": None,
+                "audio_url": None,
+                "elevenlabs_message_id": None,
+                **message,
+                "research_id_fk": research_id_fk,
+                "conversation_id": conversation_id,
+                "provider": provider,
+                "elevenlabs_conversation_id": elevenlabs_conversation_id
+            }
+            for message in messages
+        ]
+        # Naive timestamps are local time; compare everything in UTC
+        instants = sorted(row["timestamp"].astimezone(timezone.utc) for row in rows)
+
+        thread_id = ConversationService._upsert_thread(
+            db, research_id_fk, conversation_id, provider, elevenlabs_conversation_id,
+            len(rows), instants[0], instants[-1]
+        )
+        for row in rows:
+            row["thread_id"] = thread_id
+
+        # ORM bulk INSERT .. RETURNING: all rows in one statement. RETURNING
+        # order is not guaranteed without a per-row sentinel, so match rows
+        # back to the input by content (identical messages are interchangeable)
+        dialect_insert = sqlite.insert if db.get_bind().dialect.name == "sqlite" else postgresql.insert
+        statement = dialect_insert(Conversation).on_conflict_do_nothing(
+            index_elements=[Conversation.elevenlabs_conversation_id, Conversation.elevenlabs_message_id],
+            index_where=Conversation.elevenlabs_message_id.isnot(None)
+        ).returning(Conversation).execution_options(render_nulls=True)
+        inserted: Dict[tuple, deque] = defaultdict(deque)
+        for message in sorted(db.scalars(statement, rows).all(), key=lambda message: message.id):
+            inserted[(message.role, message.content, message.elevenlabs_message_id)].append(message)
+        saved: List[Optional[Conversation]] = []
+        for row in rows:
+            matches = inserted[(row["role"], row["content"], row["elevenlabs_message_id"])]
+            saved.append(matches.popleft() if matches else None)
+
+        skipped = saved.count(None)
+        if skipped:
+            db.query(ConversationThread).filter(ConversationThread.id == thread_id).update(
+                {ConversationThread.message_count: ConversationThread.message_count - skipped},
+                synchronize_session=False
+            )
+        return saved
+
+    @staticmethod
+    def save_exchange(
+        db: Session,
+        research_id_fk: int,
+        conversation_id: str,
+        user_content: str,
+        assistant_content: str,
+        model_used: str,
+        user_timestamp: datetime
+    ) -> Tuple[Conversation, Conversation]:
+        """Persist a user turn and the assistant reply in one transaction"""
+        user_message, assistant_message = ConversationService.append_messages(
+            db,
+            research_id_fk=research_id_fk,
+            conversation_id=conversation_id,
+            messages=[
+                {"role": "user", "content": user_content, "timestamp": user_timestamp},
+                {"role": "assistant", "content": assistant_content,
+                 "timestamp": datetime.now(timezone.utc), "model_used": model_used}
+            ],
+            provider="groq"
+        )
+        db.commit()
+        return user_message, assistant_message
+
 
 # Singleton instance
 conversation_service = ConversationService()
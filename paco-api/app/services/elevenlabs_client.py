@@ -0,0 +1,92 @@
+"""
+ElevenLabs API client
+
+All ElevenLabs HTTP calls go through here so they share timing
+instrumentation and the record/replay cassettes (app.core.cassettes).
+"""
+import base64
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+import httpx
+
+from app.core.cassettes import get_cassette_store
+from app.core.config import get_settings
+from app.core.instrumentation import track_timing
+
+BASE_URL = "https://api.elevenlabs.io"
+
+
+class ElevenLabsClient:
+    """Thin async wrapper over the ElevenLabs REST API"""
+
+    @staticmethod
+    async def _get(path: str) -> Dict[str, Any]:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(
+                f"{BASE_URL}{path}",
+                headers={"xi-api-key": get_settings().ELEVENLABS_API_KEY}
+            )
+        return {"status_code": response.status_code, "text": response.text}
+
+    @staticmethod
+    async def _post_audio(path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            response = await client.post(
+                f"{BASE_URL}{path}",
+                json=payload,
+                headers={"xi-api-key": get_settings().ELEVENLABS_API_KEY, "Accept": "audio/mpeg"}
+            )
+        if response.status_code != 200:
+            return {"status_code": response.status_code, "text": response.text}
+        return {"status_code": 200, "audio": base64.b64encode(response.content).decode()}
+
+    async def get(self, path: str) -> Dict[str, Any]:
+        """
+        GET `path`; returns {"status_code", "text"}. Non-200 responses are
+        returned (and recorded) as-is; network failures raise httpx.HTTPError.
+        """
+        with track_timing("elevenlabs"):
+            return await get_cassette_store().call(
+                "elevenlabs", {"method": "GET", "path": path}, lambda: self._get(path)
+            )
+
+    async def get_conversation(self, conversation_id: str) -> Dict[str, Any]:
+        """Conversational AI conversation, including its transcript"""
+        return await self.get(f"/v1/convai/conversations/{conversation_id}")
+
+    async def list_conversations(
+        self,
+        agent_id: str,
+        call_start_after_unix: Optional[int] = None,
+        cursor: Optional[str] = None,
+        page_size: int = 100
+    ) -> Dict[str, Any]:
+        """One page of an agent's conversations, newest first (`next_cursor` / `has_more`)"""
+        params = {"agent_id": agent_id, "page_size": page_size}
+        if call_start_after_unix is not None:
+            params["call_start_after_unix"] = call_start_after_unix
+        if cursor:
+            params["cursor"] = cursor
+        return await self.get(f"/v1/convai/conversations?{urlencode(params)}")
+
+    async def text_to_speech(self, text: str, voice_id: str, model_id: str) -> bytes:
+        """MP3 audio for `text`; raises httpx.HTTPError on failure"""
+        path = f"/v1/text-to-speech/{voice_id}"
+        payload = {"text": text, "model_id": model_id}
+        with track_timing("elevenlabs"):
+            response = await get_cassette_store().call(
+                "elevenlabs-tts", {"method": "POST", "path": path, "json": payload},
+                lambda: self._post_audio(path, payload)
+            )
+        if response["status_code"] != 200:
+            raise httpx.HTTPStatusError(
+                f"ElevenLabs text-to-speech failed ({response['status_code']}): {response['text']}",
+                request=httpx.Request("POST", f"{BASE_URL}{path}"),
+                response=httpx.Response(response["status_code"])
+            )
+        return base64.b64decode(response["audio"])
+
+
+# Singleton instance
+elevenlabs_client = ElevenLabsClient()
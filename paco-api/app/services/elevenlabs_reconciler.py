@@ -0,0 +1,300 @@
+"""
+Background reconciliation of ElevenLabs conversations
+
+Conversations whose transcript never reached us (tab closed before the sync
+call, webhook not configured or lost) are picked up here. Each run:
+
+1. Lists the agent's conversations that started after the persisted
+   high-water mark (minus RECONCILE_LOOKBACK_SECONDS, for calls that were
+   still in progress last time), following ElevenLabs' pagination cursor.
+2. Diffs them against stored threads: unknown conversations are missing,
+   ones whose listed message_count exceeds the transcript entries already
+   processed (the thread's fingerprint) are updated, everything else is
+   skipped without a request.
+3. Fetches the missing/updated transcripts concurrently, at most
+   RECONCILE_CONCURRENCY at a time, and writes them in batches through
+   turn_ingest.persist_transcripts (same attribution and duplicate rules as
+   the webhook and the sync endpoint, including turns saved live without a
+   message ID). A conversation or batch that fails to write is counted and
+   the run goes on.
+4. Advances the high-water mark (paco_sync_state) to the newest start time
+   seen - but no further than the oldest conversation that is still in
+   progress or failed to fetch or write, so those are retried next run.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+from app.db.base import SessionLocal
+from app.models.database import ConversationThread, SyncState
+from app.services.elevenlabs_client import elevenlabs_client
+from app.services.turn_ingest import persist_transcripts
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "elevenlabs_reconcile"
+FINAL_STATUSES = {"done", "failed"}  # Others: initiated, in-progress, processing
+WRITE_BATCH_SIZE = 50  # Conversations per commit
+
+RECONCILE_RUNS = registry.counter(
+    "paco_reconcile_runs_total",
+    "ElevenLabs reconciliation runs by result",
+    ["result"]
+)
+RECONCILE_CONVERSATIONS = registry.counter(
+    "paco_reconcile_conversations_total",
+    "Listed ElevenLabs conversations by outcome",
+    ["result"]
+)
+RECONCILE_TURNS = registry.counter(
+    "paco_reconcile_turns_total",
+    "Transcript turns written by the reconciler, by result",
+    ["result"]
+)
+RECONCILE_HIGH_WATER_MARK = registry.gauge(
+    "paco_reconcile_high_water_mark",
+    "Start time (unix seconds) up to which ElevenLabs conversations are reconciled"
+)
+RECONCILE_DURATION = registry.histogram(
+    "paco_reconcile_run_seconds",
+    "Duration of a reconciliation run",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+
+
+class ReconcileError(Exception):
+    """ElevenLabs could not be listed; the run is abandoned and the mark kept"""
+
+
+def load_high_water_mark() -> int:
+    db = SessionLocal()
+    try:
+        state = db.get(SyncState, JOB_NAME)
+        return state.high_water_mark if state else 0
+    finally:
+        db.close()
+
+
+def save_high_water_mark(value: int) -> None:
+    db = SessionLocal()
+    try:
+        db.merge(SyncState(name=JOB_NAME, high_water_mark=value))
+        db.commit()
+    finally:
+        db.close()
+
+
+def stored_message_counts(elevenlabs_conversation_ids: List[str]) -> Dict[str, int]:
+    """
+    Transcript entries already processed per ElevenLabs conversation ID
+    (absent = never stored). Threads without a transcript fingerprint fall back
+    to their stored message count.
+    """
+    if not elevenlabs_conversation_ids:
+        return {}
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            ConversationThread.elevenlabs_conversation_id,
+            ConversationThread.transcript_entries,
+            ConversationThread.message_count
+        ).filter(
+            ConversationThread.elevenlabs_conversation_id.in_(elevenlabs_conversation_ids)
+        ).all()
+        return {
+            conversation_id: entries if entries is not None else message_count
+            for conversation_id, entries, message_count in rows
+        }
+    finally:
+        db.close()
+
+
+def write_transcripts(conversations: List[Dict[str, Any]]) -> Tuple[Dict[str, int], List[str]]:
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        return persist_transcripts(db, conversations)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class ConversationReconciler:
+    """Incremental diff of an agent's ElevenLabs conversations against the database"""
+
+    def __init__(self, agent_id: str, concurrency: int, lookback_seconds: int):
+        self.agent_id = agent_id
+        self.concurrency = concurrency
+        self.lookback_seconds = lookback_seconds
+
+    async def _list_since(self, since: Optional[int]) -> List[Dict[str, Any]]:
+        conversations: List[Dict[str, Any]] = []
+        cursor = None
+        while True:
+            response = await elevenlabs_client.list_conversations(
+                self.agent_id, call_start_after_unix=since, cursor=cursor
+            )
+            if response["status_code"] != 200:
+                raise ReconcileError(
+                    f"Listing conversations failed ({response['status_code']}): {response['text'][:200]}"
+                )
+            page = json.loads(response["text"])
+            conversations.extend(page.get("conversations") or [])
+            cursor = page.get("next_cursor")
+            if not page.get("has_more") or not cursor:
+                return conversations
+
+    async def _fetch(self, semaphore: asyncio.Semaphore, conversation_id: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            try:
+                response = await elevenlabs_client.get_conversation(conversation_id)
+            except Exception:
+                logger.warning(
+                    "Fetching ElevenLabs conversation failed",
+                    exc_info=True, extra={"elevenlabs_conversation_id": conversation_id}
+                )
+                return None
+        if response["status_code"] != 200:
+            logger.warning(
+                "Fetching ElevenLabs conversation failed",
+                extra={"elevenlabs_conversation_id": conversation_id, "status_code": response["status_code"]}
+            )
+            return None
+        data = json.loads(response["text"])
+        data.setdefault("conversation_id", conversation_id)
+        return data
+
+    async def run_once(self, since: Optional[int] = None) -> Dict[str, int]:
+        """
+        One reconciliation pass; returns counts per outcome. `since` (unix
+        seconds) overrides the persisted high-water mark, e.g. for a backfill.
+        """
+        start = time.perf_counter()
+        try:
+            summary = await self._run(since)
+        except Exception:
+            RECONCILE_RUNS.inc(result="error")
+            raise
+        RECONCILE_RUNS.inc(result="ok")
+        RECONCILE_DURATION.observe(time.perf_counter() - start)
+        return summary
+
+    async def _run(self, since: Optional[int]) -> Dict[str, int]:
+        high_water_mark = await asyncio.to_thread(load_high_water_mark)
+        if since is None and high_water_mark:
+            since = max(high_water_mark - self.lookback_seconds, 0)
+        listed = await self._list_since(since)
+
+        stored = await asyncio.to_thread(
+            stored_message_counts, [item["conversation_id"] for item in listed]
+        )
+        summary = {
+            "listed": len(listed), "missing": 0, "updated": 0, "unchanged": 0,
+            "in_progress": 0, "fetch_failed": 0, "write_failed": 0,
+            "saved": 0, "duplicate": 0, "unmatched": 0, "unchanged_transcripts": 0
+        }
+        retry_from: List[int] = []  # Start times the mark must not pass
+        to_fetch: List[Dict[str, Any]] = []
+        for item in listed:
+            if item.get("status") not in FINAL_STATUSES:
+                summary["in_progress"] += 1
+                retry_from.append(item.get("start_time_unix_secs") or 0)
+                continue
+            have = stored.get(item["conversation_id"])
+            if have is None:
+                summary["missing"] += 1
+            elif (item.get("message_count") or 0) > have:
+                summary["updated"] += 1
+            else:
+                summary["unchanged"] += 1
+                continue
+            to_fetch.append(item)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        fetched = await asyncio.gather(*(
+            self._fetch(semaphore, item["conversation_id"]) for item in to_fetch
+        ))
+        transcripts = []
+        start_times = {}
+        for item, data in zip(to_fetch, fetched):
+            if data is None:
+                summary["fetch_failed"] += 1
+                retry_from.append(item.get("start_time_unix_secs") or 0)
+            else:
+                transcripts.append(data)
+                start_times[item["conversation_id"]] = item.get("start_time_unix_secs") or 0
+
+        for i in range(0, len(transcripts), WRITE_BATCH_SIZE):
+            batch = transcripts[i:i + WRITE_BATCH_SIZE]
+            try:
+                counts, failed = await asyncio.to_thread(write_transcripts, batch)
+            except Exception:
+                logger.exception("Failed to write reconciled transcripts", extra={"conversations": len(batch)})
+                counts, failed = {}, [data["conversation_id"] for data in batch]
+            for result, count in counts.items():
+                if result != "failed_transcripts":
+                    summary[result] += count
+            summary["write_failed"] += len(failed)
+            retry_from.extend(start_times[conversation_id] for conversation_id in failed)
+
+        newest = max((item.get("start_time_unix_secs") or 0 for item in listed), default=high_water_mark)
+        new_mark = max(high_water_mark, min(retry_from) - 1 if retry_from else newest)
+        if new_mark != high_water_mark:
+            await asyncio.to_thread(save_high_water_mark, new_mark)
+        RECONCILE_HIGH_WATER_MARK.set(new_mark)
+
+        for result in ("missing", "updated", "unchanged", "in_progress", "fetch_failed", "write_failed"):
+            if summary[result]:
+                RECONCILE_CONVERSATIONS.inc(summary[result], result=result)
+        for result in ("saved", "duplicate", "unmatched"):
+            if summary[result]:
+                RECONCILE_TURNS.inc(summary[result], result=result)
+        logger.info("ElevenLabs reconciliation finished", extra={**summary, "high_water_mark": new_mark})
+        return summary
+
+    async def run_periodically(self, interval_seconds: int) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("ElevenLabs reconciliation failed")
+            await asyncio.sleep(interval_seconds)
+
+
+_reconciler_task: Optional[asyncio.Task] = None
+
+
+def get_reconciler() -> ConversationReconciler:
+    """Reconciler configured from settings"""
+    settings = get_settings()
+    return ConversationReconciler(
+        settings.ELEVENLABS_AGENT_ID,
+        settings.RECONCILE_CONCURRENCY,
+        settings.RECONCILE_LOOKBACK_SECONDS
+    )
+
+
+def start_reconciler() -> None:
+    """Run reconciliation every RECONCILE_INTERVAL_SECONDS in this process (if enabled)"""
+    global _reconciler_task
+    settings = get_settings()
+    if settings.RECONCILE_INTERVAL_SECONDS <= 0 or _reconciler_task is not None:
+        return
+    if not settings.ELEVENLABS_AGENT_ID:
+        logger.warning("RECONCILE_INTERVAL_SECONDS is set but ELEVENLABS_AGENT_ID is empty; not reconciling")
+        return
+    _reconciler_task = asyncio.create_task(
+        get_reconciler().run_periodically(settings.RECONCILE_INTERVAL_SECONDS)
+    )
+
+
+def stop_reconciler() -> None:
+    global _reconciler_task
+    if _reconciler_task is not None:
+        _reconciler_task.cancel()
+        _reconciler_task = None
@@ -0,0 +1,179 @@
+"""
+ElevenLabs post-call transcript webhook
+
+ElevenLabs POSTs each finished conversation (`post_call_transcription`) to
+/webhooks/elevenlabs, signed with the shared ELEVENLABS_WEBHOOK_SECRET:
+
+    ElevenLabs-Signature: t=<unix time>,v0=<hex HMAC-SHA256 of "<t>.<raw body>">
+
+Verified payloads are queued in memory and answered right away; a background
+task drains the queue and writes up to ELEVENLABS_WEBHOOK_BATCH_SIZE payloads
+per database session and commit, through the same transcript parsing and
+duplicate rules as /chat/sync-elevenlabs-conversation (turn_ingest), so a
+conversation that was also synced by the browser is not stored twice - even
+when the sync endpoint or the reconciler writes it at the same moment
+(turn_ingest.lock_transcript and the unique message-ID index). A
+payload that fails to write is rolled back on its own and counted as failed;
+the rest of its batch is still committed.
+
+The research ID comes from the `research_id` dynamic variable the widget
+starts the conversation with, or else from turns of the same ElevenLabs
+conversation already saved live (turn_ingest.persist_transcripts). Payloads
+matching neither are logged and counted as unmatched.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+from app.db.base import SessionLocal
+from app.services.turn_ingest import persist_transcripts
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "ElevenLabs-Signature"
+TRANSCRIPT_EVENT = "post_call_transcription"
+
+WEBHOOK_REQUESTS = registry.counter(
+    "paco_elevenlabs_webhooks_total",
+    "ElevenLabs webhook deliveries by result",
+    ["result"]
+)
+WEBHOOK_QUEUE_DEPTH = registry.gauge(
+    "paco_elevenlabs_webhook_queue_depth",
+    "Verified webhook payloads waiting to be written"
+)
+WEBHOOK_TURNS = registry.counter(
+    "paco_elevenlabs_webhook_turns_total",
+    "Transcript turns received by webhook, by result",
+    ["result"]
+)
+
+
+def verify_signature(
+    body: bytes,
+    header: Optional[str],
+    secret: str,
+    tolerance_seconds: int,
+    now: Optional[float] = None
+) -> bool:
+    """Check an ElevenLabs-Signature header against the raw request body"""
+    if not header or not secret:
+        return False
+    parts = dict(item.split("=", 1) for item in header.split(",") if "=" in item)
+    timestamp, signature = parts.get("t"), parts.get("v0")
+    if not timestamp or not signature:
+        return False
+    try:
+        age = (now if now is not None else time.time()) - int(timestamp)
+    except ValueError:
+        return False
+    if abs(age) > tolerance_seconds:
+        return False
+    expected = hmac.new(
+        secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256
+    ).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def sign_payload(body: bytes, secret: str, timestamp: Optional[int] = None) -> str:
+    """ElevenLabs-Signature header value for `body` (local webhook stand-ins)"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v0={digest}"
+
+
+class TranscriptWebhookQueue:
+    """In-memory queue of verified payloads, written in batches by one background task"""
+
+    def __init__(self, maxsize: int, batch_size: int):
+        self.batch_size = batch_size
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=maxsize)
+        self._worker: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Task] = None  # The batch being written, if any
+
+    def enqueue(self, data: Dict[str, Any]) -> bool:
+        """Queue a payload's `data`; False when full (the caller answers 503)"""
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            return False
+        WEBHOOK_QUEUE_DEPTH.set(self._queue.qsize())
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return True
+
+    def _take_batch(self, first: Dict[str, Any]) -> List[Dict[str, Any]]:
+        batch = [first]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        WEBHOOK_QUEUE_DEPTH.set(self._queue.qsize())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = self._take_batch(await self._queue.get())
+            # Shielded: stopping the worker must not abandon a batch mid-write
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+            self._writing = None
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            await asyncio.to_thread(self._persist, batch)
+        except Exception:
+            logger.exception(
+                "Failed to write ElevenLabs webhook transcripts",
+                extra={"conversations": [data.get("conversation_id") for data in batch]}
+            )
+            WEBHOOK_TURNS.inc(
+                sum(len(data.get("transcript") or []) for data in batch), result="failed"
+            )
+
+    def _persist(self, batch: List[Dict[str, Any]]) -> None:
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            counts, failed = persist_transcripts(db, batch)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        for result in ("saved", "duplicate", "unmatched"):
+            if counts[result]:
+                WEBHOOK_TURNS.inc(counts[result], result=result)
+        if failed:
+            WEBHOOK_TURNS.inc(sum(
+                len(data.get("transcript") or []) for data in batch if data.get("conversation_id") in failed
+            ), result="failed")
+
+    async def drain(self) -> None:
+        """Write everything still queued and stop the worker (shutdown)"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        if self._writing is not None:
+            await self._writing
+            self._writing = None
+        while not self._queue.empty():
+            await self._write(self._take_batch(self._queue.get_nowait()))
+
+
+_webhook_queue: Optional[TranscriptWebhookQueue] = None
+
+
+def get_webhook_queue() -> TranscriptWebhookQueue:
+    """Process-wide queue configured from settings"""
+    global _webhook_queue
+    if _webhook_queue is None:
+        settings = get_settings()
+        _webhook_queue = TranscriptWebhookQueue(
+            settings.ELEVENLABS_WEBHOOK_QUEUE_SIZE,
+            settings.ELEVENLABS_WEBHOOK_BATCH_SIZE
+        )
+    return _webhook_queue
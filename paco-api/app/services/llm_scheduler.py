@@ -0,0 +1,224 @@
+"""
+Priority-aware scheduler for outgoing LLM calls
+
+Every Groq call takes a slot from this scheduler first (LLMService does it),
+so one process never exceeds LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE
+or LLM_MAX_CONCURRENCY, however many endpoints are calling.
+
+Waiting calls are served strictly by priority class ("interactive" before
+"default" before "bulk"), and round-robin across callers within a class, so
+a long bulk run neither delays an analysis a clinician is waiting on nor
+monopolizes its own class. Token buckets are charged the estimated tokens up
+front and corrected with the real usage afterwards. A provider 429 pauses
+dispatch for its Retry-After.
+
+Limits are per process: with several workers, divide the provider's limits
+between them.
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+
+PRIORITIES = ("interactive", "default", "bulk")
+
+LLM_QUEUE_DEPTH = registry.gauge(
+    "paco_llm_queue_depth",
+    "LLM calls waiting for a scheduler slot",
+    ["priority"]
+)
+LLM_IN_FLIGHT = registry.gauge(
+    "paco_llm_in_flight",
+    "LLM calls currently holding a scheduler slot"
+)
+LLM_QUEUE_WAIT = registry.histogram(
+    "paco_llm_queue_wait_seconds",
+    "Time LLM calls waited for a scheduler slot",
+    ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+)
+
+
+class TokenBucket:
+    """Continuously refilling bucket; a rate of 0 means unlimited"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (oversized amounts wait for a full bucket)"""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return needed / self.rate if needed > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        if self.rate:
+            self.level -= amount  # May go negative: later calls repay the debt
+
+    def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) after the real cost is known"""
+        if self.rate:
+            self.level = min(self.capacity, self.level - amount)
+
+
+class _Waiter:
+    __slots__ = ("future", "caller", "tokens", "priority", "enqueued")
+
+    def __init__(self, future: asyncio.Future, caller: str, tokens: int, priority: str):
+        self.future = future
+        self.caller = caller
+        self.tokens = tokens
+        self.priority = priority
+        self.enqueued = time.monotonic()
+
+
+class Ticket:
+    """A granted slot; settle() with the real token count when the call ends"""
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.actual_tokens: Optional[int] = None
+
+    def settle(self, actual_tokens: int) -> None:
+        self.actual_tokens = actual_tokens
+
+
+class LLMScheduler:
+    """Token-bucket rate limits, priority classes and per-caller fair queuing"""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, max_concurrency: int = 0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self._queues: List["OrderedDict[str, Deque[_Waiter]]"] = [OrderedDict() for _ in PRIORITIES]
+        self._active = 0
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    # -- queue ---------------------------------------------------------------
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        self._queues[PRIORITIES.index(waiter.priority)].setdefault(waiter.caller, deque()).append(waiter)
+        LLM_QUEUE_DEPTH.inc(priority=waiter.priority)
+
+    def _head(self) -> Optional[_Waiter]:
+        """Next waiter: highest priority class, first caller in round-robin order"""
+        for callers in self._queues:
+            while callers:
+                caller, waiters = next(iter(callers.items()))
+                while waiters and waiters[0].future.done():  # Cancelled while waiting
+                    LLM_QUEUE_DEPTH.dec(priority=waiters.popleft().priority)
+                if waiters:
+                    return waiters[0]
+                del callers[caller]
+        return None
+
+    def _pop(self, waiter: _Waiter) -> None:
+        callers = self._queues[PRIORITIES.index(waiter.priority)]
+        waiters = callers.pop(waiter.caller)
+        waiters.popleft()
+        if waiters:
+            callers[waiter.caller] = waiters  # Re-inserted last: next caller goes first
+        LLM_QUEUE_DEPTH.dec(priority=waiter.priority)
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while True:
+            waiter = self._head()
+            if waiter is None:
+                return
+            if self.max_concurrency and self._active >= self.max_concurrency:
+                return  # release() dispatches again
+
+            now = time.monotonic()
+            delay = max(
+                self._paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(waiter.tokens, now)
+            )
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            self._pop(waiter)
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            self._active += 1
+            LLM_IN_FLIGHT.set(self._active)
+            LLM_QUEUE_WAIT.observe(now - waiter.enqueued, priority=waiter.priority)
+            waiter.future.set_result(None)
+
+    # -- public API ----------------------------------------------------------
+
+    async def acquire(self, caller: str, estimated_tokens: int, priority: str = "interactive") -> Ticket:
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), caller, estimated_tokens, priority)
+        self._enqueue(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(Ticket(estimated_tokens))  # Granted just as we were cancelled
+            else:
+                self._dispatch()  # Let the next waiter through if we were at the head
+            raise
+        return Ticket(estimated_tokens)
+
+    def release(self, ticket: Ticket) -> None:
+        if ticket.actual_tokens is not None:
+            self.tokens.adjust(ticket.actual_tokens - ticket.tokens)
+        self._active -= 1
+        LLM_IN_FLIGHT.set(self._active)
+        self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        """Hold all dispatch for `seconds` (provider rate limit hit)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def slot(self, caller: str, estimated_tokens: int, priority: str = "interactive"):
+        ticket = await self.acquire(caller, estimated_tokens, priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def queue_depth(self) -> Dict[str, int]:
+        return {
+            priority: sum(len(waiters) for waiters in callers.values())
+            for priority, callers in zip(PRIORITIES, self._queues)
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Process-wide scheduler configured from settings"""
+    global _scheduler
+    if _scheduler is None:
+        settings = get_settings()
+        _scheduler = LLMScheduler(
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY
+        )
+    return _scheduler
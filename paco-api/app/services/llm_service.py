@@ -1,34 +1,83 @@
 """
 LLM Service for chat completions
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Optional
+import asyncio
 import os
+import time
 from groq import AsyncGroq
 
+from app.core.cassettes import get_cassette_store
 from app.core.config import get_settings
+from app.core.instrumentation import track_timing
+from app.services.llm_scheduler import get_llm_scheduler
+from app.services.llm_usage import LLM_TIME_TO_FIRST_TOKEN, BudgetReservation, llm_usage_service
+from app.services.medication_extraction import estimate_tokens
 
 settings = get_settings()
 
 
+def _retry_after(error: Exception, default: float = 5.0) -> float:
+    """Seconds to back off after a provider 429 (Retry-After header if present)"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", default))
+    except (TypeError, ValueError):
+        return default
+
+
 class LLMService:
     """Service for interacting with Groq LLM provider"""
 
     def __init__(self):
         """Initialize Groq client"""
         self.groq_client = None
+        self.cassettes = get_cassette_store()
 
-        # Initialize Groq if API key is available
+        # Initialize Groq if API key is available (replayed cassettes need none)
         if settings.GROQ_API_KEY:
             self.groq_client = AsyncGroq(api_key=settings.GROQ_API_KEY)
-        else:
+        elif not self.cassettes.replaying:
             raise ValueError("GROQ_API_KEY is required for LLM service")
 
+    async def _create_completion(self, **request) -> Dict[str, Any]:
+        """Call Groq and keep the parts of the response the app uses"""
+        if not self.groq_client:
+            raise ValueError("Groq API key not configured")
+        response = await self.groq_client.chat.completions.create(**request)
+        usage = getattr(response, "usage", None)
+        return {
+            "content": response.choices[0].message.content,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0
+        }
+
+    async def _stream_completion(self, **request) -> AsyncIterator[Dict[str, Any]]:
+        """Stream Groq chunks as {"delta": text} events, then {"usage": {...}} if reported"""
+        if not self.groq_client:
+            raise ValueError("Groq API key not configured")
+        stream = await self.groq_client.chat.completions.create(stream=True, **request)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield {"delta": chunk.choices[0].delta.content}
+            # Groq reports usage on the final chunk under x_groq
+            usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+            if usage:
+                yield {"usage": {
+                    "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                    "completion_tokens": getattr(usage, "completion_tokens", 0) or 0
+                }}
+
     async def get_chat_completion(
         self,
         messages: List[Dict[str, str]],
         model: str = "llama-3.3-70b-versatile",
         temperature: float = 0.7,
         max_tokens: int = 2000,
+        caller: str = "unknown",
+        research_id_fk: Optional[int] = None,
+        priority: str = "interactive",
+        reservation: Optional[BudgetReservation] = None,
         **kwargs
     ) -> str:
         """
@@ -39,24 +88,128 @@ class LLMService:
             model: Model name (e.g., 'llama-3.3-70b-versatile', 'mixtral-8x7b-32768')
             temperature: Sampling temperature
             max_tokens: Maximum tokens to generate
+            caller: Feature making the call, recorded for usage accounting
+            research_id_fk: Participant the call is made for, if any
+            priority: Scheduler class: "interactive", "default" or "bulk"
+            reservation: The call's budget reservation (check_budget), released
+                when its usage is recorded
             **kwargs: Additional parameters for the LLM
             
         Returns:
             Response content as string
         """
-        if not self.groq_client:
-            raise ValueError("Groq API key not configured")
+        request = dict(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+
+        # Wait for a scheduler slot, then call Groq (or its recorded cassette)
+        scheduler = get_llm_scheduler()
+        estimated = sum(estimate_tokens(m.get("content") or "") for m in messages) + max_tokens
+        async with scheduler.slot(caller, estimated, priority) as ticket:
+            start = time.perf_counter()
+            try:
+                with track_timing("llm"):
+                    result = await self.cassettes.call(
+                        "groq", request, lambda: self._create_completion(**request)
+                    )
+            except Exception as e:
+                ticket.settle(0)
+                if getattr(e, "status_code", None) == 429:
+                    scheduler.pause(_retry_after(e))
+                llm_usage_service.record(
+                    caller, model, 0, 0, time.perf_counter() - start,
+                    status="error", research_id_fk=research_id_fk, reservation=reservation
+                )
+                raise
+            ticket.settle(result["prompt_tokens"] + result["completion_tokens"])
+
+        llm_usage_service.record(
+            caller,
+            model,
+            result["prompt_tokens"],
+            result["completion_tokens"],
+            time.perf_counter() - start,
+            research_id_fk=research_id_fk,
+            reservation=reservation
+        )
+
+        return result["content"]
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "llama-3.3-70b-versatile",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        caller: str = "unknown",
+        research_id_fk: Optional[int] = None,
+        priority: str = "interactive",
+        reservation: Optional[BudgetReservation] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion from Groq, yielding text deltas as they arrive
 
-        # Make API call to Groq
-        response = await self.groq_client.chat.completions.create(
+        Same arguments as get_chat_completion. Holds one scheduler slot for the
+        whole stream, observes time-to-first-token and records usage when the
+        stream ends (estimated from the text if the provider reports none).
+        """
+        request = dict(
             model=model,
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
             **kwargs
         )
+        prompt_estimate = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        requested = time.perf_counter()
 
-        return response.choices[0].message.content
+        scheduler = get_llm_scheduler()
+        async with scheduler.slot(caller, prompt_estimate + max_tokens, priority) as ticket:
+            start = time.perf_counter()
+            usage = None
+            parts: List[str] = []
+            status = "error"
+            try:
+                async for event in self.cassettes.stream(
+                    "groq-stream", request, lambda: self._stream_completion(**request)
+                ):
+                    if "usage" in event:
+                        usage = event["usage"]
+                        continue
+                    if not parts:
+                        LLM_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - requested, model=model, caller=caller)
+                    parts.append(event["delta"])
+                    yield event["delta"]
+                status = "ok"
+            except (GeneratorExit, asyncio.CancelledError):
+                status = "cancelled"  # Client went away mid-stream
+                raise
+            except Exception as e:
+                if getattr(e, "status_code", None) == 429:
+                    scheduler.pause(_retry_after(e))
+                raise
+            finally:
+                if usage is None:
+                    usage = {
+                        "prompt_tokens": prompt_estimate if parts else 0,
+                        "completion_tokens": estimate_tokens("".join(parts))
+                    }
+                ticket.settle(usage["prompt_tokens"] + usage["completion_tokens"])
+                llm_usage_service.record(
+                    caller,
+                    model,
+                    usage["prompt_tokens"],
+                    usage["completion_tokens"],
+                    time.perf_counter() - start,
+                    status=status,
+                    research_id_fk=research_id_fk,
+                    reservation=reservation
+                )
 
 
 # Global instance
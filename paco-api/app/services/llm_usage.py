@@ -0,0 +1,356 @@
+"""
+LLM usage accounting and daily token budgets
+
+Every LLM call is recorded in paco_llm_usage (prompt/completion tokens,
+latency, model, caller, research ID) and counted in Prometheus metrics.
+Admin aggregates are grouped queries over that table; estimated cost is
+derived from LLM_PRICING at read time so price changes need no migration.
+
+Rows are not written on the calling coroutine: record() buffers them and a
+background task inserts everything buffered in one statement on a worker
+thread, so an LLM call never blocks the event loop or holds a second pool
+connection. Shutdown flushes what is still buffered.
+
+Budget checks add what the table does not show yet: tokens of rows still
+buffered and the estimates of calls that passed a check but have not been
+recorded (PendingUsage, per process and UTC day). A passing check reserves
+its estimate; record() replaces the reservation with the real token count.
+"""
+import asyncio
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, insert
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+from app.db.base import SessionLocal
+from app.models.database import LLMUsage, ResearchID
+
+logger = logging.getLogger(__name__)
+
+LLM_TOKENS = registry.counter(
+    "paco_llm_tokens_total",
+    "LLM tokens by model, caller and kind (prompt / completion)",
+    ["model", "caller", "kind"]
+)
+LLM_CALL_DURATION = registry.histogram(
+    "paco_llm_call_duration_seconds",
+    "LLM call latency",
+    ["model", "caller", "status"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+)
+LLM_TIME_TO_FIRST_TOKEN = registry.histogram(
+    "paco_llm_time_to_first_token_seconds",
+    "Streaming LLM calls: time from request (including scheduler wait) to first token",
+    ["model", "caller"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 30)
+)
+
+GROUP_BY = ("day", "research_id", "model", "caller")
+
+
+class LLMBudgetExceeded(Exception):
+    """A daily token budget would be exceeded by this call"""
+
+    def __init__(self, scope: str, used: int, budget: int, retry_after: int):
+        self.scope = scope
+        self.used = used
+        self.budget = budget
+        self.retry_after = retry_after
+        super().__init__(
+            f"Daily LLM token budget exceeded for {scope} ({used}/{budget} tokens used); "
+            f"retry after {retry_after}s"
+        )
+
+
+def parse_pricing(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "model=input:output,..." (USD per 1M tokens) into a dict"""
+    prices = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        model, _, rates = item.partition("=")
+        try:
+            prompt_rate, completion_rate = (float(rate) for rate in rates.split(":", 1))
+        except ValueError:
+            continue
+        prices[model.strip()] = (prompt_rate, completion_rate)
+    return prices
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Estimated USD cost, or None if the model has no configured price"""
+    rates = parse_pricing(get_settings().LLM_PRICING).get(model)
+    if rates is None:
+        return None
+    return (prompt_tokens * rates[0] + completion_tokens * rates[1]) / 1_000_000
+
+
+def utc_day_start(now: datetime) -> datetime:
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class PendingUsage:
+    """Today's tokens not yet in paco_llm_usage: reserved by budget checks or buffered"""
+
+    def __init__(self):
+        self._lock = threading.Lock()  # The writer releases rows from its worker thread
+        self._day: Optional[date] = None
+        self._total = 0
+        self._by_research: Dict[Optional[int], int] = {}
+
+    def add(self, day: date, research_id_fk: Optional[int], tokens: int) -> None:
+        """Count `tokens` (negative to release) for `day`; earlier days are dropped"""
+        with self._lock:
+            if self._day is None or day > self._day:
+                self._day, self._total, self._by_research = day, 0, {}
+            elif day < self._day:
+                return
+            self._total += tokens
+            remaining = self._by_research.get(research_id_fk, 0) + tokens
+            if remaining:
+                self._by_research[research_id_fk] = remaining
+            else:
+                self._by_research.pop(research_id_fk, None)
+
+    def used(self, day: date, research_id_fk: Optional[int]) -> Tuple[int, int]:
+        """(all callers, this research ID) pending for `day`"""
+        with self._lock:
+            if self._day != day:
+                return 0, 0
+            return self._total, self._by_research.get(research_id_fk, 0)
+
+
+_pending_usage = PendingUsage()
+
+
+class BudgetReservation:
+    """Tokens a passing budget check holds until its call is recorded"""
+
+    def __init__(self, day: date, research_id_fk: Optional[int], tokens: int):
+        self.day = day
+        self.research_id_fk = research_id_fk
+        self.tokens = tokens
+        _pending_usage.add(day, research_id_fk, tokens)
+
+    def settle(self) -> None:
+        """Release the reservation (idempotent)"""
+        if self.tokens:
+            _pending_usage.add(self.day, self.research_id_fk, -self.tokens)
+            self.tokens = 0
+
+
+def _row_tokens(row: Dict[str, Any]) -> int:
+    return row["prompt_tokens"] + row["completion_tokens"]
+
+
+class UsageWriter:
+    """Buffer paco_llm_usage rows and insert them in the background"""
+
+    def __init__(self):
+        self._rows: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, row: Dict[str, Any]) -> None:
+        _pending_usage.add(row["created_at"].date(), row["research_id_fk"], _row_tokens(row))
+        self._rows.append(row)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._take())  # No event loop (scripts): write now
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _take(self) -> List[Dict[str, Any]]:
+        rows, self._rows = self._rows, []
+        return rows
+
+    async def _run(self) -> None:
+        while self._rows:
+            await asyncio.to_thread(self._write, self._take())
+
+    @staticmethod
+    def _write(rows: List[Dict[str, Any]]) -> None:
+        """One multi-row INSERT and commit; failures are logged, never raised"""
+        if not rows:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(insert(LLMUsage), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to record LLM usage", extra={"rows": len(rows)})
+        finally:
+            db.close()
+            # Committed rows are counted by the budget query from now on
+            for row in rows:
+                _pending_usage.add(row["created_at"].date(), row["research_id_fk"], -_row_tokens(row))
+
+    async def flush(self) -> None:
+        """Wait for the background insert and write anything still buffered"""
+        if self._task is not None and not self._task.done():
+            await self._task
+        self._task = None
+        await asyncio.to_thread(self._write, self._take())
+
+
+_usage_writer = UsageWriter()
+
+
+class LLMUsageService:
+    """Record LLM calls, enforce daily budgets and aggregate usage"""
+
+    @staticmethod
+    def record(
+        caller: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_seconds: float,
+        status: str = "ok",
+        research_id_fk: Optional[int] = None,
+        reservation: Optional[BudgetReservation] = None
+    ) -> None:
+        """
+        Count one call in the metrics and queue its row for the background
+        writer (the caller's session state is untouched). Never raises.
+        The call's budget `reservation`, if any, is released in favour of
+        the real token count.
+        """
+        LLM_TOKENS.inc(prompt_tokens, model=model, caller=caller, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, caller=caller, kind="completion")
+        LLM_CALL_DURATION.observe(latency_seconds, model=model, caller=caller, status=status)
+
+        _usage_writer.add({
+            "created_at": datetime.utcnow(),
+            "research_id_fk": research_id_fk,
+            "caller": caller,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": int(latency_seconds * 1000),
+            "status": status
+        })
+        if reservation is not None:
+            reservation.settle()
+
+    @staticmethod
+    async def flush() -> None:
+        """Write usage rows that are still buffered (shutdown, tests)"""
+        await _usage_writer.flush()
+
+    @staticmethod
+    def check_budget(
+        db: Session,
+        estimated_tokens: int,
+        research_id_fk: Optional[int] = None
+    ) -> BudgetReservation:
+        """
+        Raise LLMBudgetExceeded if `estimated_tokens` more would exceed today's
+        global or per-research-ID budget, counting recorded, buffered and
+        reserved tokens. Otherwise reserve the estimate until the call is
+        recorded (pass the reservation to the LLM call, and settle() it if the
+        call never happens). One query; no-op when both budgets are 0.
+        """
+        settings = get_settings()
+        global_budget = settings.LLM_DAILY_TOKEN_BUDGET
+        research_budget = settings.LLM_RESEARCH_ID_DAILY_TOKEN_BUDGET if research_id_fk else 0
+        now = datetime.utcnow()
+        if not global_budget and not research_budget:
+            return BudgetReservation(now.date(), research_id_fk, 0)
+
+        # Pending first: a row the writer commits in between is then counted
+        # twice (conservative) rather than not at all
+        pending_total, pending_research = _pending_usage.used(now.date(), research_id_fk)
+        day_start = utc_day_start(now)
+        tokens = LLMUsage.prompt_tokens + LLMUsage.completion_tokens
+        used_total, used_research = db.query(
+            func.coalesce(func.sum(tokens), 0),
+            func.coalesce(func.sum(case((LLMUsage.research_id_fk == research_id_fk, tokens), else_=0)), 0)
+        ).filter(LLMUsage.created_at >= day_start).one()
+        used_total, used_research = int(used_total) + pending_total, int(used_research) + pending_research
+
+        retry_after = int((day_start + timedelta(days=1) - now).total_seconds()) + 1
+        if global_budget and used_total + estimated_tokens > global_budget:
+            raise LLMBudgetExceeded("all callers", used_total, global_budget, retry_after)
+        if research_budget and used_research + estimated_tokens > research_budget:
+            raise LLMBudgetExceeded("this research ID", used_research, research_budget, retry_after)
+        return BudgetReservation(now.date(), research_id_fk, estimated_tokens)
+
+    @staticmethod
+    def aggregate(
+        db: Session,
+        group_by: str = "day",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Usage totals grouped by day, research ID, model or caller (one query)"""
+        if group_by == "day":
+            key = func.date(LLMUsage.created_at)
+        elif group_by == "research_id":
+            key = ResearchID.research_id
+        elif group_by == "model":
+            key = LLMUsage.model
+        elif group_by == "caller":
+            key = LLMUsage.caller
+        else:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+
+        query = db.query(
+            key.label("key"),
+            LLMUsage.model,
+            func.count(LLMUsage.id),
+            func.sum(LLMUsage.prompt_tokens),
+            func.sum(LLMUsage.completion_tokens),
+            func.avg(LLMUsage.latency_ms),
+            func.sum(case((LLMUsage.status != "ok", 1), else_=0))
+        )
+        if group_by == "research_id":
+            query = query.outerjoin(ResearchID, ResearchID.id == LLMUsage.research_id_fk)
+        if start_date:
+            query = query.filter(LLMUsage.created_at >= start_date)
+        if end_date:
+            query = query.filter(LLMUsage.created_at <= end_date)
+
+        # Group by (key, model) so cost uses each model's price, then fold per key
+        totals: Dict[Any, Dict[str, Any]] = {}
+        for key_value, model, calls, prompt, completion, avg_latency, errors in query.group_by(
+            key, LLMUsage.model
+        ).all():
+            row = totals.setdefault(key_value, {
+                "key": str(key_value) if key_value is not None else None,
+                "calls": 0,
+                "errors": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latency_ms_total": 0.0,
+                "estimated_cost_usd": 0.0
+            })
+            prompt, completion = int(prompt or 0), int(completion or 0)
+            row["calls"] += calls
+            row["errors"] += int(errors or 0)
+            row["prompt_tokens"] += prompt
+            row["completion_tokens"] += completion
+            row["latency_ms_total"] += float(avg_latency or 0) * calls
+            cost = estimate_cost(model, prompt, completion)
+            if cost is not None:
+                row["estimated_cost_usd"] += cost
+
+        rows = []
+        for row in totals.values():
+            latency_total = row.pop("latency_ms_total")
+            row["total_tokens"] = row["prompt_tokens"] + row["completion_tokens"]
+            row["avg_latency_ms"] = round(latency_total / row["calls"], 1) if row["calls"] else 0.0
+            row["estimated_cost_usd"] = round(row["estimated_cost_usd"], 6)
+            rows.append(row)
+        return sorted(rows, key=lambda row: (row["key"] is None, row["key"] or ""))
+
+
+# Singleton instance
+llm_usage_service = LLMUsageService()
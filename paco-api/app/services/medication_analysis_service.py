@@ -1,18 +1,44 @@
 """
 Medication adherence analysis service using NLP
 """
+import asyncio
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, desc
 import json
+import logging
 
 from app.models.database import (
     Conversation, 
-    ResearchID, 
     MedicationAdherenceAnalysis
 )
+from app.core.config import get_settings
+from app.core.metrics import registry
+from app.services.analysis_cache import analysis_response_cache
 from app.services.llm_service import llm_service
+from app.services.llm_usage import llm_usage_service
+from app.services.medication_index import medication_index_service
+from app.services.medication_extraction import (
+    estimate_tokens,
+    select_relevant_turns,
+    tag_turns
+)
+from app.services.research_id_resolver import research_id_resolver
+from app.services.similarity_index import get_similarity_index
+from app.services.transcript_compaction import compact_transcript
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_MAX_TOKENS = 4000
+
+TRANSCRIPT_TOKENS = registry.counter(
+    "paco_analysis_transcript_tokens_total",
+    "Estimated transcript tokens per analysis stage "
+    "(full = raw, compacted = after compaction, sent = in the prompt) and prefilter outcome "
+    "(filtered = relevant turns only, fallback = nothing matched, off = disabled)",
+    ["stage", "prefilter"]
+)
 
 
 class MedicationAnalysisService:
@@ -76,26 +102,21 @@ Analyze the following conversation transcript and extract structured information
 Respond ONLY with valid JSON, no additional text."""
 
     @staticmethod
-    def get_conversation_transcript(
+    def get_conversation_messages(
         db: Session,
         research_id: str,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None
-    ) -> tuple[str, int, datetime, datetime]:
-        """
-        Retrieve conversation transcript for a research ID
-        Returns: (transcript, message_count, earliest_date, latest_date)
-        """
-        research_user = db.query(ResearchID).filter(
-            ResearchID.research_id == research_id
-        ).first()
+    ) -> List[Conversation]:
+        """Retrieve messages for a research ID ordered by timestamp"""
+        research_id_fk = research_id_resolver.resolve(db, research_id)
 
-        if not research_user:
+        if research_id_fk is None:
             raise ValueError(f"Research ID {research_id} not found")
 
         # Build query
         query = db.query(Conversation).filter(
-            Conversation.research_id_fk == research_user.id
+            Conversation.research_id_fk == research_id_fk
         )
 
         # Apply date filters
@@ -110,28 +131,139 @@ Respond ONLY with valid JSON, no additional text."""
         if not messages:
             raise ValueError(f"No conversations found for research ID {research_id}")
 
-        # Build transcript
+        return messages
+
+    @staticmethod
+    def format_transcript(
+        messages: List[Conversation],
+        indices: Optional[List[int]] = None,
+        contents: Optional[List[Optional[str]]] = None
+    ) -> str:
+        """
+        Render messages as a transcript. If `indices` is given only those
+        messages are included and each gap is marked as omitted. `contents`
+        overrides the message text (e.g. compacted assistant turns).
+        """
+        if indices is None:
+            indices = list(range(len(messages)))
+
         transcript_parts = []
-        for msg in messages:
+        previous = -1
+        for i in indices:
+            if i - previous > 1:
+                transcript_parts.append(f"[... {i - previous - 1} turns omitted ...]")
+            msg = messages[i]
             role_label = msg.role.upper()
             timestamp_str = msg.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            content = contents[i] if contents is not None else msg.content
             transcript_parts.append(
-                f"[{timestamp_str}] {role_label}: {msg.content}"
+                f"[{timestamp_str}] {role_label}: {content}"
             )
+            previous = i
+
+        if indices and len(messages) - previous > 1:
+            transcript_parts.append(f"[... {len(messages) - previous - 1} turns omitted ...]")
+
+        return "\n\n".join(transcript_parts)
 
-        transcript = "\n\n".join(transcript_parts)
+    @staticmethod
+    def get_conversation_transcript(
+        db: Session,
+        research_id: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> tuple[str, int, datetime, datetime]:
+        """
+        Retrieve conversation transcript for a research ID
+        Returns: (transcript, message_count, earliest_date, latest_date)
+        """
+        messages = MedicationAnalysisService.get_conversation_messages(
+            db, research_id, start_date, end_date
+        )
+
+        transcript = MedicationAnalysisService.format_transcript(messages)
         earliest = min(msg.timestamp for msg in messages)
         latest = max(msg.timestamp for msg in messages)
 
         return transcript, len(messages), earliest, latest
 
+    @staticmethod
+    def build_analysis_transcript(messages: List[Conversation]) -> str:
+        """
+        Transcript sent to the LLM for adherence analysis.
+
+        With compaction enabled, assistant turns are reduced to their questions
+        and near-duplicate assistant turns are dropped (patient turns are kept
+        verbatim). With pre-filtering enabled only turns mentioning medications,
+        side effects or adherence (plus a context window) are kept; falls back
+        to the compacted / full transcript when nothing matches.
+        """
+        settings = get_settings()
+        full_transcript = MedicationAnalysisService.format_transcript(messages)
+        contents = None
+        indices = None
+        compaction = None
+
+        if settings.ANALYSIS_COMPACTION_ENABLED:
+            compaction = compact_transcript(
+                [(msg.role, msg.content) for msg in messages],
+                settings.ANALYSIS_DEDUP_THRESHOLD
+            )
+            contents = compaction.contents
+            indices = [i for i, content in enumerate(contents) if content is not None]
+
+        compacted_transcript = (
+            MedicationAnalysisService.format_transcript(messages, indices, contents)
+            if compaction is not None else full_transcript
+        )
+
+        prefilter = "off"
+        if settings.ANALYSIS_PREFILTER_ENABLED:
+            # Tag the original text so a dropped duplicate still pulls in its neighbours
+            tags = tag_turns((msg.role, msg.content) for msg in messages)
+            relevant = select_relevant_turns(tags, settings.ANALYSIS_CONTEXT_TURNS)
+            if contents is not None:
+                relevant = [i for i in relevant if contents[i] is not None]
+            if relevant:
+                indices = relevant
+                prefilter = "filtered"
+            else:
+                prefilter = "fallback"
+
+        transcript = (
+            MedicationAnalysisService.format_transcript(messages, indices, contents)
+            if indices is not None else full_transcript
+        )
+        full_tokens = estimate_tokens(full_transcript)
+        compacted_tokens = estimate_tokens(compacted_transcript)
+        sent_tokens = estimate_tokens(transcript)
+        TRANSCRIPT_TOKENS.inc(full_tokens, stage="full", prefilter=prefilter)
+        TRANSCRIPT_TOKENS.inc(compacted_tokens, stage="compacted", prefilter=prefilter)
+        TRANSCRIPT_TOKENS.inc(sent_tokens, stage="sent", prefilter=prefilter)
+        logger.info(
+            "Built analysis transcript",
+            extra={
+                "prefilter": prefilter,
+                "turns_total": len(messages),
+                "turns_kept": len(indices) if indices is not None else len(messages),
+                "duplicates_dropped": compaction.duplicates_dropped if compaction else 0,
+                "assistant_truncated": compaction.assistant_truncated if compaction else 0,
+                "tokens_full": full_tokens,
+                "tokens_compacted": compacted_tokens,
+                "tokens_sent": sent_tokens,
+                "compaction_ratio": round(1 - compacted_tokens / full_tokens, 3) if full_tokens else 0.0
+            }
+        )
+        return transcript
+
     @staticmethod
     async def analyze_medication_adherence(
         db: Session,
         research_id: str,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
-        model: str = "llama-3.3-70b-versatile"
+        model: str = "llama-3.3-70b-versatile",
+        priority: str = "interactive"
     ) -> MedicationAdherenceAnalysis:
         """
         Analyze medication adherence from conversations using NLP (Groq AI)
@@ -142,24 +274,29 @@ Respond ONLY with valid JSON, no additional text."""
             start_date: Optional start date for analysis
             end_date: Optional end date for analysis
             model: Groq model to use for analysis (default: llama-3.3-70b-versatile)
+            priority: LLM scheduler class ("bulk" for cohort runs so interactive analyses go first)
             
         Returns:
             MedicationAdherenceAnalysis object with results
+
+        Raises:
+            ValueError: Research ID or conversations not found
+            LLMBudgetExceeded: Today's LLM token budget cannot cover the analysis
         """
-        # Get research user
-        research_user = db.query(ResearchID).filter(
-            ResearchID.research_id == research_id
-        ).first()
+        # Get research user (resolved once per request, shared with the transcript lookup)
+        research_id_fk = research_id_resolver.resolve(db, research_id)
 
-        if not research_user:
+        if research_id_fk is None:
             raise ValueError(f"Research ID {research_id} not found")
 
-        # Get conversation transcript
-        transcript, message_count, earliest, latest = (
-            MedicationAnalysisService.get_conversation_transcript(
-                db, research_id, start_date, end_date
-            )
+        # Get conversation messages and build the (pre-filtered) transcript
+        conversation_messages = MedicationAnalysisService.get_conversation_messages(
+            db, research_id, start_date, end_date
         )
+        message_count = len(conversation_messages)
+        earliest = min(msg.timestamp for msg in conversation_messages)
+        latest = max(msg.timestamp for msg in conversation_messages)
+        transcript = MedicationAnalysisService.build_analysis_transcript(conversation_messages)
 
         # Prepare prompt
         prompt = MedicationAnalysisService.ANALYSIS_PROMPT.format(
@@ -172,12 +309,26 @@ Respond ONLY with valid JSON, no additional text."""
             {"role": "user", "content": prompt}
         ]
 
-        response = await llm_service.get_chat_completion(
-            model=model,
-            messages=messages,
-            max_tokens=4000
+        # Reject before spending tokens if today's budget cannot cover this call
+        reservation = llm_usage_service.check_budget(
+            db,
+            estimated_tokens=sum(estimate_tokens(m["content"]) for m in messages) + ANALYSIS_MAX_TOKENS,
+            research_id_fk=research_id_fk
         )
 
+        try:
+            response = await llm_service.get_chat_completion(
+                model=model,
+                messages=messages,
+                max_tokens=ANALYSIS_MAX_TOKENS,
+                caller="medication_analysis",
+                research_id_fk=research_id_fk,
+                priority=priority,
+                reservation=reservation
+            )
+        finally:
+            reservation.settle()  # Already released if the call was recorded
+
         # Parse JSON response
         try:
             # Try to extract JSON if LLM added extra text
@@ -201,7 +352,7 @@ Respond ONLY with valid JSON, no additional text."""
 
         # Create analysis record
         analysis = MedicationAdherenceAnalysis(
-            research_id_fk=research_user.id,
+            research_id_fk=research_id_fk,
             analyzed_from=earliest,
             analyzed_to=latest,
             conversation_count=message_count,
@@ -219,8 +370,15 @@ Respond ONLY with valid JSON, no additional text."""
         )
 
         db.add(analysis)
+        db.flush()
+        medication_index_service.index_analysis(db, analysis)
         db.commit()
         db.refresh(analysis)
+        analysis_response_cache.invalidate(research_id)
+
+        if get_settings().SIMILARITY_ENABLED:
+            # Embedding plus flush/flock is blocking file I/O; keep it off the loop
+            await asyncio.to_thread(get_similarity_index().add_analysis, analysis)
 
         return analysis
 
@@ -230,16 +388,28 @@ Respond ONLY with valid JSON, no additional text."""
         research_id: str
     ) -> Optional[MedicationAdherenceAnalysis]:
         """Get the most recent analysis for a research ID"""
-        research_user = db.query(ResearchID).filter(
-            ResearchID.research_id == research_id
-        ).first()
+        research_id_fk = research_id_resolver.resolve(db, research_id)
 
-        if not research_user:
+        if research_id_fk is None:
             return None
 
         return db.query(MedicationAdherenceAnalysis).filter(
-            MedicationAdherenceAnalysis.research_id_fk == research_user.id
+            MedicationAdherenceAnalysis.research_id_fk == research_id_fk
+        ).order_by(desc(MedicationAdherenceAnalysis.analysis_date)).first()
+
+    @staticmethod
+    def get_latest_version(
+        db: Session,
+        research_id_fk: int
+    ) -> Optional[Tuple[int, datetime]]:
+        """(id, analysis_date) of the most recent analysis, without loading it"""
+        row = db.query(
+            MedicationAdherenceAnalysis.id,
+            MedicationAdherenceAnalysis.analysis_date
+        ).filter(
+            MedicationAdherenceAnalysis.research_id_fk == research_id_fk
         ).order_by(desc(MedicationAdherenceAnalysis.analysis_date)).first()
+        return (row.id, row.analysis_date) if row else None
 
     @staticmethod
     def get_analysis_history(
@@ -248,15 +418,13 @@ Respond ONLY with valid JSON, no additional text."""
         limit: int = 10
     ) -> List[MedicationAdherenceAnalysis]:
         """Get analysis history for a research ID"""
-        research_user = db.query(ResearchID).filter(
-            ResearchID.research_id == research_id
-        ).first()
+        research_id_fk = research_id_resolver.resolve(db, research_id)
 
-        if not research_user:
+        if research_id_fk is None:
             return []
 
         return db.query(MedicationAdherenceAnalysis).filter(
-            MedicationAdherenceAnalysis.research_id_fk == research_user.id
+            MedicationAdherenceAnalysis.research_id_fk == research_id_fk
         ).order_by(desc(MedicationAdherenceAnalysis.analysis_date)).limit(limit).all()
 
 
@@ -0,0 +1,164 @@
+"""
+Local medication-mention extraction for transcript pre-filtering
+
+Conversation turns are tagged against a medication / side-effect / adherence
+lexicon compiled into a single case-insensitive regex automaton. Only tagged
+turns plus a small context window are sent to the LLM for adherence analysis,
+so the long motivational-interviewing exchanges that carry no medication
+information no longer cost prompt tokens.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Category -> terms. Plural "s"/"es" forms are matched automatically.
+LEXICON: Dict[str, Tuple[str, ...]] = {
+    "medication": (
+        # Antiplatelets / anticoagulants
+        "aspirin", "baby aspirin", "clopidogrel", "plavix", "cilostazol", "pletal",
+        "pentoxifylline", "trental", "ticagrelor", "brilinta", "prasugrel",
+        "rivaroxaban", "xarelto", "apixaban", "eliquis", "warfarin", "coumadin",
+        "blood thinner",
+        # Lipid lowering
+        "statin", "atorvastatin", "lipitor", "simvastatin", "zocor", "rosuvastatin",
+        "crestor", "pravastatin", "ezetimibe", "zetia", "cholesterol medicine",
+        "cholesterol pill",
+        # Blood pressure / heart
+        "lisinopril", "enalapril", "ramipril", "losartan", "valsartan", "amlodipine",
+        "norvasc", "metoprolol", "carvedilol", "atenolol", "hydrochlorothiazide",
+        "furosemide", "lasix", "water pill", "blood pressure medicine",
+        "blood pressure pill", "nitroglycerin",
+        # Diabetes
+        "metformin", "insulin", "glipizide", "januvia", "jardiance", "ozempic",
+        "sugar pill", "diabetes medicine",
+        # Smoking cessation / pain
+        "nicotine patch", "nicotine gum", "varenicline", "chantix", "bupropion",
+        "ibuprofen", "advil", "tylenol", "acetaminophen", "gabapentin",
+    ),
+    "side_effect": (
+        "side effect", "dizzy", "dizziness", "lightheaded", "nausea", "nauseous",
+        "vomiting", "bleeding", "bleed", "bruise", "bruising", "headache",
+        "stomach ache", "upset stomach", "heartburn", "diarrhea", "constipation",
+        "muscle pain", "muscle ache", "cramp", "cough", "rash", "itching", "swelling",
+        "swollen", "tired", "fatigue", "sleepy", "weak", "makes me feel sick",
+        "feel sick", "allergic",
+    ),
+    "adherence": (
+        "forget", "forgot", "forgetting", "miss a dose", "missed a dose",
+        "missing doses", "skip", "skipped", "skipping", "stopped taking",
+        "stop taking", "quit taking", "ran out", "run out", "running out", "refill",
+        "pharmacy", "pharmacist", "prescription", "copay", "co-pay", "afford",
+        "expensive", "cost", "insurance", "pill box", "pillbox", "pill organizer",
+        "alarm", "reminder", "remind", "routine", "every morning", "every night",
+        "twice a day", "once a day", "with breakfast", "with dinner", "dose",
+        "dosage", "milligram", "mg",
+    ),
+    # Generic words: only mark patient turns as relevant (PaCo says them constantly)
+    "generic": ("medicine", "medication", "meds", "pill", "tablet", "capsule", "drug"),
+}
+
+STRONG_CATEGORIES = frozenset({"medication", "side_effect", "adherence"})
+PATIENT_ROLES = frozenset({"user"})
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate for English prompts (about 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _trie_pattern(node: dict) -> str:
+    """Render a character trie as a regex with shared prefixes factored out"""
+    branches = [
+        (r"\s+" if char == " " else re.escape(char)) + _trie_pattern(child)
+        for char, child in sorted(node.items()) if char
+    ]
+    if not branches:
+        return ""
+    terminal = "" in node
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+    group = "(?:" + "|".join(branches) + ")"
+    return group + "?" if terminal else group
+
+
+def _compile(lexicon: Dict[str, Sequence[str]]) -> Tuple["re.Pattern[str]", Dict[str, str]]:
+    """
+    Compile the lexicon into one trie-shaped regex. Factoring shared prefixes
+    keeps the automaton from retrying every alternative at each position, which
+    a flat "a|b|c" alternation of ~200 terms would do.
+    """
+    term_category: Dict[str, str] = {}
+    trie: dict = {}
+    for category, terms in lexicon.items():
+        for term in terms:
+            term = term.lower()
+            term_category.setdefault(term, category)
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[""] = {}
+    pattern = re.compile(rf"\b{_trie_pattern(trie)}(?:e?s)?\b", re.IGNORECASE)
+    return pattern, term_category
+
+
+_PATTERN, _TERM_CATEGORY = _compile(LEXICON)
+_PLURAL = re.compile(r"e?s$")
+_SPACES = re.compile(r"\s+")
+
+
+def _canonical(match: str) -> Optional[str]:
+    """Map a matched surface form back to its lexicon term"""
+    term = _SPACES.sub(" ", match.lower())
+    if term in _TERM_CATEGORY:
+        return term
+    singular = _PLURAL.sub("", term)
+    if singular in _TERM_CATEGORY:
+        return singular
+    if term.endswith("s") and term[:-1] in _TERM_CATEGORY:
+        return term[:-1]
+    return None
+
+
+@dataclass
+class TurnTags:
+    """Lexicon hits for one conversation turn"""
+    index: int
+    role: str
+    terms: Dict[str, Set[str]] = field(default_factory=dict)
+
+    @property
+    def relevant(self) -> bool:
+        if any(category in self.terms for category in STRONG_CATEGORIES):
+            return True
+        return self.role in PATIENT_ROLES and "generic" in self.terms
+
+
+def extract_terms(text: str) -> Dict[str, Set[str]]:
+    """Return {category: {canonical terms}} found in `text`"""
+    found: Dict[str, Set[str]] = {}
+    for match in _PATTERN.finditer(text):
+        term = _canonical(match.group(0))
+        if term is not None:
+            found.setdefault(_TERM_CATEGORY[term], set()).add(term)
+    return found
+
+
+def tag_turns(turns: Iterable[Tuple[str, str]]) -> List[TurnTags]:
+    """Tag (role, content) turns with the lexicon terms they mention"""
+    return [
+        TurnTags(index=i, role=role, terms=extract_terms(content))
+        for i, (role, content) in enumerate(turns)
+    ]
+
+
+def select_relevant_turns(tags: Sequence[TurnTags], context_turns: int = 1) -> List[int]:
+    """
+    Indices of relevant turns plus `context_turns` neighbours on each side,
+    in conversation order. Returns [] if nothing is relevant.
+    """
+    keep: Set[int] = set()
+    last = len(tags) - 1
+    for tag in tags:
+        if tag.relevant:
+            keep.update(range(max(0, tag.index - context_turns), min(last, tag.index + context_turns) + 1))
+    return sorted(keep)
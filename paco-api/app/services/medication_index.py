@@ -0,0 +1,290 @@
+"""
+Cohort index of medications, side effects and adherence barriers
+
+Analyses store their findings as JSON text, so cross-participant questions
+("who reported dizziness on lisinopril?") used to mean parsing every analysis
+row. Each analysis is now also flattened into normalized rows in
+paco_medication_mentions (brand names mapped to generics, symptom variants to
+one term) when it is written, and cohort lookups are plain indexed queries.
+"""
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models.database import (
+    MedicationAdherenceAnalysis,
+    MedicationMention,
+    ResearchID
+)
+from app.services.medication_extraction import extract_terms
+
+KINDS = ("medication", "side_effect", "barrier", "strategy")
+
+# Surface form -> indexed term (brand -> generic, symptom variants -> one term)
+SYNONYMS: Dict[str, str] = {
+    "baby aspirin": "aspirin",
+    "plavix": "clopidogrel",
+    "pletal": "cilostazol",
+    "trental": "pentoxifylline",
+    "brilinta": "ticagrelor",
+    "xarelto": "rivaroxaban",
+    "eliquis": "apixaban",
+    "coumadin": "warfarin",
+    "lipitor": "atorvastatin",
+    "zocor": "simvastatin",
+    "crestor": "rosuvastatin",
+    "zetia": "ezetimibe",
+    "norvasc": "amlodipine",
+    "lasix": "furosemide",
+    "chantix": "varenicline",
+    "advil": "ibuprofen",
+    "tylenol": "acetaminophen",
+    "dizziness": "dizzy",
+    "lightheaded": "dizzy",
+    "nauseous": "nausea",
+    "feel sick": "nausea",
+    "makes me feel sick": "nausea",
+    "vomiting": "nausea",
+    "bleed": "bleeding",
+    "bruising": "bruise",
+    "muscle ache": "muscle pain",
+    "cramp": "muscle pain",
+    "tired": "fatigue",
+    "sleepy": "fatigue",
+    "weak": "fatigue",
+    "swollen": "swelling",
+    "upset stomach": "stomach ache",
+    "itching": "rash",
+}
+
+# Lexicon category searched for canonical terms, per mention kind
+_LEXICON_CATEGORY = {"medication": "medication", "side_effect": "side_effect"}
+
+_DOSAGE = re.compile(r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|units?|iu)\b", re.IGNORECASE)
+_NON_WORD = re.compile(r"[^a-z0-9 \-]+")
+_SPACES = re.compile(r"\s+")
+_UNCLEAR = frozenset({"", "unclear", "unknown", "not discussed", "none", "n/a"})
+
+
+def _clean(text: str) -> str:
+    text = _DOSAGE.sub(" ", text.lower())
+    text = _NON_WORD.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()[:255]
+
+
+def normalize_terms(kind: str, text: Optional[str]) -> List[str]:
+    """
+    Indexed terms for a free-text value. Lexicon hits (mapped through SYNONYMS)
+    win; otherwise the cleaned text itself is the term. [] for unclear values.
+    """
+    if not isinstance(text, str):
+        return []
+    cleaned = _clean(text)
+    if cleaned in _UNCLEAR:
+        return []
+
+    category = _LEXICON_CATEGORY.get(kind)
+    if category:
+        found = extract_terms(text).get(category)
+        if found:
+            return sorted({SYNONYMS.get(term, term) for term in found})
+    return [SYNONYMS.get(cleaned, cleaned)]
+
+
+def _load(value: Optional[str]) -> List[Any]:
+    if not value:
+        return []
+    try:
+        items = json.loads(value)
+    except (TypeError, ValueError):
+        return []
+    return items if isinstance(items, list) else []
+
+
+def _field(item: Any, key: str) -> Optional[str]:
+    if isinstance(item, dict):
+        value = item.get(key)
+        return value if isinstance(value, str) else None
+    return item if isinstance(item, str) else None
+
+
+def mentions_for(analysis: Any) -> List[Dict[str, Any]]:
+    """
+    Mention rows for one analysis. `analysis` is a MedicationAdherenceAnalysis
+    or any row with the same JSON text columns (used by the backfill).
+    """
+    rows = []
+
+    def add(kind: str, term: str, detail: Optional[str], medication: Optional[str] = None):
+        rows.append({
+            "analysis_id": analysis.id,
+            "research_id_fk": analysis.research_id_fk,
+            "kind": kind,
+            "term": term,
+            "medication": medication,
+            "detail": detail
+        })
+
+    for item in _load(analysis.medication_list):
+        name = _field(item, "name")
+        for term in normalize_terms("medication", name):
+            add("medication", term, name)
+
+    for item in _load(analysis.side_effects):
+        effect = _field(item, "effect")
+        medications = normalize_terms("medication", _field(item, "medication")) or [None]
+        for term in normalize_terms("side_effect", effect):
+            for medication in medications:
+                add("side_effect", term, effect, medication)
+
+    for kind, column in (("barrier", analysis.adherence_barriers), ("strategy", analysis.adherence_strategies)):
+        for item in _load(column):
+            description = _field(item, "description")
+            for term in normalize_terms(kind, _field(item, "type")):
+                add(kind, term, description)
+
+    # One row per (kind, term, medication) per analysis
+    unique = {}
+    for row in rows:
+        unique.setdefault((row["kind"], row["term"], row["medication"]), row)
+    return list(unique.values())
+
+
+class MedicationIndexService:
+    """Write and query the cohort mention index"""
+
+    @staticmethod
+    def index_analysis(db: Session, analysis: MedicationAdherenceAnalysis) -> int:
+        """
+        Insert mention rows for a flushed analysis (one executemany; the caller
+        commits). Returns the number of rows written.
+        """
+        rows = mentions_for(analysis)
+        if rows:
+            # render_nulls keeps rows with/without a medication in one batch
+            db.execute(insert(MedicationMention).execution_options(render_nulls=True), rows)
+        return len(rows)
+
+    @staticmethod
+    def query_cohort(
+        db: Session,
+        medication: Optional[str] = None,
+        side_effect: Optional[str] = None,
+        barrier: Optional[str] = None,
+        strategy: Optional[str] = None,
+        latest_only: bool = True,
+        limit: int = 100
+    ) -> List[Dict[str, Any]]:
+        """
+        Participants whose analyses match every given filter. A side effect
+        combined with a medication matches effects attributed to that
+        medication (or unattributed ones when the analysis lists it).
+
+        Returns [{research_id, analysis_id, analysis_date, mentions: [...]}],
+        newest analyses first.
+        """
+        def terms(kind: str, value: Optional[str]) -> List[str]:
+            return normalize_terms(kind, value) if value else []
+
+        medication_terms = terms("medication", medication)
+        side_effect_terms = terms("side_effect", side_effect)
+        barrier_terms = terms("barrier", barrier)
+        strategy_terms = terms("strategy", strategy)
+
+        def matching(kind: str, values: List[str], *extra) -> Any:
+            return select(MedicationMention.analysis_id).where(
+                MedicationMention.kind == kind,
+                MedicationMention.term.in_(values),
+                *extra
+            )
+
+        filters = []
+        mention_filters = []
+        if medication_terms:
+            filters.append(matching("medication", medication_terms))
+            mention_filters.append(
+                (MedicationMention.kind == "medication") & MedicationMention.term.in_(medication_terms)
+            )
+        if side_effect_terms:
+            attributed = []
+            if medication_terms:
+                attributed.append(
+                    MedicationMention.medication.in_(medication_terms) | MedicationMention.medication.is_(None)
+                )
+            filters.append(matching("side_effect", side_effect_terms, *attributed))
+            mention_filters.append(
+                (MedicationMention.kind == "side_effect") & MedicationMention.term.in_(side_effect_terms)
+            )
+        for kind, values in (("barrier", barrier_terms), ("strategy", strategy_terms)):
+            if values:
+                filters.append(matching(kind, values))
+                mention_filters.append((MedicationMention.kind == kind) & MedicationMention.term.in_(values))
+
+        if not filters:
+            return []
+
+        query = db.query(
+            MedicationAdherenceAnalysis.id,
+            MedicationAdherenceAnalysis.analysis_date,
+            ResearchID.research_id
+        ).join(ResearchID, ResearchID.id == MedicationAdherenceAnalysis.research_id_fk)
+        for subquery in filters:
+            query = query.filter(MedicationAdherenceAnalysis.id.in_(subquery))
+        newest_first = (MedicationAdherenceAnalysis.analysis_date.desc(), MedicationAdherenceAnalysis.id.desc())
+        if latest_only:
+            # Latest by analysis_date like the per-participant endpoints (ids
+            # need not follow dates for backfilled or re-imported analyses)
+            ranked = select(
+                MedicationAdherenceAnalysis.id,
+                func.row_number().over(
+                    partition_by=MedicationAdherenceAnalysis.research_id_fk, order_by=newest_first
+                ).label("rank")
+            ).subquery()
+            query = query.filter(MedicationAdherenceAnalysis.id.in_(select(ranked.c.id).where(ranked.c.rank == 1)))
+
+        analyses = query.order_by(*newest_first).limit(limit).all()
+        if not analyses:
+            return []
+
+        mentions: Dict[int, List[Dict[str, Any]]] = {analysis_id: [] for analysis_id, _, _ in analyses}
+        condition = mention_filters[0]
+        for extra in mention_filters[1:]:
+            condition = condition | extra
+        for mention in db.query(MedicationMention).filter(
+            MedicationMention.analysis_id.in_(list(mentions)),
+            condition
+        ).order_by(MedicationMention.id):
+            mentions[mention.analysis_id].append({
+                "kind": mention.kind,
+                "term": mention.term,
+                "medication": mention.medication,
+                "detail": mention.detail
+            })
+
+        return [
+            {
+                "research_id": research_id,
+                "analysis_id": analysis_id,
+                "analysis_date": analysis_date,
+                "mentions": mentions[analysis_id]
+            }
+            for analysis_id, analysis_date, research_id in analyses
+        ]
+
+    @staticmethod
+    def reindex(db: Session, analyses: Iterable[MedicationAdherenceAnalysis]) -> int:
+        """Rebuild mention rows for existing analyses (backfill). Caller commits."""
+        written = 0
+        for analysis in analyses:
+            db.query(MedicationMention).filter(
+                MedicationMention.analysis_id == analysis.id
+            ).delete(synchronize_session=False)
+            written += MedicationIndexService.index_analysis(db, analysis)
+        return written
+
+
+# Singleton instance
+medication_index_service = MedicationIndexService()
@@ -0,0 +1,90 @@
+"""
+Research ID resolution service
+
+Maps research_id strings to paco_research_ids primary keys. Lookups go through a
+request-scoped map stored on the SQLAlchemy session (one session per request via
+get_db) and then a process-wide LRU, so each request resolves a given research ID
+at most once and repeat requests usually skip the database entirely.
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.instrumentation import get_request_context
+from app.models.database import ResearchID
+
+_SESSION_KEY = "research_id_fks"
+
+
+class ResearchIDResolver:
+    """Resolve research_id strings to primary keys with request and process caches"""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._lru: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = Lock()
+
+    def _request_map(self, db: Session) -> dict:
+        return db.info.setdefault(_SESSION_KEY, {})
+
+    def _tag_request(self, research_id: str) -> None:
+        # Attribute the request (logs, traces) to the first research ID it touches
+        ctx = get_request_context()
+        if ctx is not None and ctx.research_id is None:
+            ctx.research_id = research_id
+
+    def _lru_get(self, research_id: str) -> Optional[int]:
+        with self._lock:
+            pk = self._lru.get(research_id)
+            if pk is not None:
+                self._lru.move_to_end(research_id)
+            return pk
+
+    def _lru_put(self, research_id: str, pk: int) -> None:
+        with self._lock:
+            self._lru[research_id] = pk
+            self._lru.move_to_end(research_id)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    def resolve(self, db: Session, research_id: str) -> Optional[int]:
+        """Return the primary key for a research ID, or None if it does not exist"""
+        request_map = self._request_map(db)
+        pk = request_map.get(research_id)
+        if pk is not None:
+            return pk
+
+        pk = self._lru_get(research_id)
+        if pk is None:
+            row = db.query(ResearchID.id).filter(
+                ResearchID.research_id == research_id
+            ).first()
+            if row is None:
+                # Misses are not cached so newly created IDs resolve immediately
+                return None
+            pk = row[0]
+            self._lru_put(research_id, pk)
+
+        request_map[research_id] = pk
+        self._tag_request(research_id)
+        return pk
+
+    def prime(self, db: Session, research_user: ResearchID) -> None:
+        """Record a ResearchID row that was already loaded (e.g. during auth)"""
+        self._request_map(db)[research_user.research_id] = research_user.id
+        self._lru_put(research_user.research_id, research_user.id)
+        self._tag_request(research_user.research_id)
+
+    def invalidate(self, research_id: Optional[str] = None) -> None:
+        """Drop one research ID (or everything) from the process-wide cache"""
+        with self._lock:
+            if research_id is None:
+                self._lru.clear()
+            else:
+                self._lru.pop(research_id, None)
+
+
+# Singleton instance
+research_id_resolver = ResearchIDResolver()
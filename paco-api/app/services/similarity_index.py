@@ -0,0 +1,330 @@
+"""
+Local vector index for finding participants with similar adherence profiles
+
+Each MedicationAdherenceAnalysis is embedded offline (no network): by default
+with signed feature hashing of words and bigrams, or with any local model
+plugged in through SIMILARITY_EMBEDDER="package.module:factory". Vectors are
+L2-normalized float32 rows in a memory-mapped matrix on disk, so a top-k
+cosine query is one matrix-vector product over the mapped rows.
+
+Layout of SIMILARITY_INDEX_DIR:
+    vectors.f32   (capacity, dim) float32 row matrix
+    keys.i64      (capacity, 2) int64 rows of (analysis_id, research_id_fk)
+    meta.json     {"dim", "count", "capacity", "embedder"}
+Writers take an exclusive flock on index.lock, so several worker processes
+can share one index; readers reload when meta.json changes.
+"""
+import fcntl
+import hashlib
+import importlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 1024
+
+_WORD = re.compile(r"[a-z][a-z0-9']+")
+_STOPWORDS = frozenset("""
+a an and are as at be been but by for from has have he her his i if in into is it its
+me my no not of on or our she so than that the their them then there they this to was
+we were what when which who will with you your patient patients reports reported
+""".split())
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and word bigrams with sublinear tf"""
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _features(self, text: str) -> Dict[int, float]:
+        words = [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+        counts: Dict[str, int] = {}
+        for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            counts[token] = counts.get(token, 0) + 1
+
+        features: Dict[int, float] = {}
+        for token, count in counts.items():
+            digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+            index = digest % self.dim
+            sign = 1.0 if digest >> 63 else -1.0
+            features[index] = features.get(index, 0.0) + sign * (1 + math.log(count))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for index, value in self._features(text).items():
+                matrix[row, index] = value
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+def load_embedder(spec: str, dim: int) -> Any:
+    """
+    "hashing" or "package.module:factory". A factory is called with `dim`
+    and must return an object with `.dim`, `.name` and `.embed(texts)`
+    returning L2-normalized float32 rows.
+    """
+    if spec == "hashing":
+        return HashingEmbedder(dim)
+    module_name, _, attribute = spec.partition(":")
+    factory: Callable[[int], Any] = getattr(importlib.import_module(module_name), attribute)
+    return factory(dim)
+
+
+def analysis_text(analysis: Any) -> str:
+    """Text embedded for an analysis: summary plus barriers, side effects and strategies"""
+    parts = [analysis.summary or ""]
+    for column in (analysis.adherence_barriers, analysis.side_effects, analysis.adherence_strategies):
+        try:
+            items = json.loads(column) if column else []
+        except (TypeError, ValueError):
+            items = []
+        for item in items if isinstance(items, list) else []:
+            if isinstance(item, dict):
+                parts.extend(str(value) for value in item.values() if isinstance(value, str))
+            elif isinstance(item, str):
+                parts.append(item)
+    return "\n".join(part for part in parts if part)
+
+
+class SimilarityIndex:
+    """Memory-mapped float32 vector store with top-k cosine search"""
+
+    def __init__(self, directory: str, embedder: Any):
+        self.directory = directory
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self._lock = threading.RLock()
+        self._meta_mtime: Optional[float] = None
+        self._vectors: Optional[np.memmap] = None
+        self._keys: Optional[np.memmap] = None
+        self._count = 0
+        self._capacity = 0
+        self._rows: Dict[int, int] = {}
+        self._latest: Optional[Tuple[Any, np.ndarray]] = None
+
+    # -- storage -------------------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _write_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(self._path("index.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh(force=True)
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _open(self, capacity: int, mode: str) -> None:
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+        self._keys = np.memmap(self._path("keys.i64"), dtype=np.int64, mode=mode, shape=(capacity, 2))
+        self._capacity = capacity
+
+    def _refresh(self, force: bool = False) -> None:
+        with self._lock:
+            self._reload(force)
+
+    def _reload(self, force: bool) -> None:
+        """(Re)map the files if another process changed them"""
+        meta_path = self._path("meta.json")
+        try:
+            mtime = os.stat(meta_path).st_mtime_ns
+        except FileNotFoundError:
+            self._vectors = self._keys = None
+            self._count = self._capacity = 0
+            self._rows = {}
+            self._meta_mtime = None
+            return
+        if not force and mtime == self._meta_mtime:
+            return
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["dim"] != self.dim or meta["embedder"] != self.embedder.name:
+            raise ValueError(
+                f"Index at {self.directory} was built with {meta['embedder']}/{meta['dim']}; "
+                "rebuild it with scripts/rebuild_similarity_index.py"
+            )
+        self._open(meta["capacity"], "r+")
+        self._count = meta["count"]
+        self._rows = {int(key): row for row, key in enumerate(self._keys[:self._count, 0])}
+        self._meta_mtime = mtime
+
+    def _write_meta(self) -> None:
+        self._vectors.flush()
+        self._keys.flush()
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "count": self._count,
+                "capacity": self._capacity,
+                "embedder": self.embedder.name
+            }, f)
+        os.replace(tmp_path, self._path("meta.json"))
+        self._meta_mtime = os.stat(self._path("meta.json")).st_mtime_ns
+
+    def _grow(self, needed: int) -> None:
+        if self._vectors is not None and needed <= self._capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self._capacity)
+        while capacity < needed:
+            capacity *= 2
+
+        old_vectors, old_keys, count = self._vectors, self._keys, self._count
+        for name in ("vectors.f32", "keys.i64"):
+            if os.path.exists(self._path(name)):
+                os.replace(self._path(name), self._path(name + ".old"))
+        self._open(capacity, "w+")
+        if old_vectors is not None:
+            self._vectors[:count] = old_vectors[:count]
+            self._keys[:count] = old_keys[:count]
+            del old_vectors, old_keys
+        for name in ("vectors.f32", "keys.i64"):
+            if os.path.exists(self._path(name + ".old")):
+                os.remove(self._path(name + ".old"))
+
+    # -- writes --------------------------------------------------------------
+
+    def upsert(self, items: Iterable[Tuple[int, int, str]]) -> int:
+        """Embed and store (analysis_id, research_id_fk, text) items; returns rows written"""
+        items = list(items)
+        if not items:
+            return 0
+        vectors = self.embedder.embed([text for _, _, text in items])
+
+        with self._write_lock():
+            self._grow(self._count + len(items))
+            for (analysis_id, research_id_fk, _), vector in zip(items, vectors):
+                row = self._rows.get(analysis_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._rows[analysis_id] = row
+                self._vectors[row] = vector
+                self._keys[row] = (analysis_id, research_id_fk)
+            self._write_meta()
+        return len(items)
+
+    def add_analysis(self, analysis: Any) -> None:
+        """Index one analysis as it lands (errors are logged, never raised)"""
+        try:
+            self.upsert([(analysis.id, analysis.research_id_fk, analysis_text(analysis))])
+        except Exception:
+            logger.exception("Failed to index analysis", extra={"analysis_id": analysis.id})
+
+    def reset(self) -> None:
+        """Drop all vectors (used before a full rebuild)"""
+        with self._write_lock():
+            for name in ("vectors.f32", "keys.i64"):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self._vectors = self._keys = None
+            self._count = self._capacity = 0
+            self._rows = {}
+            self._grow(INITIAL_CAPACITY)
+            self._write_meta()
+
+    # -- reads ---------------------------------------------------------------
+
+    def __len__(self) -> int:
+        self._refresh()
+        return self._count
+
+    def vector_for(self, analysis_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            self._reload(False)
+            row = self._rows.get(analysis_id)
+            return None if row is None else np.array(self._vectors[row])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embedder.embed([text])[0]
+
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int = 10,
+        exclude_research_id_fk: Optional[int] = None,
+        latest_per_participant: bool = True
+    ) -> List[Tuple[int, int, float]]:
+        """
+        Top-k (analysis_id, research_id_fk, cosine score > 0) by descending score.
+        With `latest_per_participant`, only each participant's newest analysis
+        (highest analysis_id) is a candidate.
+        """
+        # Snapshot under the lock: a concurrent upsert may _grow and remap the
+        # files, but the views taken here keep the old mapping alive
+        with self._lock:
+            self._reload(False)
+            count = self._count
+            if not count:
+                return []
+            keys = np.array(self._keys[:count])
+            vectors = self._vectors[:count]
+            latest = self._latest_mask(keys).copy() if latest_per_participant else None
+
+        scores = np.asarray(vectors) @ vector.astype(np.float32)
+
+        if latest is not None:
+            candidates = latest
+        else:
+            candidates = np.ones(count, dtype=bool)
+        if exclude_research_id_fk is not None:
+            candidates &= keys[:, 1] != exclude_research_id_fk
+
+        candidates &= scores > 0  # Drop analyses with no features in common
+        scores = np.where(candidates, scores, -np.inf)
+        k = min(k, int(candidates.sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(keys[i, 0]), int(keys[i, 1]), float(scores[i])) for i in top]
+
+    def _latest_mask(self, keys: np.ndarray) -> np.ndarray:
+        """Rows holding each participant's newest analysis (cached per index version)"""
+        version = (self._meta_mtime, self._count)
+        if self._latest is None or self._latest[0] != version:
+            order = np.lexsort((-keys[:, 0], keys[:, 1]))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = keys[order[1:], 1] != keys[order[:-1], 1]
+            mask = np.zeros(len(order), dtype=bool)
+            mask[order[first]] = True
+            self._latest = (version, mask)
+        return self._latest[1]
+
+
+_index: Optional[SimilarityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index() -> SimilarityIndex:
+    """Process-wide index configured from settings"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                settings = get_settings()
+                embedder = load_embedder(settings.SIMILARITY_EMBEDDER, settings.SIMILARITY_DIM)
+                _index = SimilarityIndex(settings.SIMILARITY_INDEX_DIR, embedder)
+    return _index
@@ -0,0 +1,156 @@
+"""
+Transcript compaction before adherence analysis
+
+PaCo repeats the same affirmations and scripted questions across sessions. Before
+a transcript is sent to the LLM, assistant turns are cut down to their question
+sentences and near-identical assistant turns (MinHash over word shingles, with
+LSH banding to find candidates) are dropped after their first occurrence.
+Patient turns are always kept verbatim.
+"""
+import hashlib
+import re
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.services.medication_extraction import estimate_tokens
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.6 Jaccard almost always share a band
+ROWS = NUM_PERM // BANDS
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed permutation coefficients so signatures are stable across processes
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME | 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE_PRIME,
+    )
+    for i in range(NUM_PERM)
+]
+
+_WORD = re.compile(r"[a-z0-9']+")
+_SENTENCE = re.compile(r"[^.!?]+[.!?]*")
+
+PATIENT_ROLES = frozenset({"user"})
+
+
+def shingles(text: str, k: int = 3) -> set:
+    """Word k-shingles of normalized text (short texts fall back to single words)"""
+    words = _WORD.findall(text.lower())
+    if len(words) < k:
+        return set(words)
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def minhash(items: set) -> Tuple[int, ...]:
+    """MinHash signature of a shingle set"""
+    if not items:
+        return (_MAX_HASH,) * NUM_PERM
+    hashes = [
+        int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big")
+        for item in items
+    ]
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+@lru_cache(maxsize=4096)
+def signature(text: str) -> Tuple[int, ...]:
+    """MinHash signature of a turn (cached: scripted turns recur verbatim)"""
+    return minhash(shingles(text))
+
+
+def estimated_jaccard(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def question_content(text: str) -> str:
+    """Keep only the question sentences of an assistant turn (first sentence if none)"""
+    sentences = [s.strip() for s in _SENTENCE.findall(text) if s.strip()]
+    if not sentences:
+        return text.strip()
+    questions = [s for s in sentences if s.endswith("?")]
+    return " ".join(questions) if questions else sentences[0]
+
+
+@dataclass
+class CompactionResult:
+    """Compacted turn contents (None = dropped) and the savings achieved"""
+    contents: List[Optional[str]]
+    duplicates_dropped: int = 0
+    assistant_truncated: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    @property
+    def reduction_ratio(self) -> float:
+        """Fraction of estimated tokens removed (0.0 - 1.0)"""
+        if not self.tokens_before:
+            return 0.0
+        return 1 - self.tokens_after / self.tokens_before
+
+
+@dataclass
+class _LSHIndex:
+    """Band buckets of kept assistant-turn signatures"""
+    signatures: List[Tuple[int, ...]] = field(default_factory=list)
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = field(default_factory=dict)
+
+    def find_similar(self, signature: Tuple[int, ...], threshold: float) -> bool:
+        seen = set()
+        for band in range(BANDS):
+            key = (band, signature[band * ROWS:(band + 1) * ROWS])
+            for candidate in self.buckets.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if estimated_jaccard(signature, self.signatures[candidate]) >= threshold:
+                    return True
+        return False
+
+    def add(self, signature: Tuple[int, ...]) -> None:
+        position = len(self.signatures)
+        self.signatures.append(signature)
+        for band in range(BANDS):
+            key = (band, signature[band * ROWS:(band + 1) * ROWS])
+            self.buckets.setdefault(key, []).append(position)
+
+
+def compact_transcript(
+    turns: Sequence[Tuple[str, str]],
+    threshold: float = 0.8
+) -> CompactionResult:
+    """
+    Compact (role, content) turns. Patient turns are untouched; assistant turns
+    are reduced to their questions and dropped when near-identical (estimated
+    Jaccard >= `threshold` on the full turn) to an earlier assistant turn.
+    """
+    index = _LSHIndex()
+    result = CompactionResult(contents=[])
+
+    for role, content in turns:
+        result.tokens_before += estimate_tokens(content)
+
+        if role in PATIENT_ROLES:
+            result.contents.append(content)
+            result.tokens_after += estimate_tokens(content)
+            continue
+
+        turn_signature = signature(content)
+        if index.find_similar(turn_signature, threshold):
+            result.contents.append(None)
+            result.duplicates_dropped += 1
+            continue
+        index.add(turn_signature)
+
+        compacted = question_content(content)
+        if compacted != content.strip():
+            result.assistant_truncated += 1
+        result.contents.append(compacted)
+        result.tokens_after += estimate_tokens(compacted)
+
+    return result
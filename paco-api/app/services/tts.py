@@ -0,0 +1,296 @@
+"""
+Text-to-speech with a content-addressed on-disk audio cache
+
+Audio is keyed by sha256 of (backend, text, voice_id, model_id) and stored as
+AUDIO_CACHE_DIR/<first 2 hex>/<hash>.<ext>, served by the /audio mount, so a
+repeated sentence is synthesized once and its URL never changes. Files are
+written to a temporary name and renamed into place (readers never see partial
+audio), and concurrent requests for the same missing key share one synthesis.
+
+The cache is bounded by AUDIO_CACHE_MAX_BYTES with least-recently-used
+eviction. Recency is the file's atime, which hits bump explicitly (mtime is
+left alone so Last-Modified stays stable), so it survives restarts.
+
+Backends are chosen by TTS_BACKEND: "elevenlabs", "stub" (silent WAV, no
+network - for tests and load tests) or "package.module:factory".
+"""
+import asyncio
+import hashlib
+import importlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+import wave
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.core.config import get_settings
+from app.core.metrics import registry
+from app.services.elevenlabs_client import elevenlabs_client
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_REQUESTS = registry.counter(
+    "paco_tts_cache_requests_total",
+    "TTS requests by cache result (hit rate = hit / total)",
+    ["result"]
+)
+TTS_CACHE_BYTES = registry.gauge(
+    "paco_tts_cache_bytes",
+    "Bytes of audio in the TTS cache"
+)
+TTS_CACHE_EVICTIONS = registry.counter(
+    "paco_tts_cache_evictions_total",
+    "Audio files evicted from the TTS cache"
+)
+TTS_SYNTHESIS_DURATION = registry.histogram(
+    "paco_tts_synthesis_duration_seconds",
+    "Time to synthesize audio on a cache miss",
+    ["backend"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+)
+
+
+class ElevenLabsTTSBackend:
+    """ElevenLabs text-to-speech (MP3)"""
+
+    name = "elevenlabs"
+    extension = "mp3"
+    media_type = "audio/mpeg"
+
+    async def synthesize(self, text: str, voice_id: str, model_id: str) -> bytes:
+        return await elevenlabs_client.text_to_speech(text, voice_id, model_id)
+
+
+class StubTTSBackend:
+    """Silent 8 kHz mono WAV, about 60 ms per character (no network)"""
+
+    name = "stub"
+    extension = "wav"
+    media_type = "audio/wav"
+    sample_rate = 8000
+
+    async def synthesize(self, text: str, voice_id: str, model_id: str) -> bytes:
+        frames = int(self.sample_rate * 0.06 * len(text))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(1)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(b"\x80" * frames)
+        return buffer.getvalue()
+
+
+def load_tts_backend(spec: str) -> Any:
+    """
+    "elevenlabs", "stub" or "package.module:factory". A factory is called
+    with no arguments and must return an object with `.name`, `.extension`,
+    `.media_type` and `async .synthesize(text, voice_id, model_id) -> bytes`.
+    """
+    if spec == "elevenlabs":
+        return ElevenLabsTTSBackend()
+    if spec == "stub":
+        return StubTTSBackend()
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+def audio_duration(path: str) -> Optional[float]:
+    """Duration of a WAV file in seconds from its header (None for other formats)"""
+    if not path.endswith(".wav"):
+        return None
+    try:
+        with wave.open(path) as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except (OSError, wave.Error, EOFError):
+        return None
+
+
+@dataclass
+class CachedAudio:
+    key: str
+    path: str
+    url: str
+    size: int
+    cached: bool
+    duration_seconds: Optional[float] = None
+
+
+class AudioCache:
+    """Content-addressed audio files with size-bounded LRU eviction"""
+
+    def __init__(self, directory: str, max_bytes: int, url_prefix: str = "/audio"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.url_prefix = url_prefix
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # relative path -> size, oldest first
+        self._total = 0
+        self._scanned = False
+
+    @staticmethod
+    def key(backend: str, text: str, voice_id: str, model_id: str) -> str:
+        canonical = json.dumps([backend, text, voice_id, model_id], separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def relative_path(self, key: str, extension: str) -> str:
+        return f"{key[:2]}/{key}.{extension}"
+
+    def url(self, relative_path: str) -> str:
+        return f"{self.url_prefix}/{relative_path}"
+
+    def _scan(self) -> None:
+        """Index existing files by atime once per process"""
+        if self._scanned:
+            return
+        found = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((st.st_atime, os.path.relpath(path, self.directory), st.st_size))
+        for _, relative, size in sorted(found):
+            self._entries[relative] = size
+            self._total += size
+        self._scanned = True
+        TTS_CACHE_BYTES.set(self._total)
+
+    def get(self, relative_path: str) -> Optional[int]:
+        """Size of a cached file (marking it recently used), or None"""
+        path = os.path.join(self.directory, relative_path)
+        try:
+            st = os.stat(path)
+            os.utime(path, (time.time(), st.st_mtime))
+        except FileNotFoundError:
+            with self._lock:
+                size = self._entries.pop(relative_path, None)
+                if size is not None:
+                    self._total -= size
+            return None
+        with self._lock:
+            self._scan()
+            if relative_path not in self._entries:
+                self._total += st.st_size
+            self._entries[relative_path] = st.st_size
+            self._entries.move_to_end(relative_path)
+        return st.st_size
+
+    def put(self, relative_path: str, data: bytes) -> None:
+        """Write atomically, then evict least recently used files over the limit"""
+        path = os.path.join(self.directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._scan()
+            self._total += len(data) - self._entries.pop(relative_path, 0)
+            self._entries[relative_path] = len(data)
+            self._evict(keep=relative_path)
+            TTS_CACHE_BYTES.set(self._total)
+
+    def _evict(self, keep: str) -> None:
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            relative, size = next(iter(self._entries.items()))
+            if relative == keep:
+                self._entries.move_to_end(relative)
+                continue
+            del self._entries[relative]
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.directory, relative))
+                TTS_CACHE_EVICTIONS.inc()
+            except FileNotFoundError:
+                pass  # Already evicted by another worker
+
+
+class TTSService:
+    """Serve synthesized audio from the cache, synthesizing on a miss"""
+
+    def __init__(self, backend: Any, cache: AudioCache):
+        self.backend = backend
+        self.cache = cache
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def synthesize(
+        self,
+        text: str,
+        voice_id: Optional[str] = None,
+        model_id: Optional[str] = None
+    ) -> CachedAudio:
+        settings = get_settings()
+        voice_id = voice_id or settings.ELEVENLABS_VOICE_ID
+        model_id = model_id or settings.ELEVENLABS_MODEL_ID
+        key = self.cache.key(self.backend.name, text, voice_id, model_id)
+        relative = self.cache.relative_path(key, self.backend.extension)
+
+        full_path = os.path.join(self.cache.directory, relative)
+
+        size = self.cache.get(relative)
+        if size is not None:
+            TTS_CACHE_REQUESTS.inc(result="hit")
+            return CachedAudio(
+                key, relative, self.cache.url(relative), size, cached=True,
+                duration_seconds=audio_duration(full_path)
+            )
+        TTS_CACHE_REQUESTS.inc(result="miss")
+
+        # Single flight: concurrent misses for the same key wait for one synthesis.
+        # The audio was freshly synthesized, so waiters report cached=False too
+        pending = self._inflight.get(key)
+        if pending is not None:
+            size = await asyncio.shield(pending)
+            return CachedAudio(
+                key, relative, self.cache.url(relative), size, cached=False,
+                duration_seconds=audio_duration(full_path)
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            start = time.perf_counter()
+            data = await self.backend.synthesize(text, voice_id, model_id)
+            TTS_SYNTHESIS_DURATION.observe(time.perf_counter() - start, backend=self.backend.name)
+            await asyncio.to_thread(self.cache.put, relative, data)
+            future.set_result(len(data))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved: waiters re-raise it, nobody else needs to
+            raise
+        finally:
+            del self._inflight[key]
+        return CachedAudio(
+            key, relative, self.cache.url(relative), len(data), cached=False,
+            duration_seconds=audio_duration(full_path)
+        )
+
+
+_tts_service: Optional[TTSService] = None
+
+
+def get_tts_service() -> TTSService:
+    """Process-wide service configured from settings"""
+    global _tts_service
+    if _tts_service is None:
+        settings = get_settings()
+        _tts_service = TTSService(
+            load_tts_backend(settings.TTS_BACKEND),
+            AudioCache(settings.AUDIO_CACHE_DIR, settings.AUDIO_CACHE_MAX_BYTES)
+        )
+    return _tts_service
@@ -0,0 +1,537 @@
+"""
+Batched persistence for turns streamed over the /chat/ws/ingest WebSocket
+
+A connection authenticates once and then sends turns as they happen. Turns
+are buffered per connection and written together - one database session,
+one duplicate lookup, one thread upsert + multi-row INSERT per conversation
+and one commit - once INGEST_BATCH_SIZE are waiting or INGEST_FLUSH_INTERVAL_MS
+after the first one arrived, whichever comes first. Each flush acks every
+turn in it with its assigned message ID.
+
+Duplicates follow /chat/save-message: a turn whose (elevenlabs_message_id,
+elevenlabs_conversation_id) is already stored is acked with the existing
+ID and not inserted again, so clients can safely resend unacked turns.
+The same rules apply to ElevenLabs transcripts (/chat/sync-elevenlabs-conversation,
+the post-call webhook and the background reconciler), which go through
+sync_transcript: a fingerprint stored on the thread (entry count, last entry
+ID, content hash) lets unchanged transcripts skip all per-message work and
+grown ones process only the new tail. Transcript turns also match the turns
+the widget saved live without a message ID (same conversation, role and
+content), so a conversation saved live is not stored twice. Transcript writers
+of the same conversation are serialized (lock_transcript), and a unique index
+on (elevenlabs_conversation_id, elevenlabs_message_id) backs the lookup when
+writers overlap anyway.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.metrics import registry
+from app.db.base import SessionLocal
+from app.models.database import Conversation, ConversationThread
+from app.schemas.conversation import IngestAck, IngestTurn
+from app.services.conversation_service import conversation_service
+from app.services.research_id_resolver import research_id_resolver
+
+logger = logging.getLogger(__name__)
+
+INGEST_CONNECTIONS = registry.gauge(
+    "paco_ingest_connections",
+    "Open /chat/ws/ingest WebSocket connections"
+)
+INGEST_TURNS = registry.counter(
+    "paco_ingest_turns_total",
+    "Turns received over /chat/ws/ingest by result",
+    ["result"]
+)
+INGEST_BATCH_SIZE = registry.histogram(
+    "paco_ingest_batch_size",
+    "Turns written per ingest flush",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200)
+)
+INGEST_PERSIST_LATENCY = registry.histogram(
+    "paco_ingest_persist_seconds",
+    "Time from receiving a turn to its commit",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+
+def _entry_id(elevenlabs_conversation_id: str, index: int, message: Dict[str, Any]) -> str:
+    return message.get("id") or f"{elevenlabs_conversation_id}:{index}"
+
+
+def transcript_turns(
+    elevenlabs_conversation_id: str,
+    conversation: Dict[str, Any],
+    start: int = 0
+) -> List[IngestTurn]:
+    """
+    Turns of an ElevenLabs conversation (GET /v1/convai/conversations/{id} or
+    the post-call webhook's `data`) from transcript entry `start` on, empty
+    messages skipped.
+
+    Transcript entries usually carry no ID, so one is derived from the
+    conversation ID and the entry's position: re-syncing the same transcript,
+    or receiving it again by webhook, is then deduplicated like any other turn.
+    """
+    transcript = conversation.get("transcript")
+    if not isinstance(transcript, list):
+        return []
+    start_time = (conversation.get("metadata") or {}).get("start_time_unix_secs")
+
+    turns = []
+    for index in range(start, len(transcript)):
+        message = transcript[index]
+        content = message.get("message") or message.get("text") or ""
+        if not content.strip():
+            continue
+
+        timestamp = None
+        if message.get("timestamp"):
+            try:
+                timestamp = datetime.fromisoformat(message["timestamp"].replace("Z", "+00:00"))
+            except (ValueError, AttributeError):
+                pass
+        if timestamp is None and start_time is not None:
+            timestamp = datetime.fromtimestamp(
+                start_time + (message.get("time_in_call_secs") or 0), tz=timezone.utc
+            )
+
+        message_id = _entry_id(elevenlabs_conversation_id, index, message)
+        # Not validated: IngestTurn's limits guard WebSocket input, while the
+        # provider's transcript is stored as ElevenLabs recorded it
+        turns.append(IngestTurn.model_construct(
+            client_id=message_id,
+            role="user" if message.get("role") == "user" else "assistant",
+            content=content,
+            timestamp=timestamp or datetime.now(timezone.utc),
+            provider="elevenlabs",
+            elevenlabs_conversation_id=elevenlabs_conversation_id,
+            elevenlabs_message_id=message_id
+        ))
+    return turns
+
+
+@dataclass(frozen=True)
+class TranscriptFingerprint:
+    """What a thread's stored transcript was built from (paco_conversation_threads)"""
+    entries: int  # Transcript entries processed, empty ones included
+    last_message_id: Optional[str]
+    content_hash: str  # sha256 over the entries, in order
+
+    @classmethod
+    def of_thread(cls, thread: Optional[ConversationThread]) -> Optional["TranscriptFingerprint"]:
+        if thread is None or thread.transcript_hash is None:
+            return None
+        return cls(thread.transcript_entries, thread.transcript_last_message_id, thread.transcript_hash)
+
+
+def transcript_fingerprint(
+    elevenlabs_conversation_id: str,
+    transcript: List[Dict[str, Any]],
+    prefix_entries: int = 0
+) -> Tuple[TranscriptFingerprint, Optional[str]]:
+    """
+    Fingerprint of a whole transcript, plus the content hash of its first
+    `prefix_entries` entries (None if it is shorter), in one pass
+    """
+    digest = hashlib.sha256()
+    prefix_hash = digest.hexdigest() if prefix_entries == 0 else None
+    for index, message in enumerate(transcript):
+        digest.update(json.dumps([
+            message.get("id"), message.get("role"), message.get("message") or message.get("text"),
+            message.get("timestamp") or message.get("time_in_call_secs")
+        ], ensure_ascii=False).encode() + b"\n")
+        if index + 1 == prefix_entries:
+            prefix_hash = digest.hexdigest()
+    last_message_id = (
+        _entry_id(elevenlabs_conversation_id, len(transcript) - 1, transcript[-1]) if transcript else None
+    )
+    return TranscriptFingerprint(len(transcript), last_message_id, digest.hexdigest()), prefix_hash
+
+
+@dataclass
+class TranscriptSync:
+    """Outcome of sync_transcript"""
+    mode: str  # "unchanged", "tail" (only new entries walked) or "full"
+    entries: int  # Entries in the fetched transcript
+    checked: int  # Entries turned into turns and deduplicated
+    acks: List[IngestAck]
+
+
+def _unidentified_turns(
+    db: Session,
+    research_id_fk: int,
+    elevenlabs_conversation_ids: Set[str]
+) -> Dict[Tuple[str, str, str], Deque[Conversation]]:
+    """
+    The participant's stored turns of these ElevenLabs conversations that have
+    no ElevenLabs message ID (saved live by the widget), oldest first, by
+    (conversation, role, content)
+    """
+    unidentified: Dict[Tuple[str, str, str], Deque[Conversation]] = defaultdict(deque)
+    if not elevenlabs_conversation_ids:
+        return unidentified
+    for row in db.query(Conversation).filter(
+        Conversation.research_id_fk == research_id_fk,
+        Conversation.elevenlabs_conversation_id.in_(elevenlabs_conversation_ids),
+        Conversation.elevenlabs_message_id.is_(None)
+    ).order_by(Conversation.timestamp, Conversation.id).all():
+        unidentified[(row.elevenlabs_conversation_id, row.role, row.content.strip())].append(row)
+    return unidentified
+
+
+def stage_turns(
+    db: Session,
+    research_id_fk: int,
+    default_conversation_id: str,
+    turns: List[IngestTurn],
+    adopt_unidentified: bool = False
+) -> List[IngestAck]:
+    """
+    Insert a batch of turns (deduplicated) without committing; acks in input order.
+
+    With `adopt_unidentified` (transcripts), a turn whose message ID is not
+    stored yet also matches a stored turn of the same ElevenLabs conversation
+    with the same role and content but no message ID - the live copy the widget
+    saved through /chat/save-message. That row takes over the turn's message ID,
+    so each live turn is matched once and later syncs deduplicate by ID.
+    """
+    message_ids = {turn.elevenlabs_message_id for turn in turns if turn.elevenlabs_message_id}
+    existing: Dict[Tuple[str, Optional[str]], Conversation] = {}
+    if message_ids:
+        existing = {
+            (row.elevenlabs_message_id, row.elevenlabs_conversation_id): row
+            for row in db.query(Conversation).filter(
+                Conversation.elevenlabs_message_id.in_(message_ids)
+            ).all()
+        }
+    unidentified: Dict[Tuple[str, str, str], Deque[Conversation]] = {}
+    if adopt_unidentified:
+        unidentified = _unidentified_turns(db, research_id_fk, {
+            turn.elevenlabs_conversation_id for turn in turns
+            if turn.elevenlabs_conversation_id and turn.elevenlabs_message_id
+            and (turn.elevenlabs_message_id, turn.elevenlabs_conversation_id) not in existing
+        })
+
+    acks: List[Optional[IngestAck]] = [None] * len(turns)
+    groups: Dict[Tuple[str, str, Optional[str]], List[int]] = {}
+    first_seen: Dict[Tuple[str, Optional[str]], int] = {}
+    for i, turn in enumerate(turns):
+        key = (turn.elevenlabs_message_id, turn.elevenlabs_conversation_id)
+        if turn.elevenlabs_message_id and key in existing:
+            row = existing[key]
+            acks[i] = IngestAck(
+                client_id=turn.client_id, message_id=row.id,
+                conversation_id=row.conversation_id, timestamp=row.timestamp, duplicate=True
+            )
+            continue
+        if turn.elevenlabs_message_id and key in first_seen:
+            continue  # Repeated within this batch: acked with the first copy below
+        live = unidentified.get((turn.elevenlabs_conversation_id, turn.role, turn.content.strip()))
+        if turn.elevenlabs_message_id and live:
+            row = live.popleft()
+            row.elevenlabs_message_id = turn.elevenlabs_message_id  # Written on commit
+            existing[key] = row
+            acks[i] = IngestAck(
+                client_id=turn.client_id, message_id=row.id,
+                conversation_id=row.conversation_id, timestamp=row.timestamp, duplicate=True
+            )
+            continue
+        if turn.elevenlabs_message_id:
+            first_seen[key] = i
+        conversation_id = turn.elevenlabs_conversation_id or default_conversation_id
+        groups.setdefault((conversation_id, turn.provider, turn.elevenlabs_conversation_id), []).append(i)
+
+    conflicts: List[int] = []
+    for (conversation_id, provider, elevenlabs_conversation_id), indices in groups.items():
+        saved = conversation_service.append_messages(
+            db,
+            research_id_fk=research_id_fk,
+            conversation_id=conversation_id,
+            messages=[
+                {
+                    "role": turns[i].role,
+                    "content": turns[i].content,
+                    "timestamp": turns[i].timestamp,
+                    "elevenlabs_message_id": turns[i].elevenlabs_message_id
+                }
+                for i in indices
+            ],
+            provider=provider,
+            elevenlabs_conversation_id=elevenlabs_conversation_id
+        )
+        for i, message in zip(indices, saved):
+            if message is None:
+                conflicts.append(i)
+                continue
+            acks[i] = IngestAck(
+                client_id=turns[i].client_id, message_id=message.id,
+                conversation_id=conversation_id, timestamp=message.timestamp
+            )
+
+    if conflicts:
+        # Stored by another writer since the lookup above: ack its copy
+        stored = {
+            (row.elevenlabs_message_id, row.elevenlabs_conversation_id): row
+            for row in db.query(Conversation).filter(
+                Conversation.elevenlabs_message_id.in_({turns[i].elevenlabs_message_id for i in conflicts})
+            ).all()
+        }
+        for i in conflicts:
+            row = stored[(turns[i].elevenlabs_message_id, turns[i].elevenlabs_conversation_id)]
+            acks[i] = IngestAck(
+                client_id=turns[i].client_id, message_id=row.id,
+                conversation_id=row.conversation_id, timestamp=row.timestamp, duplicate=True
+            )
+
+    for i, turn in enumerate(turns):
+        if acks[i] is None:
+            first = acks[first_seen[(turn.elevenlabs_message_id, turn.elevenlabs_conversation_id)]]
+            acks[i] = first.model_copy(update={"client_id": turn.client_id, "duplicate": True})
+    return acks
+
+
+def persist_turns(
+    db: Session,
+    research_id_fk: int,
+    default_conversation_id: str,
+    turns: List[IngestTurn]
+) -> List[IngestAck]:
+    """Write a batch of turns (deduplicated) and return acks in input order"""
+    acks = stage_turns(db, research_id_fk, default_conversation_id, turns)
+    db.commit()
+    return acks
+
+
+def lock_transcript(db: Session, elevenlabs_conversation_id: str) -> None:
+    """
+    Serialize writers of one ElevenLabs conversation until the transaction ends.
+
+    The sync endpoint, the webhook queue and the reconciler can write the same
+    just-finished conversation at once, and each checks for stored turns before
+    inserting. On Postgres a transaction-scoped advisory lock makes the second
+    writer wait for the first to commit, so its lookup sees those turns. SQLite
+    serializes writers itself, and ux_conversation_elevenlabs_message keeps a
+    racing copy out on any database (append_messages skips it).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+            {"key": f"elevenlabs_transcript:{elevenlabs_conversation_id}"}
+        )
+
+
+def sync_transcript(
+    db: Session,
+    research_id_fk: int,
+    elevenlabs_conversation_id: str,
+    conversation: Dict[str, Any],
+    thread: Optional[ConversationThread]
+) -> TranscriptSync:
+    """
+    Stage an ElevenLabs transcript against the fingerprint stored on its
+    thread (`thread`, None if not stored yet), without committing.
+
+    - Same fingerprint: nothing to do, no per-message work.
+    - Stored entries are an unchanged prefix: only the new tail is processed.
+    - Otherwise (first sync, or earlier entries edited): the whole transcript,
+      deduplicated turn by turn.
+    """
+    transcript = conversation.get("transcript")
+    if not isinstance(transcript, list):
+        transcript = []
+    stored = TranscriptFingerprint.of_thread(thread)
+    fingerprint, prefix_hash = transcript_fingerprint(
+        elevenlabs_conversation_id, transcript, stored.entries if stored else 0
+    )
+
+    if stored == fingerprint:
+        return TranscriptSync("unchanged", fingerprint.entries, 0, [])
+    if (
+        stored is not None and stored.entries < fingerprint.entries
+        and prefix_hash == stored.content_hash
+        and _entry_id(elevenlabs_conversation_id, stored.entries - 1, transcript[stored.entries - 1])
+        == stored.last_message_id
+    ):
+        mode, start = "tail", stored.entries
+    else:
+        mode, start = "full", 0
+
+    lock_transcript(db, elevenlabs_conversation_id)
+    acks = stage_turns(
+        db, research_id_fk, elevenlabs_conversation_id,
+        transcript_turns(elevenlabs_conversation_id, conversation, start),
+        adopt_unidentified=True
+    )
+    db.query(ConversationThread).filter(
+        ConversationThread.research_id_fk == research_id_fk,
+        ConversationThread.conversation_id == elevenlabs_conversation_id
+    ).update({
+        ConversationThread.transcript_entries: fingerprint.entries,
+        ConversationThread.transcript_last_message_id: fingerprint.last_message_id,
+        ConversationThread.transcript_hash: fingerprint.content_hash
+    }, synchronize_session=False)
+    return TranscriptSync(mode, fingerprint.entries, fingerprint.entries - start, acks)
+
+
+def _dynamic_research_id(conversation: Dict[str, Any]) -> Optional[str]:
+    client_data = conversation.get("conversation_initiation_client_data") or {}
+    return (client_data.get("dynamic_variables") or {}).get("research_id")
+
+
+def persist_transcripts(
+    db: Session,
+    conversations: List[Dict[str, Any]]
+) -> Tuple[Dict[str, int], List[str]]:
+    """
+    Write several ElevenLabs conversations (deduplicated) in one commit.
+
+    Each is attributed to the `research_id` dynamic variable the widget started
+    it with, or else to the participant whose live turns already opened the same
+    conversation. Each conversation is staged in its own savepoint, so one that
+    fails to write is rolled back alone and the rest are still committed.
+
+    Returns turn counts - saved, duplicate and unmatched (no known research ID) -
+    plus the number of conversations whose fingerprint was unchanged and of
+    those that failed, and the IDs of the failed conversations.
+    """
+    # Stored threads of these conversations: fingerprints, and the participant
+    # for conversations that came without a research_id variable
+    conversation_ids = [data["conversation_id"] for data in conversations if data.get("conversation_id")]
+    threads: Dict[str, ConversationThread] = {}
+    if conversation_ids:
+        for thread in db.query(ConversationThread).filter(
+            ConversationThread.elevenlabs_conversation_id.in_(conversation_ids)
+        ).all():
+            threads.setdefault(thread.elevenlabs_conversation_id, thread)
+
+    counts = {"saved": 0, "duplicate": 0, "unmatched": 0, "unchanged_transcripts": 0, "failed_transcripts": 0}
+    failed: List[str] = []
+    # In ID order, so writers holding several conversations' locks take them
+    # in the same order and cannot deadlock
+    for data in sorted(conversations, key=lambda data: data.get("conversation_id") or ""):
+        conversation_id = data.get("conversation_id")
+        if not conversation_id:
+            continue
+        thread = threads.get(conversation_id)
+        research_id = _dynamic_research_id(data)
+        if research_id:
+            research_id_fk = research_id_resolver.resolve(db, research_id)
+        else:
+            research_id_fk = thread.research_id_fk if thread else None
+        if research_id_fk is None:
+            logger.warning(
+                "ElevenLabs transcript has no known research ID",
+                extra={"elevenlabs_conversation_id": conversation_id}
+            )
+            counts["unmatched"] += len(transcript_turns(conversation_id, data))
+            continue
+        if thread is not None and (
+            thread.research_id_fk != research_id_fk or thread.conversation_id != conversation_id
+        ):
+            thread = None
+        try:
+            with db.begin_nested():
+                result = sync_transcript(db, research_id_fk, conversation_id, data, thread)
+        except Exception:
+            logger.exception(
+                "Failed to write ElevenLabs transcript",
+                extra={"elevenlabs_conversation_id": conversation_id}
+            )
+            counts["failed_transcripts"] += 1
+            failed.append(conversation_id)
+            continue
+        if result.mode == "unchanged":
+            counts["unchanged_transcripts"] += 1
+        for ack in result.acks:
+            counts["duplicate" if ack.duplicate else "saved"] += 1
+    db.commit()
+    return counts, failed
+
+
+class TurnBatcher:
+    """Buffer one connection's turns and flush them by size or age"""
+
+    def __init__(
+        self,
+        research_id_fk: int,
+        conversation_id: str,
+        send: Callable[[Dict[str, Any]], Awaitable[None]],
+        batch_size: int,
+        flush_interval: float
+    ):
+        self.research_id_fk = research_id_fk
+        self.conversation_id = conversation_id  # For turns without an ElevenLabs conversation ID
+        self.send = send
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[IngestTurn, float]] = []
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    async def add(self, turn: IngestTurn) -> None:
+        self._pending.append((turn, time.perf_counter()))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()  # Receiving waits for the write: natural backpressure
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        await self.flush()
+
+    def _persist(self, turns: List[IngestTurn]) -> List[IngestAck]:
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            return persist_turns(db, self.research_id_fk, self.conversation_id, turns)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def flush(self) -> None:
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            turns = [turn for turn, _ in batch]
+            try:
+                acks = await asyncio.to_thread(self._persist, turns)
+            except Exception:
+                logger.exception("Failed to persist ingested turns", extra={"turns": len(turns)})
+                INGEST_TURNS.inc(len(turns), result="failed")
+                await self.send({
+                    "type": "error",
+                    "client_ids": [turn.client_id for turn in turns],
+                    "detail": "Failed to save turns, please resend"
+                })
+                return
+
+            now = time.perf_counter()
+            for (_, received), ack in zip(batch, acks):
+                INGEST_PERSIST_LATENCY.observe(now - received)
+                INGEST_TURNS.inc(result="duplicate" if ack.duplicate else "saved")
+            INGEST_BATCH_SIZE.observe(len(batch))
+            await self.send({"type": "ack", "acks": [ack.model_dump(mode="json") for ack in acks]})
+
+    async def close(self) -> None:
+        """Write whatever is still buffered (the client may be gone)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Load spike: admin analytics vs patient /chat/save-message under admission control
+
+Floods /admin/stats and /admin/research-ids with --analytics-concurrency
+clients while --writers patients keep saving turns, for --duration seconds,
+against a running server. Reports per route: requests, 200/503 counts and
+latency percentiles. Run once with ADMISSION_ENABLED=false on the server and
+once with it on to compare patient write latency during the spike.
+
+Usage: python scripts/bench_admission.py --research-id RID001 --admin-password ...
+           [--duration 20] [--analytics-concurrency 60] [--writers 10]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.load_test_replay import login
+
+
+class Results:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, status: int, seconds: float) -> None:
+        self.statuses[name][status] += 1
+        if status == 200:
+            self.latencies[name].append(seconds)
+
+    def report(self) -> None:
+        print(f"{'route':<16} {'requests':>8} {'200':>7} {'503':>7} {'other':>6} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name in sorted(self.statuses):
+            statuses = self.statuses[name]
+            latencies = sorted(self.latencies[name]) or [0.0]
+            pct = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+            other = sum(n for status, n in statuses.items() if status not in (200, 503))
+            print(f"{name:<16} {sum(statuses.values()):>8} {statuses[200]:>7} {statuses[503]:>7} {other:>6} "
+                  f"{statistics.median(latencies) * 1000:>8.1f} {pct(0.95):>8.1f} {pct(0.99):>8.1f}")
+
+
+async def timed(results: Results, name: str, request) -> None:
+    """Run one request; connection errors and timeouts are recorded as status 0"""
+    start = time.perf_counter()
+    try:
+        status = (await request).status_code
+    except httpx.HTTPError:
+        status = 0
+    results.record(name, status, time.perf_counter() - start)
+
+
+async def analytics_client(client: httpx.AsyncClient, api: str, password: str, deadline: float, results: Results):
+    i = 0
+    while time.monotonic() < deadline:
+        if i % 2 == 0:
+            await timed(results, "admin/stats", client.post(f"{api}/admin/stats", json={"password": password}))
+        else:
+            await timed(results, "admin/ids", client.request(
+                "GET", f"{api}/admin/research-ids", json={"password": password}
+            ))
+        i += 1
+
+
+async def patient_writer(client: httpx.AsyncClient, api: str, headers: Dict, research_id: str,
+                         deadline: float, results: Results):
+    conversation_id = f"spike_{uuid.uuid4().hex[:12]}"
+    i = 0
+    while time.monotonic() < deadline:
+        await timed(results, "save-message", client.post(f"{api}/chat/save-message", headers=headers, json={
+            "research_id": research_id,
+            "role": "user" if i % 2 else "assistant",
+            "content": f"Spike turn {i}",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "provider": "elevenlabs",
+            "elevenlabs_conversation_id": conversation_id,
+            "elevenlabs_message_id": f"{conversation_id}_{i}"
+        }))
+        i += 1
+        await asyncio.sleep(0.2)  # A patient produces a turn every few hundred ms at most
+
+
+async def main_async(args) -> None:
+    api = args.base_url.rstrip("/") + "/api/v1"
+    limits = httpx.Limits(max_connections=args.analytics_concurrency + args.writers + 10)
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+        headers = await login(client, api, args.research_id)
+        results = Results()
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(
+            *(analytics_client(client, api, args.admin_password, deadline, results)
+              for _ in range(args.analytics_concurrency)),
+            *(patient_writer(client, api, headers, args.research_id, deadline, results)
+              for _ in range(args.writers))
+        )
+    results.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--research-id", required=True, help="Must exist in the database")
+    parser.add_argument("--admin-password", default=os.environ.get("ADMIN_PASSWORD", ""))
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--analytics-concurrency", type=int, default=60)
+    parser.add_argument("--writers", type=int, default=10)
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
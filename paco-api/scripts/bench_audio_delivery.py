@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent audio fetch throughput
+
+Serves a temporary directory of content-addressed audio files from a local
+uvicorn server two ways - Starlette's StaticFiles (the previous /audio mount)
+and app.core.audio_delivery (the current one) - and fetches them concurrently:
+whole files, random byte ranges (a player scrubbing) and revalidations with
+If-None-Match. Reports requests/sec, MB/s and latency percentiles.
+
+uvicorn offers neither ASGI zero-copy extension, so this measures the chunked
+pread path; under a server that does (pathsend / zerocopysend) the body never
+passes through Python at all.
+
+Usage: python scripts/bench_audio_delivery.py [--files 50] [--size-kb 512]
+           [--requests 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List, Optional
+
+import httpx
+import uvicorn
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.staticfiles import StaticFiles
+
+from app.core.audio_delivery import audio_file_response
+
+
+def make_files(directory: str, count: int, size: int) -> List[str]:
+    """Random MP3-sized blobs laid out like the TTS cache (<2 hex>/<sha256>.mp3)"""
+    paths = []
+    for i in range(count):
+        key = hashlib.sha256(str(i).encode()).hexdigest()
+        relative = f"{key[:2]}/{key}.mp3"
+        os.makedirs(os.path.join(directory, key[:2]), exist_ok=True)
+        with open(os.path.join(directory, relative), "wb") as f:
+            f.write(os.urandom(size))
+        paths.append(relative)
+    return paths
+
+
+def build_app(directory: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.api_route("/audio/{path:path}", methods=["GET", "HEAD"])
+    async def audio(path: str, request: Request):
+        return audio_file_response(request, directory, path)
+
+    app.mount("/static", StaticFiles(directory=directory), name="static")
+    return app
+
+
+def start_server(app: FastAPI) -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def run(
+    client: httpx.AsyncClient,
+    name: str,
+    n: int,
+    concurrency: int,
+    make_request: Callable[[int], "asyncio.Future"]
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    received = 0
+    statuses: dict = {}
+
+    async def one(i: int) -> None:
+        nonlocal received
+        async with semaphore:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            received += len(response.content)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{name:<26} {n / elapsed:>8.0f} req/s  {received / elapsed / 1e6:>8.1f} MB/s  "
+          f"p50 {p50:>7.1f} ms  p95 {p95:>7.1f} ms  status {statuses}")
+
+
+async def main_async(args, base_url: str, paths: List[str]) -> None:
+    rng = random.Random(0)
+    size = args.size_kb * 1024
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        etags = {}
+        for path in paths:
+            etags[path] = (await client.head(f"/audio/{path}")).headers["etag"]
+        static_etags = {}
+        for path in paths:
+            static_etags[path] = (await client.head(f"/static/{path}")).headers["etag"]
+
+        for prefix, tags in (("static", static_etags), ("audio", etags)):
+            label = "StaticFiles" if prefix == "static" else "audio_delivery"
+            print(f"\n{label}")
+
+            async def full(i: int, prefix=prefix) -> httpx.Response:
+                return await client.get(f"/{prefix}/{paths[i % len(paths)]}")
+
+            async def scrub(i: int, prefix=prefix) -> httpx.Response:
+                start = rng.randrange(0, max(size - 65536, 1))
+                return await client.get(
+                    f"/{prefix}/{paths[i % len(paths)]}",
+                    headers={"Range": f"bytes={start}-{start + 65535}"}
+                )
+
+            async def revalidate(i: int, prefix=prefix, tags=tags) -> httpx.Response:
+                path = paths[i % len(paths)]
+                return await client.get(f"/{prefix}/{path}", headers={"If-None-Match": tags[path]})
+
+            await run(client, "  full file", args.requests, args.concurrency, full)
+            await run(client, "  64 KiB range", args.requests, args.concurrency, scrub)
+            await run(client, "  If-None-Match", args.requests, args.concurrency, revalidate)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--size-kb", type=int, default=512, help="Size of each audio file")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_files(directory, args.files, args.size_kb * 1024)
+        base_url = start_server(build_app(directory))
+        print(f"{args.files} files x {args.size_kb} KiB, {args.requests} requests per scenario, "
+              f"concurrency {args.concurrency}")
+        asyncio.run(main_async(args, base_url, paths))
+
+
+if __name__ == "__main__":
+    main()
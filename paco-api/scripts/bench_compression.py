@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark response compression per endpoint
+
+Builds /chat/history and /medication-analysis/transcript bodies the way the
+endpoints do (50 / 500 / 5000 messages of varied patient/assistant text) and
+compresses each with every encoding available to app.core.compression
+(gzip always; br and zstd when brotli / zstandard are installed). Reports
+compressed size, bytes saved and CPU milliseconds per response.
+
+Usage: python scripts/bench_compression.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.compression import available_compressors, compress_body
+from app.core.responses import serialize_model
+from app.schemas.conversation import ConversationHistoryResponse
+from app.services.medication_analysis_service import MedicationAnalysisService
+
+PATIENT_PHRASES = [
+    "I take my lisinopril in the morning", "sometimes I forget the evening dose",
+    "the metformin upsets my stomach", "my pharmacy was out of stock last week",
+    "I feel dizzy when I stand up", "my daughter reminds me on weekends",
+    "I use a pill box", "the copay went up again", "I skipped it because of the side effects",
+    "my blood pressure was 142 over 90 yesterday", "I'm not sure what the white pill is for",
+]
+ASSISTANT_PHRASES = [
+    "Thank you for sharing that.", "That sounds frustrating.", "What do you think might help?",
+    "Have you talked to your pharmacist about it?", "Many people find a routine helps.",
+    "Can you tell me more about when that happens?", "It's great that you keep track of it.",
+    "Would a phone reminder be useful?", "How often does that happen in a typical week?",
+]
+
+
+class FakeRow:
+    """Stand-in for a Conversation ORM row (attribute access only)"""
+
+    def __init__(self, i: int, start: datetime, rng: random.Random):
+        phrases = ASSISTANT_PHRASES if i % 2 == 0 else PATIENT_PHRASES
+        self.id = 1000 + i
+        self.conversation_id = f"conv_{start:%Y%m%d}{i // 40:04d}_RID001"
+        self.role = "assistant" if i % 2 == 0 else "user"
+        self.content = " ".join(rng.choice(phrases) for _ in range(rng.randint(1, 4)))
+        self.timestamp = start + timedelta(seconds=i * 17 + rng.randint(0, 9))
+        self.model_used = "llama-3.3-70b-versatile" if self.role == "assistant" else None
+        self.audio_url = None
+
+
+def history_body(rows) -> bytes:
+    return serialize_model(ConversationHistoryResponse, {
+        "messages": rows,
+        "total": len(rows),
+        "research_id": "RID001"
+    })
+
+
+def transcript_body(rows) -> bytes:
+    return json.dumps({
+        "research_id": "RID001",
+        "message_count": len(rows),
+        "earliest_message": rows[0].timestamp.isoformat(),
+        "latest_message": rows[-1].timestamp.isoformat(),
+        "transcript": MedicationAnalysisService.format_transcript(rows)
+    }).encode()
+
+
+def cpu_ms(compressor_class, body: bytes, repeat: int) -> float:
+    """Best-of-`repeat` process CPU time in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        compress_body(compressor_class(), body)
+        best = min(best, time.process_time() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    compressors = available_compressors()
+    print(f"encodings: {', '.join(compressors)} (install brotli / zstandard for br / zstd)\n")
+    print(f"{'endpoint':<12} {'messages':>8}  {'encoding':<8} {'raw bytes':>10}  "
+          f"{'compressed':>10}  {'saved':>6}  {'cpu ms':>7}")
+
+    start = datetime(2025, 1, 1, 12, 0, 0)
+    for n in (50, 500, 5000):
+        rng = random.Random(n)
+        rows = [FakeRow(i, start, rng) for i in range(n)]
+        for endpoint, build in (("history", history_body), ("transcript", transcript_body)):
+            body = build(rows)
+            for encoding, compressor_class in compressors.items():
+                compressed, _ = compress_body(compressor_class(), body)
+                saved = 1 - len(compressed) / len(body)
+                print(f"{endpoint:<12} {n:>8}  {encoding:<8} {len(body):>10}  {len(compressed):>10}  "
+                      f"{saved:>6.1%}  {cpu_ms(compressor_class, body, args.repeat):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
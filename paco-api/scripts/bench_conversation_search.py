@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark full-text conversation search at a million messages
+
+Fills a scratch database (SQLite file by default, or a Postgres URL) with
+synthetic PaCo conversations (medication names drawn from a Zipf distribution,
+so terms range from rare to very common), builds the search index the same
+way the migration does, then reports first-page latency and average latency
+per page while walking pages by keyset cursor, next to a LIKE '%term%' scan
+that finds every match (what ranking without an index would need).
+
+Usage: python scripts/bench_conversation_search.py [--messages N] [--database-url URL] [--reuse]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models.database import Conversation, ResearchID
+from app.services.conversation_search import (
+    SearchFilters,
+    conversation_search_service,
+    ensure_sqlite_fts
+)
+from app.services.medication_extraction import LEXICON
+from scripts.bench_medication_extraction import (
+    ASSISTANT_TURNS,
+    PATIENT_MEDICATION,
+    PATIENT_SMALLTALK
+)
+
+BATCH_SIZE = 20000
+PARTICIPANTS = 500
+
+MEDICATIONS = [term for term in LEXICON["medication"] if " " not in term]
+
+QUERIES = [
+    (MEDICATIONS[-1], {}),                     # rare term (tail of the Zipf curve)
+    (MEDICATIONS[10], {}),                     # mid-frequency term
+    ("dizzy", {"role": "user"}),               # common term, role filter
+    ("forget evening pills", {}),              # multi-term AND
+    ("pill organizer", {"research_id_fk": 1}),  # single participant
+]
+
+
+def populate(engine, messages: int) -> None:
+    rng = random.Random(11)
+    start = datetime(2025, 1, 1)
+    weights = [1 / rank for rank in range(1, len(MEDICATIONS) + 1)]
+    with engine.begin() as conn:
+        conn.execute(insert(ResearchID.__table__), [
+            {"research_id": f"BENCH{i:04d}", "is_active": True} for i in range(PARTICIPANTS)
+        ])
+        ids = [row[0] for row in conn.execute(select(ResearchID.id))]
+
+    written = 0
+    while written < messages:
+        rows = []
+        for i in range(written, min(written + BATCH_SIZE, messages)):
+            if i % 2 == 0:
+                role, content = "assistant", rng.choice(ASSISTANT_TURNS)
+            elif rng.random() < 0.25:
+                role, content = "user", rng.choice(PATIENT_MEDICATION)
+                medication = rng.choices(MEDICATIONS, weights)[0]
+                content += f" I also take {medication} {rng.randint(1, 4)} times a week."
+            else:
+                role, content = "user", rng.choice(PATIENT_SMALLTALK)
+            rows.append({
+                "research_id_fk": ids[(i // 40) % len(ids)],
+                "conversation_id": f"conv_bench_{i // 40}",
+                "timestamp": start + timedelta(seconds=i * 30),
+                "role": role,
+                "content": content,
+                "provider": "elevenlabs"
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(Conversation.__table__), rows)
+        written += len(rows)
+        print(f"  ...{written:,} messages", end="\r")
+    print()
+
+
+def build_index(engine) -> None:
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            ensure_sqlite_fts(conn)
+        else:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_conversation_content_fts "
+                "ON paco_conversations USING GIN (to_tsvector('english', content))"
+            ))
+            conn.execute(text("ANALYZE paco_conversations"))
+
+
+def timed(func, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples), result
+
+
+def like_scan(db, query: str, filters: dict):
+    term = query.split()[0]
+    sql = "SELECT id FROM paco_conversations WHERE lower(content) LIKE :term"
+    params = {"term": f"%{term}%"}
+    for column, value in filters.items():
+        sql += f" AND {column} = :{column}"
+        params[column] = value
+    return db.execute(text(sql), params).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--database-url", default="sqlite:////tmp/paco_search_bench.db")
+    parser.add_argument("--reuse", action="store_true", help="Keep existing data if present")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=5, help="Pages to walk for the deep-page timing")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if not args.reuse:
+        if engine.dialect.name == "sqlite":
+            with engine.begin() as conn:
+                conn.execute(text("DROP TABLE IF EXISTS paco_conversations_fts"))
+        Base.metadata.drop_all(engine, tables=[Conversation.__table__, ResearchID.__table__])
+    Base.metadata.create_all(engine, tables=[ResearchID.__table__, Conversation.__table__])
+
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    existing = db.scalar(select(func.count(Conversation.id)))
+    if existing < args.messages:
+        # Load first and index afterwards (a bulk index build beats per-row triggers)
+        start = time.perf_counter()
+        populate(engine, args.messages - existing)
+        print(f"📥 Inserted {args.messages - existing:,} messages in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    build_index(engine)
+    print(f"🗂️  Index ready in {time.perf_counter() - start:.1f}s ({engine.dialect.name})")
+
+    print(f"\n{'query':<28} {'filter':<18} {'page1 ms':>9} {'deep ms':>9} {'LIKE ms':>9} {'matches':>8} {'hits':>5}")
+    for query, filter_kwargs in QUERIES:
+        filters = SearchFilters(**filter_kwargs)
+
+        page1_ms, _, (hits, cursor) = timed(
+            lambda: conversation_search_service.search(db, query, filters, limit=20), args.repeat
+        )
+
+        def walk():
+            page_cursor = None
+            for _ in range(args.pages):
+                _, page_cursor = conversation_search_service.search(
+                    db, query, filters, limit=20, cursor=page_cursor
+                )
+                if page_cursor is None:
+                    break
+
+        walk_ms, _, _ = timed(walk, max(1, args.repeat // 2))
+        like_ms, _, matches = timed(lambda: like_scan(db, query, filter_kwargs), max(1, args.repeat // 2))
+        label = ",".join(f"{k}={v}" for k, v in filter_kwargs.items()) or "-"
+        print(
+            f"{query:<28} {label:<18} {page1_ms:>9.1f} {walk_ms / args.pages:>9.1f} "
+            f"{like_ms:>9.1f} {len(matches):>8,} {len(hits):>5}"
+        )
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
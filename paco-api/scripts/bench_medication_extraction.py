@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark local medication-mention extraction on a synthetic cohort
+
+Generates PaCo-style conversations (long motivational-interviewing assistant
+turns, patient turns that only sometimes mention medications), then reports
+tagging throughput in turns/sec and the prompt-token reduction from sending
+only relevant turns plus context to the analysis LLM.
+
+Usage: python scripts/bench_medication_extraction.py [--participants N] [--turns N]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.medication_extraction import (
+    estimate_tokens,
+    select_relevant_turns,
+    tag_turns
+)
+
+ASSISTANT_TURNS = [
+    "Thank you for talking with me today. I'd like to learn more about how things are going. "
+    "There are no right or wrong answers, I'm just here to listen and help if I can. Does that sound okay?",
+    "That sounds really hard. Thank you for being so honest with me. It takes courage to share that, "
+    "and I can hear how much you care about your health. Can you tell me more about that?",
+    "So if I'm understanding right, you want to feel better and you know it matters to you. "
+    "You've already thought about this a lot. What feels like the best first step for you?",
+    "I hear you. Many people feel the same way, and it's completely normal. "
+    "You are in control of your choices and I'm here to support whatever you decide.",
+    "What would be different for you if things were easier day to day? Take your time, "
+    "and feel free to share as much or as little as you're comfortable with.",
+    "Have you tried anything to help you remember to take your medicines, like an alarm or a pill box?",
+    "Are there things that get in the way, like cost, side effects, or forgetting?",
+]
+
+PATIENT_SMALLTALK = [
+    "Yes, that sounds fine.",
+    "I've been okay, my grandson visited this weekend.",
+    "I guess so. It's been a long week.",
+    "I walk to the mailbox most days but my legs hurt after a while.",
+    "Sure, I can talk for a few minutes.",
+    "I don't know, I try my best.",
+]
+
+PATIENT_MEDICATION = [
+    "I take my aspirin and the Plavix every morning with breakfast.",
+    "Sometimes I forget the evening pills if I fall asleep early.",
+    "The atorvastatin gives me muscle aches so I skipped it last week.",
+    "My lisinopril makes me dizzy when I stand up too fast.",
+    "I ran out of cilostazol and the pharmacy needed a new prescription.",
+    "The copay for Eliquis is too expensive this month.",
+    "My daughter set up a pill organizer and a phone reminder for me.",
+]
+
+
+def make_cohort(participants: int, turns: int, seed: int = 7):
+    rng = random.Random(seed)
+    cohort = []
+    for _ in range(participants):
+        conversation = []
+        for i in range(turns):
+            if i % 2 == 0:
+                conversation.append(("assistant", rng.choice(ASSISTANT_TURNS)))
+            elif rng.random() < 0.25:
+                conversation.append(("user", rng.choice(PATIENT_MEDICATION)))
+            else:
+                conversation.append(("user", rng.choice(PATIENT_SMALLTALK)))
+        cohort.append(conversation)
+    return cohort
+
+
+def render(conversation, indices=None) -> str:
+    if indices is None:
+        indices = range(len(conversation))
+    return "\n\n".join(f"{conversation[i][0].upper()}: {conversation[i][1]}" for i in indices)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--participants", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=120)
+    parser.add_argument("--context", type=int, default=1)
+    args = parser.parse_args()
+
+    cohort = make_cohort(args.participants, args.turns)
+    total_turns = sum(len(c) for c in cohort)
+
+    start = time.perf_counter()
+    tagged = [tag_turns(conversation) for conversation in cohort]
+    tag_seconds = time.perf_counter() - start
+
+    full_tokens = sent_tokens = kept_turns = 0
+    for conversation, tags in zip(cohort, tagged):
+        indices = select_relevant_turns(tags, args.context) or list(range(len(conversation)))
+        kept_turns += len(indices)
+        full_tokens += estimate_tokens(render(conversation))
+        sent_tokens += estimate_tokens(render(conversation, indices))
+
+    print(f"📊 Cohort: {args.participants} participants x {args.turns} turns = {total_turns} turns")
+    print(f"⚡ Tagging: {tag_seconds * 1000:.1f} ms ({total_turns / tag_seconds:,.0f} turns/sec)")
+    print(f"✂️  Turns kept: {kept_turns}/{total_turns} ({kept_turns / total_turns:.0%})")
+    print(
+        f"🔢 Prompt tokens (est.): {full_tokens:,} -> {sent_tokens:,} "
+        f"({1 - sent_tokens / full_tokens:.0%} fewer)"
+    )
+
+
+if __name__ == "__main__":
+    main()
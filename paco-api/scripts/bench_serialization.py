@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark /chat/history response serialization
+
+Compares the default FastAPI path (hand-built MessageResponse models, response_model
+re-validation, jsonable_encoder + json.dumps) with the fast path in
+app.core.responses (one from_attributes validation, pydantic-core JSON dump)
+at 50 / 500 / 5000 messages.
+
+Usage: python scripts/bench_serialization.py [--repeat N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.core.responses import serialize_model
+from app.schemas.conversation import ConversationHistoryResponse, MessageResponse
+
+
+class FakeRow:
+    """Stand-in for a Conversation ORM row (attribute access only)"""
+
+    def __init__(self, i: int, start: datetime):
+        self.id = i
+        self.conversation_id = "conv_20250101120000_RID001"
+        self.role = "user" if i % 2 else "assistant"
+        self.content = (
+            "Thank you for sharing that. It sounds like remembering your evening "
+            "medicine has been hard lately. What do you think might help? " * 2
+        )
+        self.timestamp = start + timedelta(seconds=i * 15)
+        self.model_used = None
+        self.audio_url = None
+
+
+def make_rows(n: int):
+    start = datetime(2025, 1, 1, 12, 0, 0)
+    return [FakeRow(i, start) for i in range(n)]
+
+
+def default_path(rows, field, loop) -> bytes:
+    """Replicates the original endpoint plus FastAPI's response handling"""
+    response = ConversationHistoryResponse(
+        messages=[
+            MessageResponse(
+                id=msg.id,
+                conversation_id=msg.conversation_id,
+                role=msg.role,
+                content=msg.content,
+                timestamp=msg.timestamp,
+                model_used=msg.model_used,
+                audio_url=msg.audio_url
+            )
+            for msg in rows
+        ],
+        total=len(rows),
+        research_id="RID001"
+    )
+    content = loop.run_until_complete(
+        serialize_response(field=field, response_content=response)
+    )
+    return JSONResponse(content).body
+
+
+def fast_path(rows) -> bytes:
+    return serialize_model(ConversationHistoryResponse, {
+        "messages": rows,
+        "total": len(rows),
+        "research_id": "RID001"
+    })
+
+
+def timeit(func, repeat: int) -> float:
+    """Best-of-`repeat` wall time in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    field = create_response_field(name="response", type_=ConversationHistoryResponse)
+    loop = asyncio.new_event_loop()
+
+    print(f"{'messages':>8}  {'default ms':>10}  {'fast ms':>8}  {'speedup':>7}  {'bytes':>9}")
+    for n in (50, 500, 5000):
+        rows = make_rows(n)
+        default_ms = timeit(lambda: default_path(rows, field, loop), args.repeat)
+        fast_ms = timeit(lambda: fast_path(rows), args.repeat)
+        size = len(fast_path(rows))
+        print(f"{n:>8}  {default_ms:>10.2f}  {fast_ms:>8.2f}  {default_ms / fast_ms:>6.1f}x  {size:>9}")
+
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark the local similarity vector index
+
+Embeds synthetic analysis summaries with the hashing embedder, writes them
+into a memory-mapped index in a temporary directory, then reports embedding
+throughput and top-k cosine query latency at increasing index sizes.
+
+Usage: python scripts/bench_similarity_index.py [--sizes 10000,100000] [--dim 1024]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.similarity_index import HashingEmbedder, SimilarityIndex
+from scripts.bench_medication_extraction import PATIENT_MEDICATION, PATIENT_SMALLTALK
+
+BATCH_SIZE = 5000
+
+
+def make_texts(n: int, seed: int = 3):
+    rng = random.Random(seed)
+    pool = PATIENT_MEDICATION + PATIENT_SMALLTALK
+    return [" ".join(rng.sample(pool, 3)) for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder(args.dim)
+    print(f"{'vectors':>9}  {'embed/s':>9}  {'index MB':>9}  {'p50 ms':>7}  {'p95 ms':>7}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            index = SimilarityIndex(directory, embedder)
+            texts = make_texts(size)
+
+            start = time.perf_counter()
+            for offset in range(0, size, BATCH_SIZE):
+                index.upsert(
+                    (offset + i + 1, (offset + i) // 3 + 1, text)
+                    for i, text in enumerate(texts[offset:offset + BATCH_SIZE])
+                )
+            embed_rate = size / (time.perf_counter() - start)
+
+            queries = [index.embed_query(text) for text in make_texts(args.queries, seed=5)]
+            samples = []
+            for vector in queries:
+                start = time.perf_counter()
+                index.search(vector, k=args.k)
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+
+            size_mb = os.path.getsize(os.path.join(directory, "vectors.f32")) / 1e6
+            print(
+                f"{size:>9,}  {embed_rate:>9,.0f}  {size_mb:>9.1f}  "
+                f"{statistics.median(samples):>7.2f}  {samples[int(len(samples) * 0.95) - 1]:>7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
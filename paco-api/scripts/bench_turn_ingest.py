@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark turn persistence: POST /chat/save-message vs the /chat/ws/ingest WebSocket
+
+Sends the same turns both ways against a running server and reports turns/sec
+and per-turn latency until the turn is committed (HTTP response / ack). With
+--server-pid (same host, Linux) it also reports server CPU milliseconds per
+turn from /proc/<pid>/stat.
+
+Usage: python scripts/bench_turn_ingest.py --research-id RID001
+           [--turns 500] [--sessions 5] [--server-pid PID]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.load_test_replay import login
+
+
+def cpu_seconds(pid: Optional[int]) -> float:
+    """utime + stime of a process (0 when not measuring)"""
+    if not pid:
+        return 0.0
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def make_turns(research_id: str, n: int, session: int) -> List[Dict]:
+    conversation_id = f"bench_{uuid.uuid4().hex[:12]}"
+    return [
+        {
+            "research_id": research_id,
+            "client_id": f"{session}-{i}",
+            "role": "user" if i % 2 else "assistant",
+            "content": f"Benchmark turn {i}: I take my evening pills with dinner most days.",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "provider": "elevenlabs",
+            "elevenlabs_conversation_id": conversation_id,
+            "elevenlabs_message_id": f"{conversation_id}_{i}"
+        }
+        for i in range(n)
+    ]
+
+
+def report(name: str, latencies: List[float], elapsed: float, cpu: float, pid: Optional[int]) -> None:
+    latencies.sort()
+    n = len(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(n * 0.95) - 1] * 1000
+    line = f"{name:<10} {n:>6} turns  {n / elapsed:>8.1f} turns/s  p50 {p50:>7.1f} ms  p95 {p95:>7.1f} ms"
+    if pid:
+        line += f"  server cpu {cpu / n * 1000:>6.2f} ms/turn"
+    print(line)
+
+
+async def http_session(client: httpx.AsyncClient, api: str, headers: Dict, turns: List[Dict]) -> List[float]:
+    """One widget sending each turn as its own request, as today"""
+    latencies = []
+    for turn in turns:
+        body = {k: v for k, v in turn.items() if k != "client_id"}
+        start = time.perf_counter()
+        response = await client.post(f"{api}/chat/save-message", json=body, headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def ws_session(url: str, turns: List[Dict]) -> List[float]:
+    """One widget streaming turns over a single connection"""
+    sent: Dict[str, float] = {}
+    latencies = []
+    async with websockets.connect(url) as ws:
+        async def receive_acks():
+            while len(latencies) < len(turns):
+                message = json.loads(await ws.recv())
+                if message["type"] != "ack":
+                    raise RuntimeError(message)
+                now = time.perf_counter()
+                latencies.extend(now - sent[ack["client_id"]] for ack in message["acks"])
+
+        receiver = asyncio.create_task(receive_acks())
+        for turn in turns:
+            sent[turn["client_id"]] = time.perf_counter()
+            await ws.send(json.dumps({k: v for k, v in turn.items() if k != "research_id"}))
+        await receiver
+    return latencies
+
+
+async def main_async(args) -> None:
+    api = args.base_url.rstrip("/") + "/api/v1"
+    per_session = args.turns // args.sessions
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        headers = await login(client, api, args.research_id)
+        token = headers["Authorization"].split(" ", 1)[1]
+
+        cpu = cpu_seconds(args.server_pid)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            http_session(client, api, headers, make_turns(args.research_id, per_session, s))
+            for s in range(args.sessions)
+        ))
+        report("http", [x for r in results for x in r], time.perf_counter() - start,
+               cpu_seconds(args.server_pid) - cpu, args.server_pid)
+
+    ws_url = args.base_url.replace("http", "ws", 1).rstrip("/") + f"/api/v1/chat/ws/ingest?token={token}"
+    cpu = cpu_seconds(args.server_pid)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        ws_session(ws_url, make_turns(args.research_id, per_session, s)) for s in range(args.sessions)
+    ))
+    report("websocket", [x for r in results for x in r], time.perf_counter() - start,
+           cpu_seconds(args.server_pid) - cpu, args.server_pid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--research-id", required=True, help="Must exist in the database")
+    parser.add_argument("--turns", type=int, default=500, help="Turns per transport")
+    parser.add_argument("--sessions", type=int, default=5, help="Concurrent widget sessions")
+    parser.add_argument("--server-pid", type=int, default=None, help="uvicorn PID for CPU accounting")
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
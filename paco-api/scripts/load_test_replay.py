@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Load-test /analyze and /sync-elevenlabs-conversation against replayed cassettes
+
+Record once with real keys (CASSETTE_MODE=record), then start the API on the
+offline box with CASSETTE_MODE=replay (optionally CASSETTE_LATENCY=0 to measure
+only our own overhead, and CASSETTE_STRICT=false to reuse recordings for any
+research ID) and point this script at it. Reports throughput and latency
+percentiles per endpoint.
+
+Usage: python scripts/load_test_replay.py --research-ids RID001,RID002
+           --conversation-ids conv_abc [--requests 200] [--concurrency 10]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def login(client: httpx.AsyncClient, api: str, research_id: str) -> Dict[str, str]:
+    body = {"research_id": research_id, "ip_address": "127.0.0.1"}
+    await client.post(f"{api}/auth/acknowledge-disclaimer", json=body)
+    response = await client.post(f"{api}/auth/login", json={**body, "user_agent": "load_test_replay"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run(name: str, n: int, concurrency: int, make_request) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await make_request(i)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{name:<8} {n:>6} req  {n / elapsed:>8.1f} req/s  "
+          f"p50 {p50:>8.1f} ms  p95 {p95:>8.1f} ms  max {latencies[-1] * 1000:>8.1f} ms  "
+          f"status {dict(statuses)}")
+
+
+async def main_async(args) -> None:
+    api = args.base_url.rstrip("/") + "/api/v1"
+    research_ids = [r.strip() for r in args.research_ids.split(",") if r.strip()]
+    conversation_ids = [c.strip() for c in args.conversation_ids.split(",") if c.strip()]
+    password = args.admin_password or os.getenv("ADMIN_PASSWORD", "")
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        print(f"🔑 Logging in {len(research_ids)} research IDs...")
+        headers = {research_id: await login(client, api, research_id) for research_id in research_ids}
+
+        if conversation_ids:
+            async def sync(i: int) -> httpx.Response:
+                research_id = research_ids[i % len(research_ids)]
+                return await client.post(
+                    f"{api}/chat/sync-elevenlabs-conversation",
+                    json={
+                        "research_id": research_id,
+                        "elevenlabs_conversation_id": conversation_ids[i % len(conversation_ids)]
+                    },
+                    headers=headers[research_id]
+                )
+            await run("sync", args.requests, args.concurrency, sync)
+
+        if not args.skip_analyze:
+            async def analyze(i: int) -> httpx.Response:
+                return await client.post(
+                    f"{api}/medication-analysis/analyze",
+                    params={"password": password},
+                    json={"research_id": research_ids[i % len(research_ids)]}
+                )
+            await run("analyze", args.requests, args.concurrency, analyze)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--research-ids", required=True, help="Comma-separated, must exist in the database")
+    parser.add_argument("--conversation-ids", default="", help="Comma-separated recorded ElevenLabs conversation IDs")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--admin-password", default="", help="Defaults to ADMIN_PASSWORD from .env")
+    parser.add_argument("--skip-analyze", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
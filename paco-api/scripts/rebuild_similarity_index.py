@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Rebuild the local similarity vector index from stored analyses
+
+New analyses are indexed as they are written; run this once to index existing
+rows, or after changing SIMILARITY_EMBEDDER / SIMILARITY_DIM.
+
+Usage: python scripts/rebuild_similarity_index.py
+"""
+import os
+import shutil
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from app.core.config import get_settings
+from app.db.base import SessionLocal
+from app.models.database import MedicationAdherenceAnalysis
+from app.services.similarity_index import analysis_text, get_similarity_index
+
+BATCH_SIZE = 500
+
+
+def main():
+    settings = get_settings()
+    # Start from an empty directory so a changed embedder/dim is not rejected
+    shutil.rmtree(settings.SIMILARITY_INDEX_DIR, ignore_errors=True)
+    index = get_similarity_index()
+    index.reset()
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        last_id = 0
+        total = 0
+        while True:
+            batch = db.query(MedicationAdherenceAnalysis).filter(
+                MedicationAdherenceAnalysis.id > last_id
+            ).order_by(MedicationAdherenceAnalysis.id).limit(BATCH_SIZE).all()
+            if not batch:
+                break
+            total += index.upsert(
+                (analysis.id, analysis.research_id_fk, analysis_text(analysis)) for analysis in batch
+            )
+            last_id = batch[-1].id
+            print(f"  ...{total} analyses")
+
+        print(
+            f"✅ Indexed {total} analyses into {settings.SIMILARITY_INDEX_DIR} "
+            f"({settings.SIMILARITY_EMBEDDER}, dim={settings.SIMILARITY_DIM}) in {time.perf_counter() - start:.1f}s"
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
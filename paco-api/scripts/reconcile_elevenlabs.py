@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Run one ElevenLabs reconciliation pass (for cron, or a one-off backfill)
+
+Lists ELEVENLABS_AGENT_ID's conversations since the stored high-water mark,
+stores any transcripts that are missing or incomplete and advances the mark.
+--since overrides the mark for this run, e.g. to backfill from a date.
+
+Usage: python scripts/reconcile_elevenlabs.py [--since 2025-01-01] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from app.core.config import get_settings
+from app.services.elevenlabs_reconciler import ConversationReconciler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--since", default=None, help="ISO date/time (UTC) to list conversations from")
+    parser.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if not settings.ELEVENLABS_AGENT_ID:
+        parser.error("ELEVENLABS_AGENT_ID is not set")
+
+    since = None
+    if args.since:
+        since = int(datetime.fromisoformat(args.since).replace(tzinfo=timezone.utc).timestamp())
+
+    reconciler = ConversationReconciler(
+        settings.ELEVENLABS_AGENT_ID,
+        args.concurrency or settings.RECONCILE_CONCURRENCY,
+        settings.RECONCILE_LOOKBACK_SECONDS
+    )
+    summary = asyncio.run(reconciler.run_once(since=since))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Rebuild the medication mentions cohort index from stored analyses
+
+The migration backfills existing analyses once; run this after changing the
+normalization (e.g. new SYNONYMS) so older rows use the same terms.
+
+Usage: python scripts/reindex_medication_mentions.py [--research-id RID001]
+"""
+import argparse
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from app.db.base import SessionLocal
+from app.models.database import MedicationAdherenceAnalysis, ResearchID
+from app.services.medication_index import medication_index_service
+
+BATCH_SIZE = 500
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--research-id", help="Only reindex this research ID")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(MedicationAdherenceAnalysis).order_by(MedicationAdherenceAnalysis.id)
+        if args.research_id:
+            query = query.join(ResearchID).filter(ResearchID.research_id == args.research_id)
+
+        analyses = written = 0
+        last_id = 0
+        while True:
+            batch = query.filter(MedicationAdherenceAnalysis.id > last_id).limit(BATCH_SIZE).all()
+            if not batch:
+                break
+            written += medication_index_service.reindex(db, batch)
+            db.commit()
+            analyses += len(batch)
+            last_id = batch[-1].id
+            print(f"  ...{analyses} analyses")
+
+        print(f"✅ Reindexed {analyses} analyses ({written} mention rows)")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Reindex failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Report transcript compaction savings on real conversation data
+
+For every research ID with messages (or only --research-id), builds the analysis
+transcript the same way /analyze does and prints estimated tokens for the full,
+compacted and sent transcripts plus the compaction reduction ratio. Read-only.
+
+Usage: python scripts/report_transcript_compaction.py [--research-id RID001]
+"""
+import argparse
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from app.db.base import SessionLocal
+from app.models.database import Conversation, ResearchID
+from app.services.medication_analysis_service import MedicationAnalysisService
+from app.services.medication_extraction import estimate_tokens
+from app.services.transcript_compaction import compact_transcript
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--research-id", help="Only report this research ID")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Duplicate Jaccard threshold")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        query = db.query(ResearchID).order_by(ResearchID.research_id)
+        if args.research_id:
+            query = query.filter(ResearchID.research_id == args.research_id)
+
+        print(f"{'research_id':<14}  {'turns':>6}  {'dupes':>6}  {'full':>8}  {'compacted':>9}  {'sent':>8}  {'ratio':>6}")
+        totals = [0, 0, 0]
+        for research_user in query.all():
+            messages = db.query(Conversation).filter(
+                Conversation.research_id_fk == research_user.id
+            ).order_by(Conversation.timestamp).all()
+            if not messages:
+                continue
+
+            compaction = compact_transcript(
+                [(msg.role, msg.content) for msg in messages],
+                args.threshold
+            )
+            kept = [i for i, content in enumerate(compaction.contents) if content is not None]
+            full = estimate_tokens(MedicationAnalysisService.format_transcript(messages))
+            compacted = estimate_tokens(
+                MedicationAnalysisService.format_transcript(messages, kept, compaction.contents)
+            )
+            sent = estimate_tokens(MedicationAnalysisService.build_analysis_transcript(messages))
+            totals = [totals[0] + full, totals[1] + compacted, totals[2] + sent]
+
+            print(
+                f"{research_user.research_id:<14}  {len(messages):>6}  {compaction.duplicates_dropped:>6}  "
+                f"{full:>8,}  {compacted:>9,}  {sent:>8,}  {1 - compacted / full:>6.0%}"
+            )
+
+        if totals[0]:
+            print(
+                f"\n📊 Total tokens (est.): {totals[0]:,} full -> {totals[1]:,} compacted "
+                f"({1 - totals[1] / totals[0]:.0%} fewer) -> {totals[2]:,} sent "
+                f"({1 - totals[2] / totals[0]:.0%} fewer)"
+            )
+        else:
+            print("\n⚠️  No conversations found")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for ElevenLabs' post-call transcript webhook
+
+Signs post_call_transcription payloads with ELEVENLABS_WEBHOOK_SECRET and POSTs
+them to /webhooks/elevenlabs, the way ElevenLabs does after a call. The
+transcript is synthetic, or taken from --from-file (a saved
+GET /v1/convai/conversations/{id} response or webhook body). Sending the same
+conversation again (--repeat) should store nothing new.
+
+Usage: python scripts/send_elevenlabs_webhook.py --research-id RID001
+           [--conversations 1] [--turns 10] [--repeat 1] [--from-file conv.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.elevenlabs_webhook import SIGNATURE_HEADER, TRANSCRIPT_EVENT, sign_payload
+
+
+def synthetic_conversation(research_id: str, turns: int) -> dict:
+    return {
+        "agent_id": "local-stand-in",
+        "conversation_id": f"conv_{uuid.uuid4().hex[:20]}",
+        "status": "done",
+        "transcript": [
+            {
+                "role": "agent" if i % 2 == 0 else "user",
+                "message": f"Stand-in turn {i}: how are your evening medications going?",
+                "time_in_call_secs": i * 7
+            }
+            for i in range(turns)
+        ],
+        "metadata": {"start_time_unix_secs": int(time.time()) - turns * 7},
+        "conversation_initiation_client_data": {"dynamic_variables": {"research_id": research_id}}
+    }
+
+
+async def send(client: httpx.AsyncClient, url: str, secret: str, data: dict) -> int:
+    body = json.dumps({"type": TRANSCRIPT_EVENT, "event_timestamp": int(time.time()), "data": data}).encode()
+    response = await client.post(url, content=body, headers={
+        "Content-Type": "application/json",
+        SIGNATURE_HEADER: sign_payload(body, secret)
+    })
+    return response.status_code
+
+
+async def main_async(args) -> None:
+    if args.from_file:
+        with open(args.from_file) as f:
+            loaded = json.load(f)
+        conversations = [loaded.get("data", loaded)]
+        conversations[0].setdefault("conversation_initiation_client_data", {}).setdefault(
+            "dynamic_variables", {}
+        ).setdefault("research_id", args.research_id)
+    else:
+        conversations = [synthetic_conversation(args.research_id, args.turns) for _ in range(args.conversations)]
+
+    url = args.base_url.rstrip("/") + "/webhooks/elevenlabs"
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        for attempt in range(args.repeat):
+            start = time.perf_counter()
+            statuses = await asyncio.gather(*(send(client, url, args.secret, c) for c in conversations))
+            elapsed = time.perf_counter() - start
+            counts = {status: statuses.count(status) for status in sorted(set(statuses))}
+            print(f"round {attempt + 1}: {len(statuses)} deliveries in {elapsed * 1000:.0f} ms, status {counts}")
+    print("conversation IDs:", ", ".join(c["conversation_id"] for c in conversations[:5]),
+          "..." if len(conversations) > 5 else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--secret", default=os.environ.get("ELEVENLABS_WEBHOOK_SECRET", ""))
+    parser.add_argument("--research-id", required=True, help="Sent as the research_id dynamic variable")
+    parser.add_argument("--conversations", type=int, default=1)
+    parser.add_argument("--turns", type=int, default=10, help="Turns per synthetic conversation")
+    parser.add_argument("--repeat", type=int, default=1, help="Deliver everything this many times")
+    parser.add_argument("--from-file", default=None)
+    args = parser.parse_args()
+    if not args.secret:
+        parser.error("--secret or ELEVENLABS_WEBHOOK_SECRET is required")
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Shared fixtures: the app against a throwaway SQLite database
+
+Settings are read once at import, so the environment is set up before the
+app is imported. Query budgets are enforced (QUERY_DEBUG + QUERY_BUDGET_STRICT).
+QueryBudgetMiddleware checks the count only after the response has been sent,
+so an overrun is not a 500: the client has already seen the endpoint's status,
+and the test client re-raises QueryBudgetExceeded from the request call. Assert
+on that exception (pytest.raises), not on a status code.
+"""
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="paco-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_tmp}/paco.db",
+    "SECRET_KEY": "test-secret",
+    "ADMIN_PASSWORD": "admin",
+    "GROQ_API_KEY": "test",
+    "ELEVENLABS_API_KEY": "test",
+    "AUDIO_CACHE_DIR": f"{_tmp}/audio",
+    "SIMILARITY_INDEX_DIR": f"{_tmp}/vector_index",
+    "CASSETTE_DIR": f"{_tmp}/cassettes",
+    "RECONCILE_INTERVAL_SECONDS": "0",
+    "QUERY_DEBUG": "true",
+    "QUERY_BUDGET_STRICT": "true",
+    "LOG_LEVEL": "ERROR",
+})
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.db.base import Base, SessionLocal, engine
+from app.main import app
+from app.models.database import ResearchID
+from app.services import elevenlabs_webhook
+from app.services.conversation_search import ensure_sqlite_fts
+from app.services.research_id_resolver import research_id_resolver
+
+RESEARCH_ID = "RID001"
+
+
+@pytest.fixture(autouse=True)
+def database():
+    """Fresh schema for every test"""
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS paco_conversations_fts"))
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        ensure_sqlite_fts(connection)
+    research_id_resolver.invalidate()
+    elevenlabs_webhook._webhook_queue = None  # Bound to the previous test's event loop
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def research_user(db):
+    user = ResearchID(research_id=RESEARCH_ID, is_active=True)
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def auth_headers(client, research_user):
+    identity = {"research_id": RESEARCH_ID, "ip_address": "127.0.0.1", "user_agent": "pytest"}
+    assert client.post("/api/v1/auth/acknowledge-disclaimer", json=identity).status_code == 200
+    response = client.post("/api/v1/auth/login", json=identity)
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,51 @@
+"""
+Analysis transcript building: token metrics on every path
+"""
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import get_settings
+from app.services.medication_analysis_service import TRANSCRIPT_TOKENS, medication_analysis_service
+
+
+def turns(*contents):
+    return [
+        SimpleNamespace(role="user" if i % 2 else "assistant", content=content, timestamp=datetime(2025, 1, 1, 9, 0, i))
+        for i, content in enumerate(contents)
+    ]
+
+
+@pytest.fixture
+def prefilter(monkeypatch):
+    monkeypatch.setattr(get_settings(), "ANALYSIS_PREFILTER_ENABLED", True)
+    monkeypatch.setattr(get_settings(), "ANALYSIS_COMPACTION_ENABLED", False)
+
+
+def sent(prefilter):
+    return TRANSCRIPT_TOKENS.get(stage="sent", prefilter=prefilter)
+
+
+def test_fallback_transcript_is_counted(prefilter):
+    before = sent("fallback")
+
+    transcript = medication_analysis_service.build_analysis_transcript(
+        turns("How was your walk today?", "Good, I went around the park twice.")
+    )
+
+    assert "park" in transcript
+    assert sent("fallback") - before > 0
+
+
+def test_filtered_transcript_is_counted_apart(prefilter):
+    before_filtered, before_fallback = sent("filtered"), sent("fallback")
+
+    medication_analysis_service.build_analysis_transcript(turns(
+        "How was your walk today?", "Good, I went around the park twice.",
+        "Anything else?", "I keep forgetting my metformin at night.",
+        "Thanks for sharing.", "The weather was nice."
+    ))
+
+    assert sent("filtered") - before_filtered > 0
+    assert sent("fallback") == before_fallback
@@ -0,0 +1,78 @@
+"""
+/chat/stream and the rolling conversation summary
+"""
+import asyncio
+
+import pytest
+
+from app.core.config import get_settings
+from app.models.database import ConversationSummary
+from app.schemas.conversation import StreamChatRequest
+from app.services import context_window
+from app.services.llm_service import llm_service
+
+from tests.conftest import RESEARCH_ID
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Streams a fixed reply; summary calls wait until `release` is set"""
+    release = asyncio.Event()
+
+    async def stream_chat_completion(messages, model="llama-3.3-70b-versatile", **kwargs):
+        yield "Take it "
+        yield "with food."
+
+    async def get_chat_completion(messages, model="llama-3.3-70b-versatile", **kwargs):
+        await release.wait()
+        return "Patient asked about taking pills with food."
+
+    monkeypatch.setattr(llm_service, "stream_chat_completion", stream_chat_completion)
+    monkeypatch.setattr(llm_service, "get_chat_completion", get_chat_completion)
+    monkeypatch.setattr(get_settings(), "CHAT_HISTORY_MESSAGES", 2)
+    monkeypatch.setattr(get_settings(), "CHAT_SUMMARY_BATCH", 2)
+    return release
+
+
+def stream(client, auth_headers, message):
+    response = client.post("/api/v1/chat/stream", headers=auth_headers, json={
+        "research_id": RESEARCH_ID, "conversation_id": "conv_chat", "message": message
+    })
+    assert response.status_code == 200, response.text
+    return response.text
+
+
+def test_summary_refresh_does_not_hold_the_stream(client, auth_headers, db, fake_llm):
+    for i in range(2):
+        assert "event: done" in stream(client, auth_headers, f"Question {i}")
+
+    # Four stored turns, two over the verbatim window: the refresh starts,
+    # but the stream finishes while the summary call is still waiting
+    assert "event: done" in stream(client, auth_headers, "Question 2")
+    assert db.query(ConversationSummary).count() == 0
+    assert len(context_window._refresh_tasks) == 1
+
+    async def finish_refresh():
+        fake_llm.set()
+        await asyncio.gather(*context_window._refresh_tasks)
+    client.portal.call(finish_refresh)
+
+    summary = db.query(ConversationSummary).one()
+    assert summary.summary == "Patient asked about taking pills with food."
+    assert summary.summarized_messages == 2
+
+
+def test_model_outside_the_allow_list_is_rejected(client, auth_headers, fake_llm):
+    response = client.post("/api/v1/chat/stream", headers=auth_headers, json={
+        "research_id": RESEARCH_ID, "message": "Hi", "model": "some-expensive-model"
+    })
+
+    assert response.status_code == 422
+    assert "llama-3.3-70b-versatile" in response.text
+
+
+def test_model_defaults_to_the_first_allowed(monkeypatch):
+    monkeypatch.setattr(get_settings(), "CHAT_MODELS", "model-a, model-b")
+
+    assert StreamChatRequest(research_id=RESEARCH_ID, message="Hi").model == "model-a"
+    assert StreamChatRequest(research_id=RESEARCH_ID, message="Hi", model="model-b").model == "model-b"
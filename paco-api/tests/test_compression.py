@@ -0,0 +1,35 @@
+"""
+CompressionMiddleware and validators of re-encoded bodies
+"""
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware
+
+BODY = b'{"summary": "' + b"metformin every morning " * 200 + b'"}'
+
+
+def compressed_app() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/doc")
+    async def doc():
+        return Response(BODY, media_type="application/json", headers={"ETag": '"latest-1-abc"'})
+
+    app.add_middleware(CompressionMiddleware, minimum_size=500, encodings="gzip")
+    return TestClient(app)
+
+
+def test_compressed_body_gets_a_weak_etag():
+    response = compressed_app().get("/doc", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == 'W/"latest-1-abc"'
+    assert response.content == BODY
+
+
+def test_identity_body_keeps_its_strong_etag():
+    response = compressed_app().get("/doc", headers={"Accept-Encoding": "identity"})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == '"latest-1-abc"'
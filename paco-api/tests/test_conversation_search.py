@@ -0,0 +1,28 @@
+"""
+Full-text search snippets
+"""
+from app.services.conversation_search import MATCH_START, MATCH_STOP, render_snippet
+
+from tests.conftest import RESEARCH_ID
+
+
+def test_snippets_escape_patient_content(client, auth_headers):
+    response = client.post("/api/v1/chat/save-message", headers=auth_headers, json={
+        "research_id": RESEARCH_ID, "role": "user",
+        "content": 'I took my pills <img src=x onerror="alert(1)"> & felt fine',
+        "timestamp": "2025-01-02T09:00:00Z",
+    })
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/v1/medication-analysis/search", params={"password": "admin", "q": "pills"})
+
+    assert response.status_code == 200, response.text
+    snippet = response.json()["results"][0]["snippet"]
+    assert "<img" not in snippet
+    assert "&lt;img src=x onerror=&quot;alert(1)&quot;&gt; &amp; felt" in snippet
+    assert "<mark>pills</mark>" in snippet
+
+
+def test_render_snippet_marks_only_sentinels():
+    assert render_snippet(f"{MATCH_START}<b>{MATCH_STOP} ok") == "<mark>&lt;b&gt;</mark> ok"
+    assert render_snippet(None) is None
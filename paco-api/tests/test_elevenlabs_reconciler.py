@@ -0,0 +1,95 @@
+"""
+ConversationReconciler against a faked ElevenLabs API
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.services import elevenlabs_reconciler, turn_ingest
+from app.services.elevenlabs_reconciler import ConversationReconciler, load_high_water_mark
+
+from tests.test_transcript_ingest import TRANSCRIPT, conversation, save_live, stored
+
+START = 1735689600
+
+
+@pytest.fixture
+def elevenlabs(monkeypatch):
+    """Conversations the fake API lists and returns, by ID"""
+    conversations = {}
+
+    async def list_conversations(agent_id, call_start_after_unix=None, cursor=None):
+        listed = [
+            {
+                "conversation_id": conversation_id,
+                "status": "done",
+                "start_time_unix_secs": data["metadata"]["start_time_unix_secs"],
+                "message_count": len(data["transcript"]),
+            }
+            for conversation_id, data in conversations.items()
+        ]
+        return {"status_code": 200, "text": json.dumps({"conversations": listed, "has_more": False})}
+
+    async def get_conversation(conversation_id):
+        return {"status_code": 200, "text": json.dumps(conversations[conversation_id])}
+
+    client = elevenlabs_reconciler.elevenlabs_client
+    monkeypatch.setattr(client, "list_conversations", list_conversations)
+    monkeypatch.setattr(client, "get_conversation", get_conversation)
+    return conversations
+
+
+def run_once():
+    return asyncio.run(ConversationReconciler("agent_test", 4, 0).run_once())
+
+
+def test_partly_saved_conversation_is_completed_without_duplicates(client, auth_headers, db, elevenlabs):
+    # The tab closed after two live turns; the transcript has three
+    save_live(client, auth_headers, "conv_closed", TRANSCRIPT[:2])
+    elevenlabs["conv_closed"] = conversation("conv_closed")
+
+    summary = run_once()
+
+    assert summary["updated"] == 1
+    assert summary["saved"] == 1 and summary["duplicate"] == 2
+    assert [row.content for row in stored(db, "conv_closed")] == [entry["message"] for entry in TRANSCRIPT]
+    assert run_once()["unchanged"] == 1
+
+
+def test_write_failure_is_retried_next_run(db, research_user, elevenlabs, monkeypatch):
+    for offset, conversation_id in enumerate(["conv_a", "conv_b", "conv_c"]):
+        elevenlabs[conversation_id] = conversation(conversation_id)
+        elevenlabs[conversation_id]["metadata"]["start_time_unix_secs"] = START + offset
+
+    def sync_transcript(db, research_id_fk, conversation_id, data, thread):
+        if conversation_id == "conv_b":
+            raise RuntimeError("write failed")
+        return original(db, research_id_fk, conversation_id, data, thread)
+    original = turn_ingest.sync_transcript
+    monkeypatch.setattr(turn_ingest, "sync_transcript", sync_transcript)
+
+    summary = run_once()
+
+    assert summary["write_failed"] == 1
+    assert summary["saved"] == 2 * len(TRANSCRIPT)
+    assert load_high_water_mark() == START  # Stops just before conv_b
+
+    monkeypatch.setattr(turn_ingest, "sync_transcript", original)
+    summary = run_once()
+    assert summary["write_failed"] == 0 and summary["missing"] == 1
+    assert len(stored(db, "conv_b")) == len(TRANSCRIPT)
+    assert load_high_water_mark() == START + 2
+
+
+def test_failed_batch_does_not_abort_the_run(db, research_user, elevenlabs, monkeypatch):
+    elevenlabs["conv_a"] = conversation("conv_a")
+
+    def write_transcripts(conversations):
+        raise RuntimeError("database unavailable")
+    monkeypatch.setattr(elevenlabs_reconciler, "write_transcripts", write_transcripts)
+
+    summary = run_once()
+
+    assert summary["write_failed"] == 1
+    assert load_high_water_mark() == START - 1  # conv_a is listed again next run
@@ -0,0 +1,75 @@
+"""
+LLM usage rows are written off the event loop, in batches, and budget checks
+see what is not written yet
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.core.config import get_settings
+from app.models.database import LLMUsage
+from app.services import llm_usage
+from app.services.llm_usage import LLMBudgetExceeded, llm_usage_service
+
+
+def test_record_buffers_rows_until_the_background_insert(db):
+    async def calls():
+        for i in range(3):
+            llm_usage_service.record("chat", "llama-3.3-70b-versatile", 100 + i, 20, 0.5)
+        buffered = db.query(LLMUsage).count()  # Nothing written on the calling coroutine
+        await llm_usage_service.flush()
+        return buffered
+
+    assert asyncio.run(calls()) == 0
+    assert sorted(row.prompt_tokens for row in db.query(LLMUsage).all()) == [100, 101, 102]
+
+
+def test_record_without_event_loop_writes_immediately(db):
+    llm_usage_service.record("script", "llama-3.3-70b-versatile", 10, 5, 0.1, status="error")
+
+    row, = db.query(LLMUsage).all()
+    assert (row.caller, row.status, row.latency_ms) == ("script", "error", 100)
+
+
+@pytest.fixture
+def daily_budget(monkeypatch):
+    monkeypatch.setattr(llm_usage, "_pending_usage", llm_usage.PendingUsage())
+    monkeypatch.setattr(get_settings(), "LLM_DAILY_TOKEN_BUDGET", 1000)
+
+
+def test_passing_checks_reserve_their_estimate(db, daily_budget):
+    llm_usage_service.check_budget(db, estimated_tokens=600)
+
+    # Nothing recorded yet, but the first call's estimate is held
+    with pytest.raises(LLMBudgetExceeded) as exceeded:
+        llm_usage_service.check_budget(db, estimated_tokens=600)
+    assert exceeded.value.used == 600
+
+
+def test_buffered_usage_counts_until_written(db, daily_budget):
+    async def calls():
+        reservation = llm_usage_service.check_budget(db, estimated_tokens=600)
+        llm_usage_service.record("chat", "llama-3.3-70b-versatile", 250, 50, 0.5, reservation=reservation)
+        # The reservation became the real 300 tokens, still only buffered
+        with pytest.raises(LLMBudgetExceeded) as exceeded:
+            llm_usage_service.check_budget(db, estimated_tokens=750)
+        assert exceeded.value.used == 300
+        await llm_usage_service.flush()
+
+    asyncio.run(calls())
+
+    # Written rows are counted once, from the table
+    assert llm_usage._pending_usage.used(datetime.utcnow().date(), None) == (0, 0)
+    with pytest.raises(LLMBudgetExceeded) as exceeded:
+        llm_usage_service.check_budget(db, estimated_tokens=750)
+    assert exceeded.value.used == 300
+    llm_usage_service.check_budget(db, estimated_tokens=700)
+
+
+def test_settled_reservation_is_released(db, daily_budget):
+    reservation = llm_usage_service.check_budget(db, estimated_tokens=600)
+    reservation.settle()
+    reservation.settle()
+
+    llm_usage_service.check_budget(db, estimated_tokens=1000)
@@ -0,0 +1,37 @@
+"""
+Cohort queries over the medication mention index
+"""
+import json
+from datetime import datetime, timezone
+
+from app.models.database import MedicationAdherenceAnalysis
+from app.services.medication_index import medication_index_service
+
+from tests.conftest import RESEARCH_ID
+
+
+def add_analysis(db, research_user, analysis_date, medications):
+    analysis = MedicationAdherenceAnalysis(
+        research_id_fk=research_user.id,
+        analysis_date=analysis_date,
+        analyzed_from=analysis_date,
+        analyzed_to=analysis_date,
+        medication_list=json.dumps([{"name": name} for name in medications]),
+        summary="Analysis completed."
+    )
+    db.add(analysis)
+    db.flush()
+    medication_index_service.index_analysis(db, analysis)
+    db.commit()
+    return analysis
+
+
+def test_latest_analysis_is_chosen_by_date_not_id(db, research_user):
+    current = add_analysis(db, research_user, datetime(2025, 3, 1, tzinfo=timezone.utc), ["metformin"])
+    # Backfilled later, so it has the higher id but describes an older period
+    add_analysis(db, research_user, datetime(2025, 1, 1, tzinfo=timezone.utc), ["metformin", "lisinopril"])
+
+    assert medication_index_service.query_cohort(db, medication="lisinopril") == []
+    match, = medication_index_service.query_cohort(db, medication="metformin")
+    assert (match["research_id"], match["analysis_id"]) == (RESEARCH_ID, current.id)
+    assert len(medication_index_service.query_cohort(db, medication="metformin", latest_only=False)) == 2
@@ -0,0 +1,142 @@
+"""
+Every endpoint with a @query_budget, called in strict mode
+
+conftest enables QUERY_DEBUG and QUERY_BUDGET_STRICT, so a request that runs
+more statements than its budget raises QueryBudgetExceeded here. Calls run
+against a participant with a few conversations and a stored analysis, so
+per-row queries (N+1) show up as overruns.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.main import app
+from app.api.endpoints import chat
+from app.services import elevenlabs_client as elevenlabs_client_module
+from app.services.llm_service import llm_service
+
+from tests.conftest import RESEARCH_ID
+from tests.test_transcript_ingest import TRANSCRIPT, conversation
+
+ADMIN = {"password": "admin"}
+ANALYSIS = {
+    "summary": "Takes metformin every morning; occasional nausea.",
+    "confidence_score": 80,
+    "overall_adherence": {"taking_medications": True, "taking_as_prescribed": True},
+    "medications": [{"name": "metformin", "dosage": "500 mg"}],
+    "side_effects": [{"medication": "metformin", "effect": "nausea", "severity": "mild"}],
+    "adherence_difficulties": [{"type": "forgetting", "description": "Misses evening doses"}],
+    "adherence_strategies": [{"type": "routine", "description": "Pill box", "effectiveness": "working well"}],
+}
+
+# (method, route template, path, request kwargs)
+CALLS = [
+    ("POST", "/api/v1/auth/validate-research-id", "/api/v1/auth/validate-research-id",
+     {"json": {"research_id": RESEARCH_ID}}),
+    ("POST", "/api/v1/auth/acknowledge-disclaimer", "/api/v1/auth/acknowledge-disclaimer",
+     {"json": {"research_id": RESEARCH_ID, "ip_address": "127.0.0.1"}}),
+    ("POST", "/api/v1/auth/login", "/api/v1/auth/login",
+     {"json": {"research_id": RESEARCH_ID, "ip_address": "127.0.0.1", "user_agent": "pytest"}}),
+    ("GET", "/api/v1/auth/me", "/api/v1/auth/me", {}),
+    ("POST", "/api/v1/chat/save-message", "/api/v1/chat/save-message", {"json": {
+        "research_id": RESEARCH_ID, "role": "user", "content": "I took my pills",
+        "timestamp": "2025-01-02T09:00:00Z", "provider": "elevenlabs",
+        "elevenlabs_conversation_id": "conv_budget", "elevenlabs_message_id": "conv_budget:0"
+    }}),
+    ("POST", "/api/v1/chat/stream", "/api/v1/chat/stream",
+     {"json": {"research_id": RESEARCH_ID, "conversation_id": "conv_seed_0", "message": "Should I eat first?"}}),
+    ("POST", "/api/v1/chat/tts", "/api/v1/chat/tts", {"json": {"text": "Hello", "message_id": 1}}),
+    ("POST", "/api/v1/chat/history", "/api/v1/chat/history", {"json": {"research_id": RESEARCH_ID}}),
+    ("GET", "/api/v1/chat/conversations", "/api/v1/chat/conversations", {}),
+    ("GET", "/api/v1/chat/conversations/elevenlabs", "/api/v1/chat/conversations/elevenlabs", {}),
+    ("POST", "/api/v1/chat/sync-elevenlabs-conversation", "/api/v1/chat/sync-elevenlabs-conversation",
+     {"json": {"research_id": RESEARCH_ID, "elevenlabs_conversation_id": "conv_seed_1"}}),
+    ("POST", "/api/v1/admin/research-ids", "/api/v1/admin/research-ids",
+     {"json": {"data": {"research_id": "RID002"}, "auth": ADMIN}}),
+    ("GET", "/api/v1/admin/research-ids", "/api/v1/admin/research-ids", {"json": ADMIN}),
+    ("PATCH", "/api/v1/admin/research-ids/{research_id_str}", "/api/v1/admin/research-ids/RID001",
+     {"json": {"data": {"notes": "budget test"}, "auth": ADMIN}}),
+    ("DELETE", "/api/v1/admin/research-ids/{research_id_str}", "/api/v1/admin/research-ids/RID003",
+     {"json": ADMIN}),
+    ("POST", "/api/v1/admin/stats", "/api/v1/admin/stats", {"json": ADMIN}),
+    ("POST", "/api/v1/admin/llm-usage", "/api/v1/admin/llm-usage", {"json": {**ADMIN, "group_by": "research_id"}}),
+    ("POST", "/api/v1/medication-analysis/analyze", "/api/v1/medication-analysis/analyze",
+     {"params": ADMIN, "json": {"research_id": RESEARCH_ID}}),
+    ("GET", "/api/v1/medication-analysis/history/{research_id}", f"/api/v1/medication-analysis/history/{RESEARCH_ID}",
+     {"params": ADMIN}),
+    ("GET", "/api/v1/medication-analysis/latest/{research_id}", f"/api/v1/medication-analysis/latest/{RESEARCH_ID}",
+     {"params": ADMIN}),
+    ("GET", "/api/v1/medication-analysis/transcript/{research_id}",
+     f"/api/v1/medication-analysis/transcript/{RESEARCH_ID}", {"params": ADMIN}),
+    ("GET", "/api/v1/medication-analysis/cohort", "/api/v1/medication-analysis/cohort",
+     {"params": {**ADMIN, "medication": "metformin"}}),
+    ("GET", "/api/v1/medication-analysis/search", "/api/v1/medication-analysis/search",
+     {"params": {**ADMIN, "q": "pills"}}),
+    ("GET", "/api/v1/medication-analysis/similar", "/api/v1/medication-analysis/similar",
+     {"params": {**ADMIN, "research_id": RESEARCH_ID}}),
+    ("POST", "/webhooks/elevenlabs", "/webhooks/elevenlabs", {"content": b"{}"}),
+]
+
+
+@pytest.fixture
+def fake_providers(monkeypatch):
+    """Groq, ElevenLabs and TTS answered locally"""
+    async def get_chat_completion(messages, model="llama-3.3-70b-versatile", **kwargs):
+        return json.dumps(ANALYSIS)
+
+    async def stream_chat_completion(messages, model="llama-3.3-70b-versatile", **kwargs):
+        for delta in ("Yes, ", "with food."):
+            yield delta
+
+    async def get_conversation(conversation_id):
+        return {"status_code": 200, "text": json.dumps(conversation(conversation_id))}
+
+    async def synthesize(text, voice_id=None, model_id=None):
+        return SimpleNamespace(url="/audio/test.mp3", duration_seconds=1.0, cached=True)
+
+    monkeypatch.setattr(llm_service, "get_chat_completion", get_chat_completion)
+    monkeypatch.setattr(llm_service, "stream_chat_completion", stream_chat_completion)
+    monkeypatch.setattr(elevenlabs_client_module.elevenlabs_client, "get_conversation", get_conversation)
+    monkeypatch.setattr(chat, "get_tts_service", lambda: SimpleNamespace(synthesize=synthesize))
+
+
+@pytest.fixture
+def seeded(client, auth_headers, fake_providers):
+    """Two conversations, a second and a third research ID, and one analysis"""
+    for n in range(2):
+        for i, entry in enumerate(TRANSCRIPT):
+            response = client.post("/api/v1/chat/save-message", headers=auth_headers, json={
+                "research_id": RESEARCH_ID,
+                "role": "user" if entry["role"] == "user" else "assistant",
+                "content": entry["message"],
+                "timestamp": f"2025-01-0{n + 1}T09:00:0{i}Z",
+                "provider": "elevenlabs",
+                "elevenlabs_conversation_id": f"conv_seed_{n}",
+                "elevenlabs_message_id": f"conv_seed_{n}:{i}",
+            })
+            assert response.status_code == 200, response.text
+    for research_id in ("RID003", "RID004"):
+        response = client.post("/api/v1/admin/research-ids", json={"data": {"research_id": research_id}, "auth": ADMIN})
+        assert response.status_code == 200, response.text
+    response = client.post("/api/v1/medication-analysis/analyze", params=ADMIN, json={"research_id": RESEARCH_ID})
+    assert response.status_code == 200, response.text
+    return auth_headers
+
+
+def test_every_budgeted_route_is_covered():
+    budgeted = {
+        (method, route.path)
+        for route in app.routes
+        if hasattr(getattr(route, "endpoint", None), "__query_budget__")
+        for method in route.methods
+    }
+    assert budgeted == {(method, template) for method, template, _, _ in CALLS}
+
+
+@pytest.mark.parametrize("method, template, path, kwargs", CALLS, ids=[f"{c[0]} {c[1]}" for c in CALLS])
+def test_route_stays_within_query_budget(client, seeded, method, template, path, kwargs):
+    response = client.request(method, path, headers=seeded, **kwargs)
+
+    assert response.status_code < 500, response.text
+    assert int(response.headers["X-Query-Count"]) >= 0
@@ -0,0 +1,29 @@
+"""
+Token authentication and session bookkeeping
+"""
+from datetime import datetime
+
+from app.models.database import ResearchID, UserSession
+
+
+def test_inactive_research_id_is_rejected_without_touching_its_session(client, auth_headers, db):
+    last_active = datetime(2025, 1, 1)
+    db.query(UserSession).update({UserSession.last_active: last_active})
+    db.query(ResearchID).update({ResearchID.is_active: False})
+    db.commit()
+
+    response = client.get("/api/v1/chat/conversations", headers=auth_headers)
+
+    assert response.status_code == 401
+    db.expire_all()
+    assert db.query(UserSession).one().last_active.replace(tzinfo=None) == last_active
+
+
+def test_active_research_id_touches_its_session(client, auth_headers, db):
+    last_active = datetime(2025, 1, 1)
+    db.query(UserSession).update({UserSession.last_active: last_active})
+    db.commit()
+
+    assert client.get("/api/v1/chat/conversations", headers=auth_headers).status_code == 200
+    db.expire_all()
+    assert db.query(UserSession).one().last_active.replace(tzinfo=None) > last_active
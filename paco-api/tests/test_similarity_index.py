@@ -0,0 +1,56 @@
+import threading
+
+import numpy as np
+
+from app.services.similarity_index import INITIAL_CAPACITY, HashingEmbedder, SimilarityIndex, get_similarity_index
+
+
+def test_search_during_growth_sees_a_consistent_snapshot(tmp_path):
+    index = SimilarityIndex(str(tmp_path), HashingEmbedder(dim=64))
+    index.upsert([(1, 1, "missed evening dose because of nausea")])
+    query = index.embed_query("missed dose nausea")
+    errors = []
+    done = threading.Event()
+
+    def writer():
+        try:
+            for start in range(2, 3 * INITIAL_CAPACITY, 256):
+                index.upsert(
+                    (analysis_id, analysis_id, f"missed dose {analysis_id} nausea")
+                    for analysis_id in range(start, start + 256)
+                )
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while not done.is_set():
+        try:
+            for analysis_id, research_id_fk, score in index.search(query, k=5, latest_per_participant=False):
+                assert analysis_id == research_id_fk
+                assert np.isfinite(score) and score > 0
+        except Exception as exc:
+            errors.append(exc)
+            break
+    thread.join()
+
+    assert not errors
+    assert len(index) > 2 * INITIAL_CAPACITY  # The writer grew the files at least twice
+    assert index.search(query, k=1)[0][2] > 0
+
+
+def test_similar_endpoint_searches_off_the_event_loop(client, monkeypatch):
+    index = get_similarity_index()
+    threads = []
+
+    def search(vector, **kwargs):
+        threads.append(threading.get_ident())
+        return []
+    monkeypatch.setattr(index, "search", search)
+
+    response = client.get("/api/v1/medication-analysis/similar", params={"password": "admin", "q": "forgets doses"})
+
+    assert response.status_code == 200, response.text
+    assert threads and threads[0] != client.portal.call(threading.get_ident)
@@ -0,0 +1,209 @@
+"""
+ElevenLabs transcripts (webhook, sync endpoint) against turns saved live
+"""
+import json
+import threading
+
+import pytest
+
+from app.api.endpoints import webhooks
+from app.db.base import SessionLocal
+from app.models.database import Conversation, ConversationThread
+from app.services import elevenlabs_client as elevenlabs_client_module, turn_ingest
+from app.services.elevenlabs_webhook import get_webhook_queue, sign_payload
+
+from tests.conftest import RESEARCH_ID
+
+WEBHOOK_SECRET = "whsec_test"
+TRANSCRIPT = [
+    {"role": "agent", "message": "Hello, how are you feeling today?", "time_in_call_secs": 0},
+    {"role": "user", "message": "Fine, I took my pills.", "time_in_call_secs": 4},
+    {"role": "agent", "message": "Great to hear.", "time_in_call_secs": 9},
+]
+
+
+def conversation(conversation_id, transcript=TRANSCRIPT):
+    return {
+        "conversation_id": conversation_id,
+        "agent_id": "agent_test",
+        "transcript": transcript,
+        "metadata": {"start_time_unix_secs": 1735689600},
+        "conversation_initiation_client_data": {"dynamic_variables": {"research_id": RESEARCH_ID}},
+    }
+
+
+def save_live(client, auth_headers, conversation_id, entries):
+    """Save turns the way the widget does: no ElevenLabs message ID"""
+    for entry in entries:
+        response = client.post("/api/v1/chat/save-message", headers=auth_headers, json={
+            "research_id": RESEARCH_ID,
+            "role": "user" if entry["role"] == "user" else "assistant",
+            "content": entry["message"],
+            "timestamp": "2025-01-01T00:00:00Z",
+            "provider": "elevenlabs",
+            "elevenlabs_conversation_id": conversation_id,
+        })
+        assert response.status_code == 200, response.text
+
+
+def stored(db, conversation_id):
+    db.expire_all()
+    return db.query(Conversation).filter(
+        Conversation.elevenlabs_conversation_id == conversation_id
+    ).order_by(Conversation.id).all()
+
+
+@pytest.fixture
+def webhook_secret(monkeypatch):
+    monkeypatch.setattr(webhooks.settings, "ELEVENLABS_WEBHOOK_SECRET", WEBHOOK_SECRET)
+
+
+def post_webhook(client, data):
+    body = json.dumps({"type": "post_call_transcription", "data": data}).encode()
+    return client.post(
+        "/webhooks/elevenlabs", content=body,
+        headers={"ElevenLabs-Signature": sign_payload(body, WEBHOOK_SECRET)}
+    )
+
+
+def test_webhook_after_live_save_stores_each_turn_once(client, auth_headers, db, webhook_secret):
+    save_live(client, auth_headers, "conv_live", TRANSCRIPT[:2])
+
+    assert post_webhook(client, conversation("conv_live")).status_code == 200
+    client.portal.call(get_webhook_queue().drain)  # Write what was queued
+
+    rows = stored(db, "conv_live")
+    assert [row.content for row in rows] == [entry["message"] for entry in TRANSCRIPT]
+    # The live rows took over the transcript's message IDs
+    assert [row.elevenlabs_message_id for row in rows] == ["conv_live:0", "conv_live:1", "conv_live:2"]
+
+
+def test_repeated_live_content_is_matched_once(client, auth_headers, db, webhook_secret):
+    transcript = [
+        {"role": "user", "message": "Yes", "time_in_call_secs": 0},
+        {"role": "agent", "message": "Did you eat?", "time_in_call_secs": 2},
+        {"role": "user", "message": "Yes", "time_in_call_secs": 4},
+    ]
+    save_live(client, auth_headers, "conv_yes", transcript[:1])
+
+    assert post_webhook(client, conversation("conv_yes", transcript)).status_code == 200
+    client.portal.call(get_webhook_queue().drain)
+
+    assert [row.content for row in stored(db, "conv_yes")] == ["Yes", "Did you eat?", "Yes"]
+
+
+def test_sync_after_live_save_and_webhook(client, auth_headers, db, webhook_secret, monkeypatch):
+    save_live(client, auth_headers, "conv_sync", TRANSCRIPT[:1])
+
+    async def get_conversation(conversation_id):
+        return {"status_code": 200, "text": json.dumps(conversation(conversation_id))}
+    monkeypatch.setattr(elevenlabs_client_module.elevenlabs_client, "get_conversation", get_conversation)
+
+    response = client.post("/api/v1/chat/sync-elevenlabs-conversation", headers=auth_headers, json={
+        "research_id": RESEARCH_ID, "elevenlabs_conversation_id": "conv_sync"
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["messages_synced"] == 2
+
+    assert post_webhook(client, conversation("conv_sync")).status_code == 200
+    client.portal.call(get_webhook_queue().drain)
+
+    assert len(stored(db, "conv_sync")) == len(TRANSCRIPT)
+
+
+def test_long_transcript_entries_are_stored_whole(client, auth_headers, db, webhook_secret):
+    long_entry = {"role": "user", "message": "word " * 3000, "time_in_call_secs": 1}
+
+    assert post_webhook(client, conversation("conv_long", [*TRANSCRIPT, long_entry])).status_code == 200
+    client.portal.call(get_webhook_queue().drain)
+
+    rows = stored(db, "conv_long")
+    assert len(rows) == len(TRANSCRIPT) + 1
+    assert rows[-1].content == long_entry["message"]
+
+
+def test_failed_conversation_does_not_roll_back_its_batch(db, research_user, monkeypatch):
+    def sync_transcript(db, research_id_fk, conversation_id, data, thread):
+        if conversation_id == "conv_bad":
+            raise RuntimeError("write failed")
+        return original(db, research_id_fk, conversation_id, data, thread)
+    original = turn_ingest.sync_transcript
+    monkeypatch.setattr(turn_ingest, "sync_transcript", sync_transcript)
+
+    counts, failed = turn_ingest.persist_transcripts(db, [
+        conversation("conv_ok"), conversation("conv_bad"), conversation("conv_ok_too")
+    ])
+
+    assert failed == ["conv_bad"]
+    assert counts["failed_transcripts"] == 1
+    assert counts["saved"] == 2 * len(TRANSCRIPT)
+    assert len(stored(db, "conv_ok")) == len(stored(db, "conv_ok_too")) == len(TRANSCRIPT)
+    assert stored(db, "conv_bad") == []
+
+
+def test_overlapping_writers_store_each_turn_once(research_user, monkeypatch):
+    # Both writers finish their duplicate lookup before either inserts
+    barrier = threading.Barrier(2)
+
+    def append_messages(*args, **kwargs):
+        try:
+            barrier.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass  # The other writer is already waiting on the database
+        return original(*args, **kwargs)
+    original = turn_ingest.conversation_service.append_messages
+    monkeypatch.setattr(turn_ingest.conversation_service, "append_messages", append_messages)
+
+    results = []
+
+    def write():
+        session = SessionLocal()
+        try:
+            results.append(turn_ingest.persist_transcripts(session, [conversation("conv_race")]))
+        finally:
+            session.close()
+
+    writers = [threading.Thread(target=write) for _ in range(2)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    session = SessionLocal()
+    try:
+        rows = stored(session, "conv_race")
+        thread = session.query(ConversationThread).filter(ConversationThread.conversation_id == "conv_race").one()
+    finally:
+        session.close()
+    assert [row.content for row in rows] == [entry["message"] for entry in TRANSCRIPT]
+    assert thread.message_count == len(TRANSCRIPT)
+    assert sum(counts["saved"] for counts, _ in results) == len(TRANSCRIPT)
+
+
+def test_writer_with_a_stale_lookup_acks_the_stored_copy(research_user, monkeypatch):
+    # The sync path looks up stored turns, then the webhook writes the same
+    # transcript and commits before the sync path inserts
+    def append_messages(*args, **kwargs):
+        monkeypatch.setattr(turn_ingest.conversation_service, "append_messages", original)
+        session = SessionLocal()
+        try:
+            turn_ingest.persist_transcripts(session, [conversation("conv_race")])
+        finally:
+            session.close()
+        return original(*args, **kwargs)
+    original = turn_ingest.conversation_service.append_messages
+    monkeypatch.setattr(turn_ingest.conversation_service, "append_messages", append_messages)
+
+    session = SessionLocal()
+    try:
+        result = turn_ingest.sync_transcript(session, research_user.id, "conv_race", conversation("conv_race"), None)
+        session.commit()
+        rows = stored(session, "conv_race")
+        thread = session.query(ConversationThread).filter(ConversationThread.conversation_id == "conv_race").one()
+    finally:
+        session.close()
+
+    assert all(ack.duplicate for ack in result.acks)
+    assert [ack.message_id for ack in result.acks] == [row.id for row in rows]
+    assert [row.content for row in rows] == [entry["message"] for entry in TRANSCRIPT]
+    assert thread.message_count == len(TRANSCRIPT)
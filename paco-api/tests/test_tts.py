@@ -0,0 +1,37 @@
+import asyncio
+
+from app.services.tts import TTS_CACHE_REQUESTS, AudioCache, StubTTSBackend, TTSService
+
+
+class SlowBackend(StubTTSBackend):
+    def __init__(self):
+        self.calls = 0
+
+    async def synthesize(self, text, voice_id, model_id):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return await super().synthesize(text, voice_id, model_id)
+
+
+def test_coalesced_waiters_report_a_fresh_synthesis(tmp_path):
+    backend = SlowBackend()
+    service = TTSService(backend, AudioCache(str(tmp_path), 10 * 1024 * 1024))
+    hits, misses = TTS_CACHE_REQUESTS.get(result="hit"), TTS_CACHE_REQUESTS.get(result="miss")
+
+    async def scenario():
+        first, second = await asyncio.gather(
+            service.synthesize("Take it with breakfast", "voice", "model"),
+            service.synthesize("Take it with breakfast", "voice", "model")
+        )
+        third = await service.synthesize("Take it with breakfast", "voice", "model")
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+
+    assert backend.calls == 1
+    # Response and metric agree: both concurrent callers were misses, the
+    # follow-up is the only cache hit
+    assert (first.cached, second.cached, third.cached) == (False, False, True)
+    assert TTS_CACHE_REQUESTS.get(result="miss") - misses == 2
+    assert TTS_CACHE_REQUESTS.get(result="hit") - hits == 1
+    assert first.url == second.url == third.url and first.size == second.size
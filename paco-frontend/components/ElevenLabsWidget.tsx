@@ -578,6 +578,7 @@ export default function ElevenLabsWidget({
           <elevenlabs-convai
             ref={widgetRef}
             agent-id={agentId}
+            dynamic-variables={JSON.stringify({ research_id: researchId })}
           ></elevenlabs-convai>
         )}
 